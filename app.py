@@ -1,19 +1,37 @@
 import os
 import time
 import tempfile
+import csv
 import json
 import uuid
 import threading
+import concurrent.futures
+from datetime import date
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file
 from flask_session import Session
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import file_manager
+import export_metrics
+import export_cache
+import appearance_buffer
+import idempotency
+import schema_errors
+import appearance_import
+import appearance_index
+import appearance_writes
+import player_search
+import unmatched_resolver
+import unmatched_merges
+import player_aliases
+import unmatched_lookup
+import replica
+from pagination import fetch_all, count_rows
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
-from io import BytesIO
+from io import BytesIO, StringIO
 
 # Load environment variables
 load_dotenv()
@@ -34,25 +52,87 @@ app.config['SESSION_PERMANENT'] = False
 app.config['SESSION_USE_SIGNER'] = True
 Session(app)
 
+# Lets forms embed a fresh Idempotency-Key so double submits are replayed
+app.jinja_env.globals['new_idempotency_key'] = idempotency.new_key
+
 # Configure app folders
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['FRAMES_FOLDER'] = os.path.join('static', 'frames')
+app.config['EXPORT_FOLDER'] = os.environ.get("EXPORT_CACHE_FOLDER", 'exports')
+
+# Cron schedule for pre-building the league export off-peak (empty to disable)
+app.config['EXPORT_PREBUILD_CRON'] = os.environ.get("EXPORT_PREBUILD_CRON", "0 3 * * *")
+
+# Cron schedule for auto-resolving the unmatched names backlog (empty to disable)
+app.config['UNMATCHED_RESOLVE_CRON'] = os.environ.get("UNMATCHED_RESOLVE_CRON", "")
 
 # Make sure folders exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['FRAMES_FOLDER'], exist_ok=True)
 os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+os.makedirs(app.config['EXPORT_FOLDER'], exist_ok=True)
 
 # Global variables to track tasks
 processing_tasks = {}
 task_lock = threading.Lock()
 
+# Thread pool for running independent Supabase queries side by side
+query_executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+
 # Helper functions
 def get_players_by_team_id(team_id):
     """Get all players belonging to a specific team"""
     result = supabase.table("players").select("*").eq("team_id", team_id).execute()
     return result.data if result.data else []
 
+# Set to False once the adjust_total_appearances() database function is found missing
+adjust_counts_rpc_available = True
+
+def adjust_total_appearances(player_ids, delta):
+    """
+    Add delta to total_appearances for each player, never going below zero.
+    
+    Uses the adjust_total_appearances() database function
+    (migrations/003_appearance_patch.sql) to update every player in one call,
+    falling back to a read and update per player.
+    
+    Args:
+        player_ids: IDs of the players to adjust
+        delta: Amount to add (negative to subtract)
+    """
+    global adjust_counts_rpc_available
+    if not player_ids:
+        return
+    
+    if adjust_counts_rpc_available:
+        try:
+            supabase.rpc("adjust_total_appearances", {
+                "p_player_ids": [str(player_id) for player_id in player_ids],
+                "p_delta": delta
+            }).execute()
+            return
+        except Exception as e:
+            if schema_errors.is_missing(e):
+                print(f"adjust_total_appearances() unavailable, updating players one by one: {str(e)}")
+                adjust_counts_rpc_available = False
+            else:
+                print(f"Error calling adjust_total_appearances(), updating players one by one: {str(e)}")
+    
+    for player_id in player_ids:
+        player = supabase.table("players").select("total_appearances").eq("id", player_id).execute()
+        if player.data and len(player.data) > 0:
+            current_count = player.data[0].get("total_appearances", 0) or 0
+            supabase.table("players").update({"total_appearances": max(current_count + delta, 0)}).eq("id", player_id).execute()
+
+def bump_match_version(match_id):
+    """Increment a match's version so clients holding an older one must refresh"""
+    match = supabase.table("matches").select("version").eq("id", match_id).execute()
+    if match.data and len(match.data) > 0:
+        current_version = match.data[0].get("version", 0) or 0
+        supabase.table("matches").update({"version": current_version + 1}).eq("id", match_id).execute()
+        return current_version + 1
+    return None
+
 def update_player_appearances(player_id, match_id):
     """Add or update player appearance record"""
     # Check if this appearance already exists
@@ -69,6 +149,8 @@ def update_player_appearances(player_id, match_id):
     }).execute()
     
     if result.data and len(result.data) > 0:
+        appearance_index.add(match_id, [player_id])
+        
         # Update total_appearances count in players table
         player = supabase.table("players").select("total_appearances").eq("id", player_id).execute()
         if player.data and len(player.data) > 0:
@@ -81,13 +163,21 @@ def update_player_appearances(player_id, match_id):
 def store_unmatched_player(name, team_id, match_id):
     """Store unmatched player names in the database for future reference"""
     try:
+        # A name matched to a player before is recorded as that player's appearance
+        alias_player_id = player_aliases.lookup(name, team_id)
+        if alias_player_id is not None:
+            if update_player_appearances(alias_player_id, match_id):
+                bump_match_version(match_id)
+            print(f"Resolved alias {name} for team {team_id} to player {alias_player_id}")
+            return None
+        
         # Check if this unmatched player + team combination already exists
-        result = supabase.table("unmatched_players").select("*").eq("name", name).eq("team_id", team_id).execute()
+        existing = unmatched_lookup.find(supabase, name, team_id)
         
-        if result.data and len(result.data) > 0:
+        if existing:
             # If it exists, update the last_seen field and increment occurrence count
-            player_id = result.data[0]["id"]
-            occurrence_count = result.data[0].get("occurrence_count", 1) + 1
+            player_id = existing["id"]
+            occurrence_count = (existing.get("occurrence_count") or 1) + 1
             
             supabase.table("unmatched_players").update({
                 "last_seen": time.strftime("%Y-%m-%d"),
@@ -121,9 +211,15 @@ def store_unmatched_player(name, team_id, match_id):
 @app.route('/')
 def index():
     """Render the home page with stats"""
+    # Serve from the local replica when it is up to date
+    use_replica = replica.is_ready()
+    
     # Get all teams for dropdown
-    teams = supabase.table("teams").select("*").order("name").execute()
-    teams_data = teams.data if teams.data else []
+    if use_replica:
+        teams_data = replica.get_teams()
+    else:
+        teams = supabase.table("teams").select("*").order("name").execute()
+        teams_data = teams.data if teams.data else []
     
     # Create stats with default values
     default_stats = {
@@ -135,24 +231,24 @@ def index():
     
     # Try to get actual stats if possible
     try:
-        # Count players - just get all and count length
-        players_data = supabase.table("players").select("id").execute()
-        if players_data.data:
-            default_stats['players'] = str(len(players_data.data))
+        # Count players
+        player_count = replica.count("players") if use_replica else count_rows(supabase, "players")
+        if player_count:
+            default_stats['players'] = str(player_count)
         
         # Count teams from our already fetched data
         if teams_data:
             default_stats['teams'] = str(len(teams_data))
         
         # Count matches
-        matches_data = supabase.table("matches").select("id").execute()
-        if matches_data.data:
-            default_stats['matches'] = str(len(matches_data.data))
+        match_count = replica.count("matches") if use_replica else count_rows(supabase, "matches")
+        if match_count:
+            default_stats['matches'] = str(match_count)
         
         # Count appearances
-        appearances_data = supabase.table("appearances").select("id").execute()
-        if appearances_data.data:
-            default_stats['appearances'] = str(len(appearances_data.data))
+        appearance_count = replica.count("appearances") if use_replica else count_rows(supabase, "appearances")
+        if appearance_count:
+            default_stats['appearances'] = str(appearance_count)
     
     except Exception as e:
         print(f"Error getting stats: {str(e)}")
@@ -169,47 +265,113 @@ def form_demo():
 def players():
     """View all players, optionally filtered by team"""
     team_id = request.args.get('team_id')
-    if not team_id:
-        players_data = supabase.table("players").select("*, team:team_id(name)").order("name").execute()
-    else:
-        players_data = supabase.table("players").select("*, team:team_id(name)").eq("team_id", team_id).order("name").execute()
+    
+    # Serve from the local replica when it is up to date
+    if replica.is_ready():
+        return render_template(
+            'players.html',
+            players=replica.get_players(team_id),
+            teams=replica.get_teams()
+        )
+    
+    players_data = fetch_all(
+        supabase, "players",
+        columns="*, team:team_id(name)",
+        filters=(lambda q: q.eq("team_id", team_id)) if team_id else None,
+        order_by="name"
+    )
     
     teams = supabase.table("teams").select("*").order("name").execute()
     
     return render_template(
         'players.html', 
-        players=players_data.data if players_data.data else [],
+        players=players_data,
         teams=teams.data if teams.data else []
     )
 
+# Set to False once the match_summary table (migrations/004_match_summary.sql) is found missing
+match_summary_available = True
+
 @app.route('/matches')
 def matches():
     """View all matches"""
-    # Get all matches with team information
-    matches_data = supabase.table("matches").select("*, home_team:home_team_id(name), away_team:away_team_id(name)").order("date", desc=True).execute()
+    # Serve from the local replica when it is up to date
+    if replica.is_ready():
+        matches_data = replica.get_matches()
+        match_stats = replica.get_match_stats()
+        
+        for match in matches_data:
+            stats = match_stats.get(str(match["id"]), {'appearances': {}, 'unmatched': {}})
+            home_key = str(match['home_team_id'])
+            away_key = str(match['away_team_id'])
+            match["home_appearances"] = stats['appearances'].get(home_key, 0)
+            match["away_appearances"] = stats['appearances'].get(away_key, 0)
+            match["home_unmatched"] = stats['unmatched'].get(home_key, 0)
+            match["away_unmatched"] = stats['unmatched'].get(away_key, 0)
+        
+        return render_template('matches.html',
+                               matches=matches_data,
+                               all_teams=replica.get_teams())
+    
+    global match_summary_available
+    
+    # Get all matches with team information, plus their counters when match_summary exists
+    matches_data = None
+    if match_summary_available:
+        try:
+            matches_data = supabase.table("matches").select(
+                "*, home_team:home_team_id(name), away_team:away_team_id(name), "
+                "summary:match_summary(home_appearances, away_appearances, home_unmatched, away_unmatched)"
+            ).order("date", desc=True).execute()
+        except Exception as e:
+            if schema_errors.is_missing(e):
+                print(f"match_summary unavailable, counting per match: {str(e)}")
+                match_summary_available = False
+            else:
+                print(f"Error reading match_summary, counting per match: {str(e)}")
+    
+    if matches_data is None:
+        matches_data = supabase.table("matches").select("*, home_team:home_team_id(name), away_team:away_team_id(name)").order("date", desc=True).execute()
     
     # Get all teams for the create match day form
     all_teams = supabase.table("teams").select("id, name").order("name").execute()
     
-    # If there are matches, get additional information for each
-    if matches_data.data:
-        for match in matches_data.data:
+    # Counters maintained by the match_summary triggers need no further reads
+    needs_counts = []
+    for match in matches_data.data or []:
+        summary = match.pop("summary", None)
+        if isinstance(summary, list):
+            summary = summary[0] if summary else None
+        if summary:
+            match.update(summary)
+        else:
+            needs_counts.append(match)
+    
+    # With the appearance index loaded, one read of player teams replaces a query per match
+    player_teams = None
+    if needs_counts and appearance_index.is_ready():
+        player_teams = {str(player["id"]): player.get("team_id") for player in fetch_all(supabase, "players", columns="id, team_id")}
+    
+    # Otherwise count each match
+    if needs_counts:
+        for match in needs_counts:
             # Get appearance counts
             try:
-                appearances = supabase.table("appearances").select("*, player:player_id(team_id)").eq("match_id", match["id"]).execute()
+                if player_teams is not None:
+                    appearance_teams = [player_teams.get(str(player_id)) for player_id in appearance_index.players_in_match(match["id"])]
+                else:
+                    appearances = supabase.table("appearances").select("*, player:player_id(team_id)").eq("match_id", match["id"]).execute()
+                    appearance_teams = [a['player'].get('team_id') for a in appearances.data if a.get('player')] if appearances.data else []
                 
                 # Count by team
                 home_count = 0
                 away_count = 0
                 
-                if appearances.data:
-                    for appearance in appearances.data:
-                        if 'player' in appearance and appearance['player']:
-                            team_id = appearance['player'].get('team_id')
-                            if team_id == match['home_team_id']:
-                                home_count += 1
-                            elif team_id == match['away_team_id']:
-                                away_count += 1
+                for team_id in appearance_teams:
+                    if team_id == match['home_team_id']:
+                        home_count += 1
+                    elif team_id == match['away_team_id']:
+                        away_count += 1
                 
                 match["home_appearances"] = home_count
                 match["away_appearances"] = away_count
@@ -246,18 +408,41 @@ def matches():
 @app.route('/match/<match_id>')
 def match_details(match_id):
     """View details about a specific match"""
-    # Get match info
-    match = supabase.table("matches").select("*, home_team:home_team_id(name), away_team:away_team_id(name)").eq("id", match_id).execute()
+    # Get match info (from the local replica when it is up to date)
+    use_replica = replica.is_ready()
+    if use_replica:
+        match_data = replica.get_match(match_id)
+    else:
+        match = supabase.table("matches").select("*, home_team:home_team_id(name), away_team:away_team_id(name)").eq("id", match_id).execute()
+        match_data = match.data[0] if match.data else None
     
-    if not match.data or len(match.data) == 0:
+    if not match_data:
         flash('Match not found', 'danger')
         return redirect(url_for('matches'))
     
-    # Get appearances for this match
-    appearances = supabase.table("appearances").select("*, player:player_id(name, team_id)").eq("match_id", match_id).execute()
-    
-    # Get unmatched players for this match
-    unmatched_players = supabase.table("unmatched_players").select("*").eq("last_match_id", match_id).execute()
+    if use_replica:
+        appearances_data = replica.get_match_appearances(match_id)
+        unmatched_data = replica.get_unmatched_for_match(match_id)
+    else:
+        appeared_player_ids = appearance_index.players_in_match(match_id)
+        if appeared_player_ids is not None:
+            # Only the two rosters are read; who played comes from the appearance index
+            appearances_data = []
+            if appeared_player_ids:
+                roster = fetch_all(supabase, "players", columns="id, name, team_id",
+                                   filters=lambda q: q.in_("team_id", [match_data['home_team_id'], match_data['away_team_id']]))
+                appearances_data = [
+                    {"player_id": player["id"], "match_id": match_data["id"], "player": {"name": player["name"], "team_id": player["team_id"]}}
+                    for player in roster if str(player["id"]) in appeared_player_ids
+                ]
+        else:
+            # Get appearances for this match
+            appearances = supabase.table("appearances").select("*, player:player_id(name, team_id)").eq("match_id", match_id).execute()
+            appearances_data = appearances.data if appearances.data else []
+        
+        # Get unmatched players for this match
+        unmatched_players = supabase.table("unmatched_players").select("*").eq("last_match_id", match_id).execute()
+        unmatched_data = unmatched_players.data if unmatched_players.data else []
     
     # Separate by team
     home_appearances = []
@@ -266,27 +451,25 @@ def match_details(match_id):
     away_unmatched = []
     
     # Process regular appearances
-    if appearances.data:
-        for appearance in appearances.data:
-            if 'player' in appearance and appearance['player']:
-                team_id = appearance['player'].get('team_id')
-                if team_id == match.data[0]['home_team_id']:
-                    home_appearances.append(appearance)
-                elif team_id == match.data[0]['away_team_id']:
-                    away_appearances.append(appearance)
+    for appearance in appearances_data:
+        if 'player' in appearance and appearance['player']:
+            team_id = appearance['player'].get('team_id')
+            if team_id == match_data['home_team_id']:
+                home_appearances.append(appearance)
+            elif team_id == match_data['away_team_id']:
+                away_appearances.append(appearance)
     
     # Process unmatched players
-    if unmatched_players.data:
-        for player in unmatched_players.data:
-            team_id = player.get('team_id')
-            if team_id == match.data[0]['home_team_id']:
-                home_unmatched.append(player)
-            elif team_id == match.data[0]['away_team_id']:
-                away_unmatched.append(player)
+    for player in unmatched_data:
+        team_id = player.get('team_id')
+        if team_id == match_data['home_team_id']:
+            home_unmatched.append(player)
+        elif team_id == match_data['away_team_id']:
+            away_unmatched.append(player)
     
     return render_template(
         'match_details.html', 
-        match=match.data[0], 
+        match=match_data, 
         home_appearances=home_appearances,
         away_appearances=away_appearances,
         home_unmatched=home_unmatched,
@@ -310,14 +493,15 @@ def edit_match_appearances(match_id):
     home_players = supabase.table("players").select("*").eq("team_id", home_team_id).order("name").execute()
     away_players = supabase.table("players").select("*").eq("team_id", away_team_id).order("name").execute()
     
-    # Get current appearances for this match
-    appearances = supabase.table("appearances").select("*").eq("match_id", match_id).execute()
-    
-    # Create a set of player IDs who appeared in this match for quick lookup
-    appeared_player_ids = set()
-    if appearances.data:
-        for appearance in appearances.data:
-            appeared_player_ids.add(appearance['player_id'])
+    # Create a set of player IDs (as text) who appeared in this match for quick lookup
+    appeared_player_ids = appearance_index.players_in_match(match_id)
+    if appeared_player_ids is None:
+        # Index still loading; ask the database
+        appearances = supabase.table("appearances").select("player_id").eq("match_id", match_id).execute()
+        appeared_player_ids = set()
+        if appearances.data:
+            for appearance in appearances.data:
+                appeared_player_ids.add(str(appearance['player_id']))
     
     # Get unmatched players for this match
     unmatched_players_result = supabase.table("unmatched_players").select("*").eq("last_match_id", match_id).execute()
@@ -346,12 +530,15 @@ def edit_match_appearances(match_id):
         match_day_id=match_id,  # Used by unmatched players forms
         home_team_name=home_team_name,
         away_team_name=away_team_name,
+        home_team_id=home_team_id,
+        away_team_id=away_team_id,
         match_day=match_day,
         match_date=match_date,
         home_players=home_players.data if home_players.data else [],
         away_players=away_players.data if away_players.data else [],
         appeared_player_ids=appeared_player_ids,
-        unmatched_players=unmatched_players
+        unmatched_players=unmatched_players,
+        match_version=match.data[0].get('version', 0) or 0
     )
 
 @app.route('/match/<match_id>/update_appearances', methods=['POST'])
@@ -372,16 +559,18 @@ def update_match_appearances(match_id):
     selected_players = player_data.get('player_ids', [])
     
     try:
-        # First, get all current appearances for this match
-        current_appearances = supabase.table("appearances").select("id, player_id").eq("match_id", match_id).execute()
-        
-        # Create sets for easier comparison
+        # First, get all current appearances for this match. Read from the database rather
+        # than the appearance index, which can lag writes made by other processes.
+        current_appearances = supabase.table("appearances").select("player_id").eq("match_id", match_id).execute()
         current_player_ids = set()
         if current_appearances.data:
             for appearance in current_appearances.data:
                 current_player_ids.add(appearance['player_id'])
         
-        selected_player_ids = set(selected_players)
+        # Compare as strings; ids from the page are strings
+        current_by_key = {str(player_id): player_id for player_id in current_player_ids}
+        current_player_ids = set(current_by_key)
+        selected_player_ids = set(str(player_id) for player_id in selected_players)
         
         # Players to add (in selected but not in current)
         players_to_add = selected_player_ids - current_player_ids
@@ -389,12 +578,17 @@ def update_match_appearances(match_id):
         # Players to remove (in current but not in selected)
         players_to_remove = current_player_ids - selected_player_ids
         
-        # Add new appearances
+        # Add new appearances, skipping any written since the read above
+        added = 0
         for player_id in players_to_add:
-            supabase.table("appearances").insert({
+            inserted = appearance_writes.insert_new(supabase, [{
                 "player_id": player_id,
                 "match_id": match_id
-            }).execute()
+            }])
+            if not inserted:
+                continue
+            added += 1
+            appearance_index.add(match_id, [player_id])
             
             # Update total_appearances count in players table
             player = supabase.table("players").select("total_appearances").eq("id", player_id).execute()
@@ -403,13 +597,14 @@ def update_match_appearances(match_id):
                 supabase.table("players").update({"total_appearances": current_count + 1}).eq("id", player_id).execute()
         
         # Remove appearances that are no longer selected
+        removed = 0
         for player_id in players_to_remove:
-            # Find the appearance ID to delete
-            appearance_to_remove = next((a for a in current_appearances.data if a['player_id'] == player_id), None)
+            # Delete the appearance
+            deleted = supabase.table("appearances").delete().eq("match_id", match_id).eq("player_id", current_by_key[player_id]).execute()
             
-            if appearance_to_remove:
-                # Delete the appearance
-                supabase.table("appearances").delete().eq("id", appearance_to_remove['id']).execute()
+            if deleted.data:
+                removed += 1
+                appearance_index.remove(match_id, [current_by_key[player_id]])
                 
                 # Update total_appearances count in players table
                 player = supabase.table("players").select("total_appearances").eq("id", player_id).execute()
@@ -417,18 +612,170 @@ def update_match_appearances(match_id):
                     current_count = player.data[0].get("total_appearances", 0) or 0
                     if current_count > 0:  # Ensure we don't go negative
                         supabase.table("players").update({"total_appearances": current_count - 1}).eq("id", player_id).execute()
+        
+        # Invalidate clients patching against the old set of appearances
+        if added or removed:
+            bump_match_version(match_id)
     
         return jsonify({
             "success": True,
-            "added": len(players_to_add),
-            "removed": len(players_to_remove)
+            "added": added,
+            "removed": removed
         })
         
     except Exception as e:
         print(f"Error updating appearances: {str(e)}")
         return jsonify({"success": False, "error": str(e)}) 
 
+@app.route('/match/<match_id>/appearances/patch', methods=['POST'])
+def patch_match_appearances(match_id):
+    """
+    Apply explicit appearance deltas to a match with optimistic versioning.
+    
+    Expects JSON {"add": [player_id, ...], "remove": [player_id, ...], "version": n}.
+    The match version is bumped with a conditional update, so a stale version is
+    rejected in a single round trip without re-reading the current appearances.
+    """
+    data = request.json if request.is_json else None
+    
+    if not data or not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Invalid patch data"}), 400
+    
+    add_ids = data.get('add', [])
+    remove_ids = data.get('remove', [])
+    version = data.get('version')
+    
+    if not isinstance(add_ids, list) or not isinstance(remove_ids, list):
+        return jsonify({"success": False, "error": "add and remove must be lists of player IDs"}), 400
+    
+    if not isinstance(version, int) or isinstance(version, bool):
+        return jsonify({"success": False, "error": "An integer match version is required"}), 400
+    
+    add_ids = list(dict.fromkeys(str(player_id) for player_id in add_ids))
+    remove_ids = list(dict.fromkeys(str(player_id) for player_id in remove_ids))
+    
+    if set(add_ids) & set(remove_ids):
+        return jsonify({"success": False, "error": "A player cannot be both added and removed"}), 400
+    
+    if not add_ids and not remove_ids:
+        return jsonify({"success": True, "version": version, "added": 0, "removed": 0})
+    
+    try:
+        # Patches arriving together for this match are merged and written once
+        payload, status = appearance_buffer.submit(match_id, add_ids, remove_ids, version, apply_appearance_patch)
+        return jsonify(payload), status
+        
+    except Exception as e:
+        print(f"Error patching appearances: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# Set to False once the apply_appearance_patch() database function (migrations/009) is found missing
+appearance_patch_rpc_available = True
+
+def apply_appearance_patch(match_id, add_ids, remove_ids, version):
+    """
+    Write an appearance delta if the match is still at `version`.
+    
+    Uses the apply_appearance_patch() database function, which claims the next
+    version and writes the delta in one transaction, so a failed write never
+    advances the version. Without it, the version is claimed first and given
+    back if the write fails.
+    
+    Args:
+        match_id: ID of the match
+        add_ids: Player IDs to add
+        remove_ids: Player IDs to remove
+        version: Match version the changes are based on
+    
+    Returns:
+        tuple: (response payload, HTTP status code)
+    """
+    global appearance_patch_rpc_available
+    
+    if appearance_patch_rpc_available:
+        try:
+            patched = supabase.rpc("apply_appearance_patch", {
+                "p_match_id": str(match_id),
+                "p_version": version,
+                "p_add": add_ids,
+                "p_remove": remove_ids
+            }).execute().data
+            if not patched:
+                return stale_patch_response(match_id)
+            
+            appearance_index.add(match_id, patched["added"])
+            appearance_index.remove(match_id, patched["removed"])
+            return {
+                "success": True,
+                "version": patched["version"],
+                "added": len(patched["added"]),
+                "removed": len(patched["removed"])
+            }, 200
+        except Exception as e:
+            if not schema_errors.is_missing(e):
+                raise
+            print(f"apply_appearance_patch() unavailable, claiming the version separately: {str(e)}")
+            appearance_patch_rpc_available = False
+    
+    # Claim the next version; this only matches if nobody else has written since
+    claimed = supabase.table("matches").update({"version": version + 1}).eq("id", match_id).eq("version", version).execute()
+    
+    if not claimed.data or len(claimed.data) == 0:
+        return stale_patch_response(match_id)
+    
+    added_ids = []
+    removed_ids = []
+    
+    try:
+        # Insert new appearances in one call, skipping any that already exist
+        if add_ids:
+            inserted = appearance_writes.insert_new(
+                supabase, [{"player_id": player_id, "match_id": match_id} for player_id in add_ids]
+            )
+            added_ids = [a["player_id"] for a in inserted]
+        
+        # Delete removed appearances in one call
+        if remove_ids:
+            deleted = supabase.table("appearances").delete().eq("match_id", match_id).in_("player_id", remove_ids).execute()
+            removed_ids = [a["player_id"] for a in deleted.data] if deleted.data else []
+    except Exception:
+        # Give the version back unless someone has written since, so the retry is not rejected as stale
+        supabase.table("matches").update({"version": version}).eq("id", match_id).eq("version", version + 1).execute()
+        appearance_index.add(match_id, added_ids)
+        adjust_total_appearances(added_ids, 1)
+        raise
+    
+    appearance_index.add(match_id, added_ids)
+    appearance_index.remove(match_id, removed_ids)
+    adjust_total_appearances(added_ids, 1)
+    adjust_total_appearances(removed_ids, -1)
+    
+    return {
+        "success": True,
+        "version": version + 1,
+        "added": len(added_ids),
+        "removed": len(removed_ids)
+    }, 200
+
+def stale_patch_response(match_id):
+    """Return the 409 for a patch against an old version, or 404 if the match is gone"""
+    match = supabase.table("matches").select("version").eq("id", match_id).execute()
+    if not match.data or len(match.data) == 0:
+        return {"success": False, "error": "Match not found"}, 404
+    
+    # Send the current state so the client can rebase its pending changes; read from
+    # the database, as the appearance index can lag writes made by other processes
+    current_appearances = supabase.table("appearances").select("player_id").eq("match_id", match_id).execute()
+    current_player_ids = [a["player_id"] for a in current_appearances.data] if current_appearances.data else []
+    return {
+        "success": False,
+        "error": "stale_version",
+        "version": match.data[0].get("version", 0) or 0,
+        "player_ids": [str(player_id) for player_id in current_player_ids]
+    }, 409
+
 @app.route('/create_match_day', methods=['POST'])
+@idempotency.idempotent
 def create_match_day():
     """Create a new match day"""
     try:
@@ -463,6 +810,7 @@ def create_match_day():
             
         # Redirect to edit appearances page for the new match
         match_id = result.data[0]["id"]
+        idempotency.succeeded()
         flash("Match day created successfully", "success")
         return redirect(url_for('edit_match_appearances', match_id=match_id))
         
@@ -471,7 +819,181 @@ def create_match_day():
         flash(f"Error: {str(e)}", "danger")
         return redirect(url_for('matches'))
 
+# Upper bound on fixtures accepted in one round request
+MAX_ROUND_FIXTURES = 50
+
+def read_round_fixtures():
+    """
+    Read a round of fixtures from the current request.
+    
+    Accepts JSON ({"match_day", "match_date", "fixtures": [{"home_team_id", "away_team_id"}, ...]}),
+    a CSV body or uploaded `fixtures_file`, or the multi-row form on the matches page
+    (repeated home_team_id / away_team_id fields). CSV columns are home_team and away_team
+    (team ID or name), with optional match_day and match_date columns per row.
+    
+    Returns:
+        tuple: (default match day, default match date, list of fixture dicts)
+    """
+    if request.is_json:
+        data = request.json or {}
+        fixtures = data.get('fixtures') or []
+        if not isinstance(fixtures, list):
+            fixtures = []
+        return data.get('match_day'), data.get('match_date'), [f if isinstance(f, dict) else {} for f in fixtures]
+    
+    csv_text = None
+    if request.mimetype == 'text/csv':
+        csv_text = request.get_data(as_text=True)
+    elif request.files.get('fixtures_file') and request.files['fixtures_file'].filename:
+        csv_text = request.files['fixtures_file'].read().decode('utf-8-sig')
+    
+    match_day = request.form.get('match_day') or request.args.get('match_day')
+    match_date = request.form.get('match_date') or request.args.get('match_date')
+    
+    if csv_text is not None:
+        fixtures = []
+        for row in csv.DictReader(StringIO(csv_text)):
+            row = {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+            if not any(row.values()):
+                continue
+            fixtures.append({
+                'home_team_id': row.get('home_team_id') or row.get('home_team'),
+                'away_team_id': row.get('away_team_id') or row.get('away_team'),
+                'match_day': row.get('match_day'),
+                'match_date': row.get('match_date') or row.get('date')
+            })
+        return match_day, match_date, fixtures
+    
+    home_ids = request.form.getlist('home_team_id')
+    away_ids = request.form.getlist('away_team_id')
+    fixtures = [
+        {'home_team_id': home_id, 'away_team_id': away_id}
+        for home_id, away_id in zip(home_ids, away_ids)
+        if home_id or away_id
+    ]
+    return match_day, match_date, fixtures
+
+def validate_round_fixtures(match_day, match_date, fixtures, teams):
+    """
+    Validate a round of fixtures and build the rows to insert.
+    
+    Args:
+        match_day: Match day applied to fixtures without their own
+        match_date: Match date applied to fixtures without their own
+        fixtures: List of fixture dicts from read_round_fixtures()
+        teams: List of team dicts with id and name
+    
+    Returns:
+        tuple: (list of match rows, list of {"row", "error"} dicts)
+    """
+    teams_by_id = {str(team['id']): team for team in teams}
+    teams_by_name = {team['name'].strip().lower(): team for team in teams if team.get('name')}
+    
+    def resolve_team(value):
+        value = str(value).strip() if value is not None else ''
+        team = teams_by_id.get(value) or teams_by_name.get(value.lower())
+        return team['id'] if team else None
+    
+    rows = []
+    errors = []
+    teams_in_round = {}
+    
+    if not fixtures:
+        errors.append({"row": None, "error": "No fixtures provided"})
+    
+    for index, fixture in enumerate(fixtures, start=1):
+        fixture_day = fixture.get('match_day') or match_day
+        fixture_date = fixture.get('match_date') or match_date or date.today().isoformat()
+        home_team_id = resolve_team(fixture.get('home_team_id'))
+        away_team_id = resolve_team(fixture.get('away_team_id'))
+        
+        if not fixture_day:
+            errors.append({"row": index, "error": "Match day is required"})
+            continue
+        if home_team_id is None or away_team_id is None:
+            errors.append({"row": index, "error": "Unknown or missing team"})
+            continue
+        if str(home_team_id) == str(away_team_id):
+            errors.append({"row": index, "error": "Home and away team must be different"})
+            continue
+        try:
+            date.fromisoformat(str(fixture_date))
+        except ValueError:
+            errors.append({"row": index, "error": f"Invalid match date: {fixture_date}"})
+            continue
+        
+        # A team can only play once per match day in a round
+        clash = False
+        for team_id in (home_team_id, away_team_id):
+            key = (fixture_day, str(team_id))
+            if key in teams_in_round:
+                errors.append({"row": index, "error": f"Team already plays in row {teams_in_round[key]}"})
+                clash = True
+                break
+        if clash:
+            continue
+        teams_in_round[(fixture_day, str(home_team_id))] = index
+        teams_in_round[(fixture_day, str(away_team_id))] = index
+        
+        rows.append({
+            "match_day": fixture_day,
+            "date": str(fixture_date),
+            "home_team_id": home_team_id,
+            "away_team_id": away_team_id
+        })
+    
+    return rows, errors
+
+@app.route('/create_match_round', methods=['POST'])
+@idempotency.idempotent
+def create_match_round():
+    """Create a whole match day of fixtures in one insert"""
+    # JSON and CSV clients get JSON back; the matches page form gets a redirect
+    wants_json = request.is_json or request.mimetype == 'text/csv'
+    
+    try:
+        match_day, match_date, fixtures = read_round_fixtures()
+        
+        if len(fixtures) > MAX_ROUND_FIXTURES:
+            errors = [{"row": None, "error": f"A round can have at most {MAX_ROUND_FIXTURES} fixtures"}]
+            rows = []
+        else:
+            teams = replica.get_teams() if replica.is_ready() else fetch_all(supabase, "teams", columns="id, name")
+            rows, errors = validate_round_fixtures(match_day, match_date, fixtures, teams)
+        
+        if errors:
+            if wants_json:
+                return jsonify({"success": False, "error": "Invalid fixtures", "errors": errors}), 400
+            for error in errors[:5]:
+                flash(f"Row {error['row']}: {error['error']}" if error['row'] else error['error'], "danger")
+            return redirect(url_for('matches'))
+        
+        # Insert every fixture in one call
+        result = supabase.table("matches").insert(rows).execute()
+        match_ids = [match["id"] for match in result.data] if result.data else []
+        
+        if len(match_ids) != len(rows):
+            if wants_json:
+                return jsonify({"success": False, "error": "Failed to create fixtures"}), 500
+            flash("Failed to create fixtures", "danger")
+            return redirect(url_for('matches'))
+        
+        idempotency.succeeded()
+        if wants_json:
+            return jsonify({"success": True, "match_ids": match_ids}), 201
+        
+        flash(f"Created {len(match_ids)} fixtures", "success")
+        return redirect(url_for('matches'))
+        
+    except Exception as e:
+        print(f"Error creating match round: {str(e)}")
+        if wants_json:
+            return jsonify({"success": False, "error": str(e)}), 500
+        flash(f"Error: {str(e)}", "danger")
+        return redirect(url_for('matches'))
+
 @app.route('/add_unmatched_player/<match_day_id>', methods=['POST'])
+@idempotency.idempotent
 def add_unmatched_player(match_day_id):
     """Add an unmatched player for a specific match day"""
     try:
@@ -498,12 +1020,25 @@ def add_unmatched_player(match_day_id):
         match = match_result.data[0]
         team_id = match["home_team_id"] if team == "home" else match["away_team_id"]
         
+        # A name matched to a player before is recorded as that player's appearance
+        alias_player_id = player_aliases.lookup(name, team_id)
+        if alias_player_id is not None:
+            version = None
+            if update_player_appearances(alias_player_id, match_day_id):
+                version = bump_match_version(match_day_id)
+            idempotency.succeeded()
+            return jsonify({
+                "success": True,
+                "resolved_player_id": alias_player_id,
+                "version": version,
+                "message": "Name is a known alias, appearance recorded for the matched player"
+            })
+        
         # Check if player already exists with this name and team
-        existing_player = supabase.table("unmatched_players").select("*").eq("name", name).eq("team_id", team_id).execute()
+        player = unmatched_lookup.find(supabase, name, team_id)
         
-        if existing_player.data and len(existing_player.data) > 0:
+        if player:
             # Increment existing player
-            player = existing_player.data[0]
             player_id = player["id"]
             new_occurrence_count = (player.get("occurrence_count") or 1) + 1
             
@@ -513,6 +1048,7 @@ def add_unmatched_player(match_day_id):
                 "last_match_id": last_match_id
             }).eq("id", player_id).execute()
             
+            idempotency.succeeded()
             return jsonify({
                 "success": True, 
                 "player_id": player_id,
@@ -541,6 +1077,7 @@ def add_unmatched_player(match_day_id):
         if not result.data or len(result.data) == 0:
             return jsonify({"success": False, "error": "Failed to add player"})
             
+        idempotency.succeeded()
         return jsonify({
             "success": True, 
             "player_id": result.data[0]["id"],
@@ -622,6 +1159,7 @@ def delete_unmatched_player(match_day_id):
         return jsonify({"success": False, "error": str(e)})
 
 @app.route('/match_player/<match_day_id>', methods=['POST'])
+@idempotency.idempotent
 def match_player(match_day_id):
     """Match an unmatched player to an existing player"""
     try:
@@ -645,8 +1183,11 @@ def match_player(match_day_id):
         # Check if selecting an unmatched player or regular player
         if existing_player_id.startswith("unmatched_"):
             # Matching to another unmatched player
-            # Extract the real ID
-            real_unmatched_id = existing_player_id.replace("unmatched_", "")
+            # Extract the real ID, following earlier merges to the root row
+            real_unmatched_id = unmatched_merges.resolve(existing_player_id.replace("unmatched_", ""))
+            
+            if str(real_unmatched_id) == str(unmatched_player_id):
+                return jsonify({"success": False, "error": "Cannot merge an unmatched player into itself"})
             
             # Get the target unmatched player
             target_unmatched = supabase.table("unmatched_players").select("*").eq("id", real_unmatched_id).execute()
@@ -656,20 +1197,29 @@ def match_player(match_day_id):
                 
             target_player = target_unmatched.data[0]
             current_count = target_player.get("occurrence_count", 1) or 1
+            moved_count = unmatched_player.get("occurrence_count", 1) or 1
             
-            # Update the target unmatched player's occurrence count
+            # Move the original's occurrences onto the target
             supabase.table("unmatched_players").update({
-                "occurrence_count": current_count + 1,
+                "occurrence_count": current_count + moved_count,
                 "last_seen": time.strftime("%Y-%m-%d"),
                 "last_match_id": match_day_id
             }).eq("id", real_unmatched_id).execute()
             
-            # Mark the original unmatched player as matched to the target
+            # Mark the original unmatched player as matched to the target; its
+            # count now lives on the target, so compaction has nothing to move
             supabase.table("unmatched_players").update({
                 "status": "merged",
-                "matched_player_id": real_unmatched_id
+                "matched_player_id": real_unmatched_id,
+                "occurrence_count": 0
             }).eq("id", unmatched_player_id).execute()
             
+            # Rows merged into this one earlier move with it, so no chain forms
+            supabase.table("unmatched_players").update({
+                "matched_player_id": real_unmatched_id
+            }).eq("status", "merged").eq("matched_player_id", unmatched_player_id).execute()
+            unmatched_merges.merge(unmatched_player_id, real_unmatched_id)
+            
         else:
             # Matching to a regular player
             # Update the status of the unmatched player
@@ -681,6 +1231,9 @@ def match_player(match_day_id):
             if not status_result.data or len(status_result.data) == 0:
                 return jsonify({"success": False, "error": "Failed to update unmatched player status"})
             
+            # Resolve this spelling straight to the player next time
+            player_aliases.learn(supabase, unmatched_player.get("name"), unmatched_player.get("team_id"), existing_player_id)
+            
             # Create an appearance for the existing player if not already present
             appearance_result = supabase.table("appearances").select("*").eq("player_id", existing_player_id).eq("match_id", match_day_id).execute()
             
@@ -690,13 +1243,17 @@ def match_player(match_day_id):
                     "player_id": existing_player_id,
                     "match_id": match_day_id
                 }).execute()
+                appearance_index.add(match_day_id, [existing_player_id])
                 
                 # Update total appearances for the player
                 player = supabase.table("players").select("total_appearances").eq("id", existing_player_id).execute()
                 if player.data and len(player.data) > 0:
                     current_count = player.data[0].get("total_appearances", 0) or 0
                     supabase.table("players").update({"total_appearances": current_count + 1}).eq("id", existing_player_id).execute()
+                
+                bump_match_version(match_day_id)
         
+        idempotency.succeeded()
         return jsonify({
             "success": True,
             "message": "Player matched successfully"
@@ -706,12 +1263,80 @@ def match_player(match_day_id):
         print(f"Error matching player: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/import/appearances', methods=['POST'])
+def import_appearances():
+    """Bulk import appearances from a CSV or an xlsx shaped like the league export"""
+    # API clients get the full report; the matches page form gets a flash summary
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        if wants_json:
+            return jsonify({"success": False, "error": "No file uploaded"}), 400
+        flash("Choose a CSV or Excel file to import", "danger")
+        return redirect(url_for('matches'))
+    
+    filename = secure_filename(upload.filename).lower()
+    if filename.endswith('.xlsx'):
+        rows = appearance_import.iter_xlsx_rows(upload.stream)
+    elif filename.endswith('.csv'):
+        rows = appearance_import.iter_csv_rows(upload.stream)
+    else:
+        if wants_json:
+            return jsonify({"success": False, "error": "Only .csv and .xlsx files are supported"}), 400
+        flash("Only .csv and .xlsx files are supported", "danger")
+        return redirect(url_for('matches'))
+    
+    try:
+        roster = appearance_import.RosterIndex.load(supabase)
+        report = appearance_import.run_import(supabase, rows, roster, adjust_total_appearances)
+        
+        # Clients patching these matches from an older version must refresh
+        for match_id in report["changed_match_ids"]:
+            bump_match_version(match_id)
+        
+        print(f"Imported {report['appearances_added']} appearances from {report['rows_read']} rows "
+              f"in {report['elapsed_seconds']}s ({report['rows_per_second']} rows/s)")
+        
+        if wants_json:
+            return jsonify({"success": True, **report})
+        
+        flash(f"Imported {report['appearances_added']} appearances "
+              f"({report['already_present']} already recorded, {report['unresolved']} rows could not be matched)",
+              "success" if not report['unresolved'] else "warning")
+        return redirect(url_for('matches'))
+        
+    except Exception as e:
+        print(f"Error importing appearances: {str(e)}")
+        if wants_json:
+            return jsonify({"success": False, "error": str(e)}), 500
+        flash(f"Error: {str(e)}", "danger")
+        return redirect(url_for('matches'))
+
 @app.route('/export/teams/excel')
 def export_teams_excel():
     """Initiate Excel export process"""
     # Generate a unique ID for this export task
     export_id = str(uuid.uuid4())
     
+    # Serve the pre-built export if nothing has changed since it was generated
+    cached = export_cache.get_fresh_artifact(app.config['EXPORT_FOLDER'], supabase)
+    if cached and not request.args.get('fresh'):
+        file_path, built_at = cached
+        with task_lock:
+            processing_tasks[export_id] = {
+                'status': 'complete',
+                'file_path': file_path,
+                'from_cache': True,
+                'built_at': built_at,
+                'step_details': {},
+                'log_messages': [],
+                'start_time': time.time(),
+                'task_type': 'excel_export',
+                'progress': 100
+            }
+        return redirect(url_for('download_excel', export_id=export_id))
+    
     # Initialize export status
     with task_lock:
         processing_tasks[export_id] = {
@@ -723,7 +1348,8 @@ def export_teams_excel():
             'task_type': 'excel_export',
             'progress': 0,
             'teams_processed': 0,
-            'total_teams': 0
+            'total_teams': 0,
+            'phases': {}
         }
     
     # Start background thread for processing
@@ -779,6 +1405,10 @@ def export_status(export_id):
         if 'step_details' in task:
             response['step_details'] = task['step_details']
         
+        # Add per-phase timings recorded so far
+        if 'phases' in task:
+            response['phases'] = export_metrics.snapshot_phases(task['phases'])
+        
         # Add any log messages
         if 'log_messages' in task:
             response['log_messages'] = task['log_messages']
@@ -793,6 +1423,11 @@ def export_status(export_id):
     
     return jsonify(response)
 
+@app.route('/export/history')
+def export_history():
+    """API endpoint to get phase timings for recently finished exports"""
+    return jsonify(export_metrics.get_history())
+
 @app.route('/export/download/<export_id>')
 def download_excel(export_id):
     """Download the generated Excel file"""
@@ -818,16 +1453,434 @@ def download_excel(export_id):
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+def get_export_styles():
+    """Build the fonts, fills and borders shared by the Excel exports"""
+    return {
+        'header_font': Font(bold=True, size=12),
+        'header_fill': PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid"),
+        'header_alignment': Alignment(horizontal="center", vertical="center"),
+        'subheader_font': Font(bold=True, size=11),
+        'subheader_fill': PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid"),
+        'unmatched_fill': PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid"),
+        'thin_border': Border(
+            left=Side(style='thin'), 
+            right=Side(style='thin'), 
+            top=Side(style='thin'), 
+            bottom=Side(style='thin')
+        )
+    }
+
+def safe_sheet_name(name):
+    """Make a valid worksheet title (max 31 chars, no special chars)"""
+    return name[:31].replace('/', '_').replace('\\', '_').replace('?', '_').replace('*', '_').replace('[', '_').replace(']', '_').replace(':', '_')
+
+def build_match_day_map(matches):
+    """
+    Map match IDs to match days.
+    
+    Args:
+        matches: Match rows with id and match_day
+    
+    Returns:
+        tuple: (sorted list of match days, dict of str(match_id) -> match_day)
+    """
+    match_days = []
+    match_map = {}
+    for match in matches:
+        match_map[str(match["id"])] = match["match_day"]
+        if match["match_day"] not in match_days:
+            match_days.append(match["match_day"])
+    
+    match_days.sort()
+    return match_days, match_map
+
+def pivot_player_match_days(player_appearances, match_map):
+    """
+    Work out which match days each player appeared in.
+    
+    Args:
+        player_appearances: Dict of player_id -> appearance rows with match_id
+        match_map: Dict of str(match_id) -> match_day
+    
+    Returns:
+        dict: player_id -> set of match days
+    """
+    return {
+        player_id: {
+            match_map[str(appearance["match_id"])]
+            for appearance in appearances
+            if str(appearance["match_id"]) in match_map
+        }
+        for player_id, appearances in player_appearances.items()
+    }
+
+def write_team_sheet(wb, team_name, players, player_appearances, player_match_days,
+                     match_days, match_map, unmatched_players, styles):
+    """
+    Add one team's appearance grid and unmatched names to a workbook.
+    
+    Args:
+        wb: openpyxl Workbook
+        team_name: Team name, also used as the sheet title
+        players: Player rows for the team, in display order
+        player_appearances: Dict of str(player_id) -> appearance rows
+        player_match_days: Dict of str(player_id) -> set of match days played
+        match_days: Sorted match days used as grid columns
+        match_map: Dict of match_id -> match_day
+        unmatched_players: Unmatched player rows for the team
+        styles: Dict from get_export_styles()
+    
+    Returns:
+        int: Number of player and unmatched rows written
+    """
+    header_font = styles['header_font']
+    header_fill = styles['header_fill']
+    header_alignment = styles['header_alignment']
+    subheader_font = styles['subheader_font']
+    subheader_fill = styles['subheader_fill']
+    unmatched_fill = styles['unmatched_fill']
+    thin_border = styles['thin_border']
+    rows_written = 0
+    
+    # Create a sheet for this team
+    ws = wb.create_sheet(title=safe_sheet_name(team_name))
+    
+    # Set column widths
+    ws.column_dimensions['A'].width = 30  # Player name
+    ws.column_dimensions['B'].width = 15  # Total appearances
+    
+    # Add headers
+    ws['A1'] = team_name
+    ws['A1'].font = Font(bold=True, size=14)
+    ws.merge_cells('A1:E1')
+    
+    ws['A3'] = "Player Name"
+    ws['A3'].font = header_font
+    ws['A3'].fill = header_fill
+    ws['A3'].alignment = header_alignment
+    ws['A3'].border = thin_border
+    
+    ws['B3'] = "Total Appearances"
+    ws['B3'].font = header_font
+    ws['B3'].fill = header_fill
+    ws['B3'].alignment = header_alignment
+    ws['B3'].border = thin_border
+    
+    # Add match day columns
+    col_index = 3  # Start from column C
+    for match_day in match_days:
+        col_letter = get_column_letter(col_index)
+        ws[f'{col_letter}3'] = match_day
+        ws[f'{col_letter}3'].font = header_font
+        ws[f'{col_letter}3'].fill = header_fill
+        ws[f'{col_letter}3'].alignment = header_alignment
+        ws[f'{col_letter}3'].border = thin_border
+        ws.column_dimensions[col_letter].width = 12
+        col_index += 1
+    
+    row_index = 4  # Start from row 4 for player data
+    
+    # Add player data
+    if players:
+        for player in players:
+            player_id = str(player["id"])
+            player_name = player["name"]
+            appearances = player_appearances.get(player_id, [])
+            
+            # Add player name
+            ws[f'A{row_index}'] = player_name
+            ws[f'A{row_index}'].border = thin_border
+            
+            # Count total appearances
+            ws[f'B{row_index}'] = len(appearances)
+            ws[f'B{row_index}'].alignment = Alignment(horizontal="center")
+            ws[f'B{row_index}'].border = thin_border
+            
+            # Mark appearances by match day
+            if appearances:
+                played_days = player_match_days.get(player_id, set())
+                col_index = 3  # Start from column C
+                for match_day in match_days:
+                    col_letter = get_column_letter(col_index)
+                    
+                    ws[f'{col_letter}{row_index}'] = 1 if match_day in played_days else 0
+                    ws[f'{col_letter}{row_index}'].alignment = Alignment(horizontal="center")
+                    ws[f'{col_letter}{row_index}'].border = thin_border
+                    col_index += 1
+            
+            row_index += 1
+            rows_written += 1
+    
+    # Add a separator
+    row_index += 1
+    ws[f'A{row_index}'] = "Unmatched Player Names"
+    ws[f'A{row_index}'].font = subheader_font
+    ws[f'A{row_index}'].fill = subheader_fill
+    ws.merge_cells(f'A{row_index}:E{row_index}')
+    
+    row_index += 1
+    ws[f'A{row_index}'] = "Player Name"
+    ws[f'A{row_index}'].font = subheader_font
+    ws[f'A{row_index}'].fill = unmatched_fill
+    ws[f'A{row_index}'].border = thin_border
+    
+    ws[f'B{row_index}'] = "Occurrences"
+    ws[f'B{row_index}'].font = subheader_font
+    ws[f'B{row_index}'].fill = unmatched_fill
+    ws[f'B{row_index}'].alignment = Alignment(horizontal="center")
+    ws[f'B{row_index}'].border = thin_border
+    
+    ws[f'C{row_index}'] = "First Seen"
+    ws[f'C{row_index}'].font = subheader_font
+    ws[f'C{row_index}'].fill = unmatched_fill
+    ws[f'C{row_index}'].alignment = Alignment(horizontal="center")
+    ws[f'C{row_index}'].border = thin_border
+    
+    ws[f'D{row_index}'] = "Last Seen"
+    ws[f'D{row_index}'].font = subheader_font
+    ws[f'D{row_index}'].fill = unmatched_fill
+    ws[f'D{row_index}'].alignment = Alignment(horizontal="center")
+    ws[f'D{row_index}'].border = thin_border
+    
+    ws[f'E{row_index}'] = "Last Match"
+    ws[f'E{row_index}'].font = subheader_font
+    ws[f'E{row_index}'].fill = unmatched_fill
+    ws[f'E{row_index}'].alignment = Alignment(horizontal="center")
+    ws[f'E{row_index}'].border = thin_border
+    
+    row_index += 1
+    
+    # Add unmatched player data
+    if unmatched_players:
+        for player in unmatched_players:
+            player_name = player["name"]
+            occurrences = player.get("occurrence_count", 1)
+            first_seen = player.get("first_seen", "")
+            last_seen = player.get("last_seen", "")
+            last_match_id = player.get("last_match_id", "")
+            last_match_day = match_map.get(str(last_match_id), "") if last_match_id else ""
+            
+            ws[f'A{row_index}'] = player_name
+            ws[f'A{row_index}'].border = thin_border
+            
+            ws[f'B{row_index}'] = occurrences
+            ws[f'B{row_index}'].alignment = Alignment(horizontal="center")
+            ws[f'B{row_index}'].border = thin_border
+            
+            ws[f'C{row_index}'] = first_seen
+            ws[f'C{row_index}'].alignment = Alignment(horizontal="center")
+            ws[f'C{row_index}'].border = thin_border
+            
+            ws[f'D{row_index}'] = last_seen
+            ws[f'D{row_index}'].alignment = Alignment(horizontal="center")
+            ws[f'D{row_index}'].border = thin_border
+            
+            ws[f'E{row_index}'] = last_match_day
+            ws[f'E{row_index}'].alignment = Alignment(horizontal="center")
+            ws[f'E{row_index}'].border = thin_border
+            
+            row_index += 1
+            rows_written += 1
+    else:
+        ws[f'A{row_index}'] = "No unmatched player names found"
+        ws.merge_cells(f'A{row_index}:E{row_index}')
+        ws[f'A{row_index}'].alignment = Alignment(horizontal="center")
+        row_index += 1
+    
+    return rows_written
+
+def send_team_workbook(team_name, players, matches, appearances, unmatched_players):
+    """
+    Build a single-team workbook in memory and send it as a download.
+    
+    Args:
+        team_name: Team name
+        players: Player rows for the team, ordered by name
+        matches: Match rows with id, match_day and date
+        appearances: Appearance rows (player_id, match_id) for the team's players
+        unmatched_players: Unmatched player rows for the team
+    
+    Returns:
+        Response: xlsx file download
+    """
+    match_days, match_map = build_match_day_map(matches)
+    
+    # Group appearances by player; ids compare as text whether rows came from the database or the index
+    player_appearances = {str(player["id"]): [] for player in players}
+    for appearance in appearances:
+        player_key = str(appearance["player_id"])
+        if player_key in player_appearances:
+            player_appearances[player_key].append(appearance)
+    
+    player_match_days = pivot_player_match_days(player_appearances, match_map)
+    
+    # Merged names are counted on the row they were merged into
+    unmatched_players = [player for player in unmatched_players if player.get("status") != "merged"]
+    
+    wb = Workbook()
+    write_team_sheet(
+        wb, team_name, players, player_appearances, player_match_days,
+        match_days, match_map, unmatched_players, get_export_styles()
+    )
+    
+    # Remove default sheet
+    if "Sheet" in wb.sheetnames:
+        wb.remove(wb["Sheet"])
+    
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    
+    # Generate a filename with team name and date
+    current_date = time.strftime("%Y%m%d")
+    filename = f"{safe_sheet_name(team_name)}_appearances_{current_date}.xlsx"
+    
+    return send_file(
+        output,
+        as_attachment=True,
+        download_name=filename,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+@app.route('/export/team/<team_id>.xlsx')
+def export_team_excel(team_id):
+    """Generate and download a single team's Excel sheet on demand"""
+    try:
+        if replica.is_ready():
+            team_data = replica.get_team(team_id)
+            if not team_data:
+                flash('Team not found', 'danger')
+                return redirect(url_for('players'))
+            
+            return send_team_workbook(
+                team_data["name"],
+                replica.get_players(team_id),
+                replica.get_matches_by_date(),
+                replica.get_team_appearances(team_id),
+                replica.get_team_unmatched(team_id)
+            )
+        
+        # Run the independent queries side by side
+        team_future = query_executor.submit(
+            lambda: supabase.table("teams").select("*").eq("id", team_id).execute()
+        )
+        matches_future = query_executor.submit(
+            fetch_all, supabase, "matches", columns="id, match_day, date", order_by="date"
+        )
+        players_future = query_executor.submit(
+            fetch_all, supabase, "players", filters=lambda q: q.eq("team_id", team_id), order_by="name"
+        )
+        # The appearance index answers without a round trip once loaded
+        appearances_future = None
+        if not appearance_index.is_ready():
+            appearances_future = query_executor.submit(
+                fetch_all, supabase, "appearances",
+                columns="id, player_id, match_id, player:player_id!inner(team_id)",
+                filters=lambda q: q.eq("player.team_id", team_id)
+            )
+        unmatched_future = query_executor.submit(
+            fetch_all, supabase, "unmatched_players",
+            filters=lambda q: q.eq("team_id", team_id),
+            order_by="occurrence_count", desc=True
+        )
+        
+        team = team_future.result()
+        if not team.data or len(team.data) == 0:
+            flash('Team not found', 'danger')
+            return redirect(url_for('players'))
+        
+        players_data = players_future.result()
+        if appearances_future is not None:
+            appearances_data = appearances_future.result()
+        else:
+            appearances_data = appearance_index.appearance_rows([player["id"] for player in players_data])
+        
+        return send_team_workbook(
+            team.data[0]["name"],
+            players_data,
+            matches_future.result(),
+            appearances_data,
+            unmatched_future.result()
+        )
+        
+    except Exception as e:
+        print(f"Error exporting team {team_id}: {str(e)}")
+        flash(f"Error generating team Excel file: {str(e)}", 'danger')
+        return redirect(url_for('players', team_id=team_id))
+
+# Tables returned by load_export_snapshot()
+EXPORT_SNAPSHOT_TABLES = ('teams', 'matches', 'players', 'appearances', 'unmatched_players')
+
+def load_export_snapshot(data_version):
+    """
+    Read everything the league export needs from one consistent snapshot.
+    
+    Reads from the local replica when it is up to date and holds every change
+    up to data_version, including changes made by other workers. Otherwise uses the
+    export_snapshot() database function (migrations/001_export_snapshot.sql),
+    which builds every table in a single statement so edits made while the export
+    runs cannot leave the summary and team sheets disagreeing. If the function is
+    not installed, the tables are read in parallel instead, which narrows the window
+    to one round trip but is not transactional.
+    
+    Args:
+        data_version: export_cache.current_version() taken when the export started
+    
+    Returns:
+        dict: snapshot_at plus a list of rows for each of EXPORT_SNAPSHOT_TABLES
+    """
+    # The local replica answers with plain SQL and no network round trips
+    if replica.is_ready() and export_cache.covers(replica.data_version(), data_version):
+        return replica.load_snapshot()
+    
+    try:
+        result = supabase.rpc("export_snapshot").execute()
+        if result.data and all(table in result.data for table in EXPORT_SNAPSHOT_TABLES):
+            snapshot = result.data
+            for table in EXPORT_SNAPSHOT_TABLES:
+                snapshot[table] = snapshot[table] or []
+            return snapshot
+    except Exception as e:
+        print(f"export_snapshot() unavailable, reading tables directly: {str(e)}")
+    
+    snapshot_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    futures = {
+        'teams': query_executor.submit(fetch_all, supabase, "teams", order_by="name"),
+        'matches': query_executor.submit(fetch_all, supabase, "matches", columns="id, match_day, date", order_by="date"),
+        'players': query_executor.submit(fetch_all, supabase, "players", order_by="name"),
+        'unmatched_players': query_executor.submit(fetch_all, supabase, "unmatched_players", order_by="occurrence_count", desc=True)
+    }
+    
+    # The largest table comes from the appearance index when it is loaded and not older than data_version
+    appearances = None
+    if export_cache.covers(appearance_index.data_version(), data_version):
+        appearances = appearance_index.appearance_rows()
+    if appearances is None:
+        futures['appearances'] = query_executor.submit(fetch_all, supabase, "appearances", columns="id, player_id, match_id")
+    
+    snapshot = {table: future.result() for table, future in futures.items()}
+    if appearances is not None:
+        snapshot['appearances'] = appearances
+    snapshot['snapshot_at'] = snapshot_at
+    return snapshot
+
 def generate_excel_export(export_id):
     """Background task to generate Excel export"""
+    # Remember the data version so edits made mid-export leave the cache stale
+    data_version = export_cache.current_version(supabase)
+    
     with task_lock:
         task = processing_tasks[export_id]
+        task.setdefault('phases', {})
+        phases = task['phases']
         # Add log entry
         task['log_messages'].append({
             'message': "Starting Excel export process",
             'type': 'info'
         })
     
+    export_metrics.start_memory_tracing()
+    
     try:
         # Create a progress logging function
         def log_progress(message, progress=None, step=None, details=None, message_type='info'):
@@ -843,105 +1896,116 @@ def generate_excel_export(export_id):
                     task['step_details'][str(step)] = details
                 print(f"Export progress: {message}")
         
+        # Time a named phase of this export
+        def timed(name):
+            return export_metrics.phase(phases, name, task_lock)
+        
         # Create a new workbook
         wb = Workbook()
         
-        log_progress("Fetching team data from database", 5, 1, "Fetching teams")
+        log_progress("Fetching a consistent snapshot of league data", 5, 1, "Fetching snapshot")
         
-        # Get all teams
-        teams = supabase.table("teams").select("*").order("name").execute()
+        # Read everything once, so summary totals and team sheets agree
+        with timed('fetch_snapshot') as timing:
+            snapshot = load_export_snapshot(data_version)
+            timing['rows'] = sum(len(snapshot[table]) for table in EXPORT_SNAPSHOT_TABLES)
+        
+        teams = snapshot['teams']
+        matches = snapshot['matches']
         
-        if not teams.data:
+        with task_lock:
+            task['snapshot_at'] = snapshot.get('snapshot_at')
+        
+        if not teams:
             with task_lock:
                 task['status'] = 'error'
                 task['error'] = 'No teams found to export'
+                export_metrics.record_history(export_id, task)
             return
         
         # Set total teams count
         with task_lock:
-            task['total_teams'] = len(teams.data)
+            task['total_teams'] = len(teams)
         
-        log_progress(f"Found {len(teams.data)} teams", 10, 1, f"Found {len(teams.data)} teams")
+        log_progress(f"Found {len(teams)} teams", 10, 1, f"Found {len(teams)} teams")
         
-        # Get all matches
-        log_progress("Fetching match data", 15, 2, "Fetching matches")
-        matches = supabase.table("matches").select("id, match_day, date").order("date").execute()
-        match_days = []
-        match_map = {}
-        
-        if matches.data:
+        # Group the snapshot rows for the per-team sheets
+        log_progress("Indexing match data", 15, 2, "Indexing matches")
+        with timed('pivot') as timing:
             # Create a mapping of match IDs to match days
-            for match in matches.data:
-                match_id = match["id"]
-                match_day = match["match_day"]
-                match_map[match_id] = match_day
-                if match_day not in match_days:
-                    match_days.append(match_day)
-            
-            log_progress(f"Found {len(matches.data)} matches across {len(match_days)} match days", 
-                        20, 2, f"Found {len(matches.data)} matches")
+            match_days, match_map = build_match_day_map(matches)
+            
+            players_by_team = {}
+            for player in snapshot['players']:
+                players_by_team.setdefault(player.get("team_id"), []).append(player)
+            
+            appearances_by_player = {}
+            for appearance in snapshot['appearances']:
+                appearances_by_player.setdefault(str(appearance["player_id"]), []).append(appearance)
+            
+            unmatched_by_team = {}
+            for player in snapshot['unmatched_players']:
+                # Merged names are counted on the row they were merged into
+                if player.get("status") != "merged":
+                    unmatched_by_team.setdefault(player.get("team_id"), []).append(player)
+            
+            timing['rows'] = len(snapshot['players']) + len(snapshot['appearances']) + len(snapshot['unmatched_players'])
+        
+        if matches:
+            log_progress(f"Found {len(matches)} matches across {len(match_days)} match days", 
+                        20, 2, f"Found {len(matches)} matches")
         else:
             log_progress("No matches found", 20, 2, "No matches found", "warning")
         
-        # Sort match days
-        match_days.sort()
-        
         # Remove default sheet
         if "Sheet" in wb.sheetnames:
             wb.remove(wb["Sheet"])
         
         # Define styles
         log_progress("Setting up Excel styles and formats", 25, 3, "Setting up styles")
-        header_font = Font(bold=True, size=12)
-        header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        subheader_font = Font(bold=True, size=11)
-        subheader_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-        
-        unmatched_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-        thin_border = Border(
-            left=Side(style='thin'), 
-            right=Side(style='thin'), 
-            top=Side(style='thin'), 
-            bottom=Side(style='thin')
-        )
+        styles = get_export_styles()
+        header_font = styles['header_font']
+        header_fill = styles['header_fill']
+        header_alignment = styles['header_alignment']
+        thin_border = styles['thin_border']
         
         # Create a summary sheet first
         log_progress("Creating summary sheet", 30, 4, "Creating summary")
-        summary = wb.create_sheet(title="Summary", index=0)
-        summary['A1'] = "Teams and Players Summary"
-        summary['A1'].font = Font(bold=True, size=14)
-        summary.merge_cells('A1:D1')
-        
-        summary['A3'] = "Team Name"
-        summary['A3'].font = header_font
-        summary['A3'].fill = header_fill
-        summary['A3'].alignment = header_alignment
-        summary['A3'].border = thin_border
-        
-        summary['B3'] = "Players"
-        summary['B3'].font = header_font
-        summary['B3'].fill = header_fill
-        summary['B3'].alignment = header_alignment
-        summary['B3'].border = thin_border
-        
-        summary['C3'] = "Unmatched Names"
-        summary['C3'].font = header_font
-        summary['C3'].fill = header_fill
-        summary['C3'].alignment = header_alignment
-        summary['C3'].border = thin_border
-        
-        summary['D3'] = "Total Appearances"
-        summary['D3'].font = header_font
-        summary['D3'].fill = header_fill
-        summary['D3'].alignment = header_alignment
-        summary['D3'].border = thin_border
-        
-        # Set column widths for summary
-        summary.column_dimensions['A'].width = 30
-        summary.column_dimensions['B'].width = 15
-        summary.column_dimensions['C'].width = 20
-        summary.column_dimensions['D'].width = 20
+        with timed('write_summary'):
+            summary = wb.create_sheet(title="Summary", index=0)
+            summary['A1'] = "Teams and Players Summary"
+            summary['A1'].font = Font(bold=True, size=14)
+            summary.merge_cells('A1:D1')
+            
+            summary['A3'] = "Team Name"
+            summary['A3'].font = header_font
+            summary['A3'].fill = header_fill
+            summary['A3'].alignment = header_alignment
+            summary['A3'].border = thin_border
+            
+            summary['B3'] = "Players"
+            summary['B3'].font = header_font
+            summary['B3'].fill = header_fill
+            summary['B3'].alignment = header_alignment
+            summary['B3'].border = thin_border
+            
+            summary['C3'] = "Unmatched Names"
+            summary['C3'].font = header_font
+            summary['C3'].fill = header_fill
+            summary['C3'].alignment = header_alignment
+            summary['C3'].border = thin_border
+            
+            summary['D3'] = "Total Appearances"
+            summary['D3'].font = header_font
+            summary['D3'].fill = header_fill
+            summary['D3'].alignment = header_alignment
+            summary['D3'].border = thin_border
+            
+            # Set column widths for summary
+            summary.column_dimensions['A'].width = 30
+            summary.column_dimensions['B'].width = 15
+            summary.column_dimensions['C'].width = 20
+            summary.column_dimensions['D'].width = 20
         
         # Process each team
         log_progress("Starting to process individual team data", 35, 5, "Processing teams")
@@ -953,267 +2017,99 @@ def generate_excel_export(export_id):
         
         # Calculate base progress percentage and increment per team
         base_progress = 35
-        progress_per_team = 55 / len(teams.data)  # 55% of progress bar allocated to team processing
+        progress_per_team = 55 / len(teams)  # 55% of progress bar allocated to team processing
         
-        for team_index, team in enumerate(teams.data):
+        for team_index, team in enumerate(teams):
             team_id = team["id"]
             team_name = team["name"]
             
             current_progress = base_progress + (team_index * progress_per_team)
-            log_progress(f"Processing team {team_index+1}/{len(teams.data)}: {team_name}", 
-                        int(current_progress), 5, f"Team {team_index+1}/{len(teams.data)}")
+            log_progress(f"Processing team {team_index+1}/{len(teams)}: {team_name}", 
+                        int(current_progress), 5, f"Team {team_index+1}/{len(teams)}")
             
             # Update teams processed counter
             with task_lock:
                 task['teams_processed'] = team_index + 1
             
-            # Create a sheet for this team
-            # Ensure sheet name is valid (max 31 chars, no special chars)
-            sheet_name = team_name[:31].replace('/', '_').replace('\\', '_').replace('?', '_').replace('*', '_').replace('[', '_').replace(']', '_').replace(':', '_')
-            ws = wb.create_sheet(title=sheet_name)
-            
-            # Set column widths
-            ws.column_dimensions['A'].width = 30  # Player name
-            ws.column_dimensions['B'].width = 15  # Total appearances
-            
-            # Add headers
-            ws['A1'] = team_name
-            ws['A1'].font = Font(bold=True, size=14)
-            ws.merge_cells('A1:E1')
-            
-            ws['A3'] = "Player Name"
-            ws['A3'].font = header_font
-            ws['A3'].fill = header_fill
-            ws['A3'].alignment = header_alignment
-            ws['A3'].border = thin_border
-            
-            ws['B3'] = "Total Appearances"
-            ws['B3'].font = header_font
-            ws['B3'].fill = header_fill
-            ws['B3'].alignment = header_alignment
-            ws['B3'].border = thin_border
-            
-            # Add match day columns
-            col_index = 3  # Start from column C
-            for match_day in match_days:
-                col_letter = get_column_letter(col_index)
-                ws[f'{col_letter}3'] = match_day
-                ws[f'{col_letter}3'].font = header_font
-                ws[f'{col_letter}3'].fill = header_fill
-                ws[f'{col_letter}3'].alignment = header_alignment
-                ws[f'{col_letter}3'].border = thin_border
-                ws.column_dimensions[col_letter].width = 12
-                col_index += 1
-            
             # Get players for this team
-            players = supabase.table("players").select("*").eq("team_id", team_id).order("name").execute()
-            player_count = len(players.data) if players.data else 0
+            players = players_by_team.get(team_id, [])
+            player_count = len(players)
             total_players += player_count
             
-            row_index = 4  # Start from row 4 for player data
-            
-            # Add player data
-            if players.data:
-                for player in players.data:
-                    player_id = player["id"]
-                    player_name = player["name"]
-                    
-                    # Add player name
-                    ws[f'A{row_index}'] = player_name
-                    ws[f'A{row_index}'].border = thin_border
-                    
-                    # Get player appearances
-                    appearances = supabase.table("appearances").select("match_id").eq("player_id", player_id).execute()
-                    
-                    # Count total appearances
-                    total_appearances_for_player = len(appearances.data) if appearances.data else 0
-                    total_appearances += total_appearances_for_player
-                    
-                    ws[f'B{row_index}'] = total_appearances_for_player
-                    ws[f'B{row_index}'].alignment = Alignment(horizontal="center")
-                    ws[f'B{row_index}'].border = thin_border
-                    
-                    # Mark appearances by match day
-                    if appearances.data:
-                        col_index = 3  # Start from column C
-                        for match_day in match_days:
-                            col_letter = get_column_letter(col_index)
-                            
-                            # Check if player appeared in any match with this match day
-                            appeared = False
-                            for appearance in appearances.data:
-                                match_id = appearance["match_id"]
-                                if match_id in match_map and match_map[match_id] == match_day:
-                                    appeared = True
-                                    break
-                            
-                            if appeared:
-                                ws[f'{col_letter}{row_index}'] = 1
-                                ws[f'{col_letter}{row_index}'].alignment = Alignment(horizontal="center")
-                            else:
-                                ws[f'{col_letter}{row_index}'] = 0
-                                ws[f'{col_letter}{row_index}'].alignment = Alignment(horizontal="center")
-                            
-                            ws[f'{col_letter}{row_index}'].border = thin_border
-                            col_index += 1
-                    
-                    row_index += 1
-            
-            # Add a separator
-            row_index += 1
-            ws[f'A{row_index}'] = "Unmatched Player Names"
-            ws[f'A{row_index}'].font = subheader_font
-            ws[f'A{row_index}'].fill = subheader_fill
-            ws.merge_cells(f'A{row_index}:E{row_index}')
+            # Work out which match days each player appeared in
+            with timed('pivot') as timing:
+                player_appearances = {str(player["id"]): appearances_by_player.get(str(player["id"]), []) for player in players}
+                player_match_days = pivot_player_match_days(player_appearances, match_map)
+                timing['rows'] = sum(len(appearances) for appearances in player_appearances.values())
             
             # Get unmatched players for this team
-            unmatched_players = supabase.table("unmatched_players").select("*").eq("team_id", team_id).order("occurrence_count", desc=True).execute()
-            unmatched_count = len(unmatched_players.data) if unmatched_players.data else 0
+            unmatched_players = unmatched_by_team.get(team_id, [])
+            unmatched_count = len(unmatched_players)
             total_unmatched += unmatched_count
             
-            row_index += 1
-            ws[f'A{row_index}'] = "Player Name"
-            ws[f'A{row_index}'].font = subheader_font
-            ws[f'A{row_index}'].fill = unmatched_fill
-            ws[f'A{row_index}'].border = thin_border
-            
-            ws[f'B{row_index}'] = "Occurrences"
-            ws[f'B{row_index}'].font = subheader_font
-            ws[f'B{row_index}'].fill = unmatched_fill
-            ws[f'B{row_index}'].alignment = Alignment(horizontal="center")
-            ws[f'B{row_index}'].border = thin_border
-            
-            ws[f'C{row_index}'] = "First Seen"
-            ws[f'C{row_index}'].font = subheader_font
-            ws[f'C{row_index}'].fill = unmatched_fill
-            ws[f'C{row_index}'].alignment = Alignment(horizontal="center")
-            ws[f'C{row_index}'].border = thin_border
-            
-            ws[f'D{row_index}'] = "Last Seen"
-            ws[f'D{row_index}'].font = subheader_font
-            ws[f'D{row_index}'].fill = unmatched_fill
-            ws[f'D{row_index}'].alignment = Alignment(horizontal="center")
-            ws[f'D{row_index}'].border = thin_border
-            
-            ws[f'E{row_index}'] = "Last Match"
-            ws[f'E{row_index}'].font = subheader_font
-            ws[f'E{row_index}'].fill = unmatched_fill
-            ws[f'E{row_index}'].alignment = Alignment(horizontal="center")
-            ws[f'E{row_index}'].border = thin_border
+            with timed('write_team_sheet') as timing:
+                timing['rows'] = write_team_sheet(
+                    wb, team_name, players, player_appearances, player_match_days,
+                    match_days, match_map, unmatched_players, styles
+                )
             
-            row_index += 1
-            
-            # Add unmatched player data
-            if unmatched_players.data:
-                for player in unmatched_players.data:
-                    player_name = player["name"]
-                    occurrences = player.get("occurrence_count", 1)
-                    first_seen = player.get("first_seen", "")
-                    last_seen = player.get("last_seen", "")
-                    last_match_id = player.get("last_match_id", "")
-                    last_match_day = match_map.get(last_match_id, "") if last_match_id else ""
-                    
-                    ws[f'A{row_index}'] = player_name
-                    ws[f'A{row_index}'].border = thin_border
-                    
-                    ws[f'B{row_index}'] = occurrences
-                    ws[f'B{row_index}'].alignment = Alignment(horizontal="center")
-                    ws[f'B{row_index}'].border = thin_border
-                    
-                    ws[f'C{row_index}'] = first_seen
-                    ws[f'C{row_index}'].alignment = Alignment(horizontal="center")
-                    ws[f'C{row_index}'].border = thin_border
-                    
-                    ws[f'D{row_index}'] = last_seen
-                    ws[f'D{row_index}'].alignment = Alignment(horizontal="center")
-                    ws[f'D{row_index}'].border = thin_border
-                    
-                    ws[f'E{row_index}'] = last_match_day
-                    ws[f'E{row_index}'].alignment = Alignment(horizontal="center")
-                    ws[f'E{row_index}'].border = thin_border
-                    
-                    row_index += 1
-            else:
-                ws[f'A{row_index}'] = "No unmatched player names found"
-                ws.merge_cells(f'A{row_index}:E{row_index}')
-                ws[f'A{row_index}'].alignment = Alignment(horizontal="center")
-                row_index += 1
+            # Count appearances for this team from the rows fetched above
+            appearance_count = sum(len(appearances) for appearances in player_appearances.values())
+            total_appearances += appearance_count
             
             # Add team to summary sheet
-            summary[f'A{summary_row_index}'] = team_name
+            with timed('write_summary'):
+                summary[f'A{summary_row_index}'] = team_name
+                summary[f'A{summary_row_index}'].border = thin_border
+                
+                summary[f'B{summary_row_index}'] = player_count
+                summary[f'B{summary_row_index}'].alignment = Alignment(horizontal="center")
+                summary[f'B{summary_row_index}'].border = thin_border
+                
+                summary[f'C{summary_row_index}'] = unmatched_count
+                summary[f'C{summary_row_index}'].alignment = Alignment(horizontal="center")
+                summary[f'C{summary_row_index}'].border = thin_border
+                
+                summary[f'D{summary_row_index}'] = appearance_count
+                summary[f'D{summary_row_index}'].alignment = Alignment(horizontal="center")
+                summary[f'D{summary_row_index}'].border = thin_border
+            
+            summary_row_index += 1
+        
+        # Add totals to summary sheet
+        log_progress("Finalizing summary sheet", 90, 6, "Finalizing summary")
+        
+        # Total appearances come from the same snapshot as the team sheets
+        total_appearances = len(snapshot['appearances'])
+        
+        with timed('write_summary'):
+            summary[f'A{summary_row_index}'] = "TOTAL"
+            summary[f'A{summary_row_index}'].font = Font(bold=True)
             summary[f'A{summary_row_index}'].border = thin_border
             
-            summary[f'B{summary_row_index}'] = player_count
+            summary[f'B{summary_row_index}'] = total_players
+            summary[f'B{summary_row_index}'].font = Font(bold=True)
             summary[f'B{summary_row_index}'].alignment = Alignment(horizontal="center")
             summary[f'B{summary_row_index}'].border = thin_border
             
-            summary[f'C{summary_row_index}'] = unmatched_count
+            summary[f'C{summary_row_index}'] = total_unmatched
+            summary[f'C{summary_row_index}'].font = Font(bold=True)
             summary[f'C{summary_row_index}'].alignment = Alignment(horizontal="center")
             summary[f'C{summary_row_index}'].border = thin_border
             
-            # Count appearances for this team
-            try:
-                # Get appearances for all players in this team
-                player_ids = [p["id"] for p in players.data] if players.data else []
-                appearance_count = 0
-                
-                if player_ids:
-                    # Get appearances for all players in this team
-                    appearances_result = supabase.table("appearances").select("id").in_("player_id", player_ids).execute()
-                    appearance_count = len(appearances_result.data) if appearances_result.data else 0
-            except Exception as e:
-                log_progress(f"Error counting appearances for team {team_name}: {str(e)}", None, None, None, "error")
-                appearance_count = 0
-            
-            summary[f'D{summary_row_index}'] = appearance_count
+            summary[f'D{summary_row_index}'] = total_appearances
+            summary[f'D{summary_row_index}'].font = Font(bold=True)
             summary[f'D{summary_row_index}'].alignment = Alignment(horizontal="center")
             summary[f'D{summary_row_index}'].border = thin_border
-            
-            summary_row_index += 1
-        
-        # Add totals to summary sheet
-        log_progress("Finalizing summary sheet", 90, 6, "Finalizing summary")
-        
-        summary[f'A{summary_row_index}'] = "TOTAL"
-        summary[f'A{summary_row_index}'].font = Font(bold=True)
-        summary[f'A{summary_row_index}'].border = thin_border
-        
-        summary[f'B{summary_row_index}'] = total_players
-        summary[f'B{summary_row_index}'].font = Font(bold=True)
-        summary[f'B{summary_row_index}'].alignment = Alignment(horizontal="center")
-        summary[f'B{summary_row_index}'].border = thin_border
-        
-        summary[f'C{summary_row_index}'] = total_unmatched
-        summary[f'C{summary_row_index}'].font = Font(bold=True)
-        summary[f'C{summary_row_index}'].alignment = Alignment(horizontal="center")
-        summary[f'C{summary_row_index}'].border = thin_border
-        
-        # Calculate total appearances from all teams
-        try:
-            # Get total appearances from database
-            total_appearances_query = supabase.table("appearances").select("id").execute()
-            if total_appearances_query.data:
-                # Just count the total number of records returned
-                total_appearances = len(total_appearances_query.data)
-            else:
-                # Fallback to our accumulated count
-                log_progress("No appearances found in database, using accumulated count", None, None, None, "warning")
-        except Exception as e:
-            log_progress(f"Error counting total appearances: {str(e)}", None, None, None, "error")
-            # Use the sum we've been accumulating if the query fails
-        
-        summary[f'D{summary_row_index}'] = total_appearances
-        summary[f'D{summary_row_index}'].font = Font(bold=True)
-        summary[f'D{summary_row_index}'].alignment = Alignment(horizontal="center")
-        summary[f'D{summary_row_index}'].border = thin_border
         
         summary_row_index += 1
         
         # Save to a temporary file
         log_progress("Saving Excel file", 95, 7, "Saving file")
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-        wb.save(temp_file.name)
-        temp_file.close()
+        with timed('save'):
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+            wb.save(temp_file.name)
+            temp_file.close()
         
         # Mark as complete
         with task_lock:
@@ -1225,9 +2121,16 @@ def generate_excel_export(export_id):
                 'message': "Excel export completed successfully!",
                 'type': 'success'
             })
+            export_metrics.record_history(export_id, task)
         
         log_progress("Excel export completed successfully!", 100, 7, "Complete", "success")
         
+        # Keep the latest league export for instant downloads
+        try:
+            export_cache.store(app.config['EXPORT_FOLDER'], temp_file.name, data_version, supabase)
+        except Exception as e:
+            print(f"Error caching Excel export: {str(e)}")
+        
     except Exception as e:
         print(f"Error exporting Excel: {str(e)}")
         
@@ -1239,6 +2142,10 @@ def generate_excel_export(export_id):
                 'message': f"Error exporting Excel: {str(e)}",
                 'type': 'error'
             })
+            export_metrics.record_history(export_id, task)
+    
+    finally:
+        export_metrics.stop_memory_tracing()
 
 # API routes
 @app.route('/api/teams')
@@ -1292,10 +2199,11 @@ def update_match_teams(match_id):
         if current_home_id == home_team_id and current_away_id == away_team_id:
             return jsonify({"success": True, "message": "No changes needed"})
         
-        # Update the match teams
+        # Update the match teams (appearances may be removed below, so bump the version)
         update_result = supabase.table("matches").update({
             "home_team_id": home_team_id,
-            "away_team_id": away_team_id
+            "away_team_id": away_team_id,
+            "version": (current_match.get("version", 0) or 0) + 1
         }).eq("id", match_id).execute()
         
         if not update_result.data or len(update_result.data) == 0:
@@ -1319,6 +2227,7 @@ def update_match_teams(match_id):
             if previous_players:
                 for player_id in previous_players:
                     supabase.table("appearances").delete().eq("player_id", player_id).eq("match_id", match_id).execute()
+                appearance_index.remove(match_id, previous_players)
         
         # Return success response
         return jsonify({
@@ -1331,6 +2240,79 @@ def update_match_teams(match_id):
         print(f"Error updating match teams: {str(e)}")
         return jsonify({"success": False, "error": f"An error occurred: {str(e)}"})
 
+@app.route('/api/players/suggest', methods=['GET'])
+def suggest_players_api():
+    """
+    Suggest registered players for an unmatched name.
+    
+    Query parameters: name, team_id (team the name was recorded for),
+    match_team_ids (comma-separated teams in the match) and limit (max 20).
+    """
+    name = request.args.get('name', '').strip()
+    if not name:
+        return jsonify({"success": False, "error": "name is required"}), 400
+    
+    if not player_search.is_ready():
+        return jsonify({"success": False, "error": "Player suggestions are still loading"}), 503
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 5)), 1), 20)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be a number"}), 400
+    
+    match_team_ids = [t for t in request.args.get('match_team_ids', '').split(',') if t]
+    
+    started = time.perf_counter()
+    suggestions = player_search.suggest(name, request.args.get('team_id') or None, match_team_ids, limit)
+    
+    return jsonify({
+        "success": True,
+        "suggestions": suggestions,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    })
+
+@app.route('/api/players/search', methods=['GET'])
+def search_players_api():
+    """
+    Autocomplete players by name prefix.
+    
+    Query parameters: q, team_id (one or more comma-separated IDs), limit
+    (max 20) and include_unmatched (also return unmatched names starting with q).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"success": False, "error": "q is required"}), 400
+    
+    if not player_search.is_ready():
+        return jsonify({"success": False, "error": "Player search is still loading"}), 503
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 20)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be a number"}), 400
+    
+    team_ids = [t for t in request.args.get('team_id', '').split(',') if t]
+    include_unmatched = request.args.get('include_unmatched', '').lower() in ('1', 'true', 'yes')
+    
+    started = time.perf_counter()
+    players = player_search.search(query, team_ids or None, limit)
+    
+    unmatched = []
+    if include_unmatched:
+        try:
+            for player in unmatched_lookup.search(supabase, query, limit):
+                team = player.pop("team", None) or {}
+                unmatched.append({**player, "team_name": team.get("name")})
+        except Exception as e:
+            print(f"Error searching unmatched players: {str(e)}")
+    
+    return jsonify({
+        "success": True,
+        "players": players,
+        "unmatched_players": unmatched,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+    })
+
 @app.route('/api/match_players/<match_id>', methods=['GET'])
 def get_match_players_api(match_id):
     """API endpoint to get all players and unmatched players for match modals"""
@@ -1350,12 +2332,15 @@ def get_match_players_api(match_id):
         teams_data = teams.data if teams.data else []
         
         # Get all players from all teams
-        all_players = supabase.table("players").select("id, name, team_id").order("name").execute()
-        all_players_data = all_players.data if all_players.data else []
+        all_players_data = fetch_all(supabase, "players", columns="id, name, team_id", order_by="name")
         
         # Get all unmatched players that aren't already matched
-        unmatched_players = supabase.table("unmatched_players").select("id, name, team_id, occurrence_count").eq("status", "unmatched").order("name").execute()
-        unmatched_players_data = unmatched_players.data if unmatched_players.data else []
+        unmatched_players_data = fetch_all(
+            supabase, "unmatched_players",
+            columns="id, name, team_id, occurrence_count",
+            filters=lambda q: q.eq("status", "unmatched"),
+            order_by="name"
+        )
         
         # Organize players by team
         organized_players = {
@@ -1461,15 +2446,95 @@ def admin_cleanup():
             'error': str(e)
         }), 500
 
+@app.route('/admin/unmatched/resolve', methods=['POST'])
+def resolve_unmatched_backlog():
+    """
+    Auto-resolve confident unmatched names in one batch and queue the rest for review.
+    
+    Optional JSON or form fields: threshold, margin, dry_run.
+    """
+    data = request.json if request.is_json else request.form.to_dict()
+    
+    try:
+        threshold = float(data['threshold']) if data.get('threshold') not in (None, '') else None
+        margin = float(data['margin']) if data.get('margin') not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "threshold and margin must be numbers"}), 400
+    
+    dry_run = str(data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    
+    try:
+        report = unmatched_resolver.resolve_backlog(
+            supabase, adjust_total_appearances, bump_match_version,
+            threshold=threshold, margin=margin, dry_run=dry_run
+        )
+        print(f"Resolved {len(report['auto_matched'])} of {report['backlog']} unmatched names "
+              f"({len(report['review'])} queued for review) in {report['elapsed_seconds']}s")
+        return jsonify({"success": True, **report})
+        
+    except Exception as e:
+        print(f"Error resolving unmatched backlog: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/admin/unmatched/review', methods=['GET'])
+def unmatched_review_queue():
+    """Endpoint to list the names the last resolver run left for review"""
+    report = unmatched_resolver.get_last_run()
+    if report is None:
+        return jsonify({"success": False, "error": "The resolver has not run yet"}), 404
+    
+    return jsonify({
+        "success": True,
+        "finished_at": report['finished_at'],
+        "review": report['review']
+    })
+
+@app.route('/admin/unmatched/compact', methods=['POST'])
+def compact_unmatched_merges():
+    """
+    Point every merged unmatched player straight at the root of its merge chain.
+    
+    Optional JSON or form field: dry_run.
+    """
+    data = request.json if request.is_json else request.form.to_dict()
+    dry_run = str(data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    
+    try:
+        report = unmatched_merges.compact(supabase, dry_run=dry_run)
+        print(f"Compacted {report['merged']} merged unmatched names onto {report['roots']} roots "
+              f"({report['rows_updated']} rows updated) in {report['elapsed_seconds']}s")
+        return jsonify({"success": True, **report})
+        
+    except Exception as e:
+        print(f"Error compacting unmatched merges: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/admin/replica', methods=['GET'])
+def admin_replica():
+    """Endpoint to report local read replica status"""
+    return jsonify(replica.status())
+
 # Make sure session is modified when storing results
 @app.after_request
 def after_request(response):
     # Mark session as modified to ensure it's saved
     if 'result' in session:
         session.modified = True
+    
+    # Any successful write makes the pre-built league export and the replica stale
+    if request.method == 'POST' and response.status_code < 400 and not idempotency.is_replay(response):
+        invalidate_read_caches()
     return response
 
+def invalidate_read_caches():
+    """Mark the pre-built league export and the read replica stale after a write"""
+    export_cache.invalidate()
+    if replica.enabled():
+        replica.mark_dirty()
+        file_manager.run_job_soon('replica_sync')
+
 @app.route('/increment_unmatched_player/<match_day_id>', methods=['POST'])
+@idempotency.idempotent
 def increment_unmatched_player(match_day_id):
     """Increment the occurrence count for an unmatched player"""
     try:
@@ -1523,6 +2588,7 @@ def increment_unmatched_player(match_day_id):
         # Check if this is the first time the player appears in this match
         is_new_for_match = player.get("last_match_id") != match_day_id
         
+        idempotency.succeeded()
         return jsonify({
             "success": True,
             "player_id": player_id,
@@ -1581,6 +2647,98 @@ def decrement_unmatched_player(match_day_id):
         print(f"Error decrementing unmatched player: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
 
+def prebuild_league_export():
+    """Scheduled job that pre-builds the league export into the artifact cache"""
+    if export_cache.get_fresh_artifact(app.config['EXPORT_FOLDER'], supabase):
+        print("Pre-built league export is up to date, skipping")
+        return
+    
+    export_id = f"prebuild-{uuid.uuid4()}"
+    with task_lock:
+        processing_tasks[export_id] = {
+            'status': 'starting',
+            'current_step': 1,
+            'step_details': {},
+            'log_messages': [],
+            'start_time': time.time(),
+            'task_type': 'excel_prebuild',
+            'progress': 0,
+            'teams_processed': 0,
+            'total_teams': 0,
+            'phases': {}
+        }
+    
+    print(f"Pre-building league export {export_id}")
+    generate_excel_export(export_id)
+
+# Pre-build the league export off-peak so downloads are served instantly
+if app.config['EXPORT_PREBUILD_CRON']:
+    file_manager.schedule_export_prebuild(prebuild_league_export, app.config['EXPORT_PREBUILD_CRON'])
+
+def sync_replica():
+    """Scheduled job that pulls recent changes into the local read replica"""
+    try:
+        stats = replica.sync(supabase)
+        print(f"Replica sync complete: {stats}")
+    except Exception as e:
+        print(f"Error syncing replica: {str(e)}")
+
+# Keep the optional local read replica current
+if replica.enabled():
+    file_manager.schedule_replica_sync(sync_replica, replica.SYNC_INTERVAL_SECONDS)
+
+def load_appearance_index():
+    """Scheduled job that (re)loads the in-memory appearance index"""
+    try:
+        appearance_index.load(supabase)
+    except Exception as e:
+        print(f"Error loading appearance index: {str(e)}")
+
+# Answer "who played in match X" / "which matches did player Y play" from memory
+file_manager.schedule_index_job('appearance_index', load_appearance_index, appearance_index.REFRESH_SECONDS)
+
+def resolve_unmatched_job():
+    """Scheduled job that auto-resolves the unmatched names backlog"""
+    try:
+        report = unmatched_resolver.resolve_backlog(supabase, adjust_total_appearances, bump_match_version)
+        print(f"Scheduled resolver matched {len(report['auto_matched'])} of {report['backlog']} unmatched names")
+        if report['auto_matched']:
+            invalidate_read_caches()
+    except Exception as e:
+        print(f"Error in scheduled unmatched resolver: {str(e)}")
+
+if app.config['UNMATCHED_RESOLVE_CRON']:
+    file_manager.schedule_cron_job('unmatched_resolve', resolve_unmatched_job, app.config['UNMATCHED_RESOLVE_CRON'])
+
+def load_player_search():
+    """Scheduled job that (re)loads the player name suggestion index"""
+    try:
+        player_search.load(supabase)
+    except Exception as e:
+        print(f"Error loading player search index: {str(e)}")
+
+file_manager.schedule_index_job('player_search', load_player_search, player_search.REFRESH_SECONDS)
+
+def compact_unmatched_job():
+    """Scheduled job that compacts merged unmatched chains and reloads the merge resolver"""
+    try:
+        report = unmatched_merges.compact(supabase)
+        if report['rows_updated']:
+            invalidate_read_caches()
+    except Exception as e:
+        print(f"Error compacting unmatched merges: {str(e)}")
+
+file_manager.schedule_index_job('unmatched_compact', compact_unmatched_job, unmatched_merges.COMPACT_SECONDS)
+
+def load_player_aliases():
+    """Scheduled job that (re)loads the learned player aliases"""
+    try:
+        player_aliases.load(supabase)
+    except Exception as e:
+        print(f"Error loading player aliases: {str(e)}")
+
+file_manager.schedule_index_job('player_aliases', load_player_aliases, player_aliases.REFRESH_SECONDS)
+
 # Application entry point
 if __name__ == '__main__':
     # Schedule regular file cleanup
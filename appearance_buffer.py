@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+
+# How long the first patch for a match waits for others to join it before writing.
+# The wait blocks the request, so only enable it with a threaded or gevent worker:
+# a single sync gunicorn worker cannot take another patch while it sleeps.
+COALESCE_WINDOW_SECONDS = float(os.environ.get("APPEARANCE_COALESCE_MS", "0")) / 1000
+
+# Open batch per match_id: {'version', 'ops', 'clients', 'done', 'result'}
+_batches = {}
+_lock = threading.Lock()
+
+def submit(match_id, add_ids, remove_ids, version, flush):
+    """
+    Queue an appearance delta and wait until it has been written.
+
+    Patches for the same match and version that arrive within the coalescing
+    window are merged into one net delta (the last change to a player wins)
+    and written with a single call to `flush`. Every client in the batch gets
+    the same result back, including the version that was flushed. Patches
+    against a different version than the open batch are written on their own
+    so the conditional version check in `flush` still rejects stale clients.
+
+    Args:
+        match_id: ID of the match
+        add_ids: Player IDs to add
+        remove_ids: Player IDs to remove
+        version: Match version the client based its changes on
+        flush: Callable (match_id, add_ids, remove_ids, version) -> (payload dict, status code)
+
+    Returns:
+        tuple: (payload dict, status code) from `flush`, with 'coalesced' set
+            to the number of patches written together
+    """
+    if COALESCE_WINDOW_SECONDS <= 0:
+        return _with_count(flush(match_id, add_ids, remove_ids, version), 1)
+
+    leader = False
+    with _lock:
+        batch = _batches.get(match_id)
+        if batch is None:
+            batch = {
+                'version': version,
+                'ops': {},
+                'clients': 0,
+                'done': threading.Event(),
+                'result': None
+            }
+            _batches[match_id] = batch
+            leader = True
+        elif batch['version'] != version:
+            batch = None
+
+        if batch is not None:
+            for player_id in add_ids:
+                batch['ops'][player_id] = True
+            for player_id in remove_ids:
+                batch['ops'][player_id] = False
+            batch['clients'] += 1
+
+    if batch is None:
+        # Stale or ahead of the open batch; let the version check decide
+        return _with_count(flush(match_id, add_ids, remove_ids, version), 1)
+
+    if not leader:
+        batch['done'].wait()
+        return batch['result']
+
+    time.sleep(COALESCE_WINDOW_SECONDS)
+
+    with _lock:
+        # Close the batch so later patches start a new one
+        _batches.pop(match_id, None)
+        ops = dict(batch['ops'])
+        clients = batch['clients']
+
+    try:
+        batch['result'] = _with_count(flush(
+            match_id,
+            [player_id for player_id, added in ops.items() if added],
+            [player_id for player_id, added in ops.items() if not added],
+            version
+        ), clients)
+    except Exception as e:
+        print(f"Error flushing appearance batch for match {match_id}: {str(e)}")
+        batch['result'] = ({"success": False, "error": str(e)}, 500)
+    finally:
+        batch['done'].set()
+
+    return batch['result']
+
+def _with_count(result, clients):
+    payload, status = result
+    payload = dict(payload)
+    payload['coalesced'] = clients
+    return payload, status
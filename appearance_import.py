@@ -0,0 +1,228 @@
+import os
+import io
+import csv
+import time
+from collections import Counter
+from openpyxl import load_workbook
+from pagination import fetch_all
+import appearance_index
+import appearance_writes
+
+# Appearances written per upsert call
+CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+
+# Unresolved rows reported back to the caller (the rest are only counted)
+MAX_REPORTED_ERRORS = 50
+
+def normalize_name(name):
+    """Case- and whitespace-insensitive key for matching names"""
+    return " ".join(str(name).split()).casefold() if name is not None else ""
+
+class RosterIndex:
+    """
+    In-memory lookup of players, teams and matches for resolving import rows.
+
+    Built once per import from three paged reads, so resolving a row never
+    goes back to the database.
+    """
+
+    def __init__(self, teams, players, matches):
+        self.teams_by_key = {}
+        for team in teams:
+            self.teams_by_key[str(team["id"])] = team["id"]
+            self.teams_by_key[normalize_name(team.get("name"))] = team["id"]
+
+        # (team_id, name) -> player_id, plus name -> player_id for names unique across teams
+        self.players_by_team = {}
+        self.player_teams = {}
+        by_name = {}
+        for player in players:
+            key = normalize_name(player.get("name"))
+            self.players_by_team[(str(player.get("team_id")), key)] = player["id"]
+            self.player_teams[player["id"]] = player.get("team_id")
+            by_name.setdefault(key, []).append(player["id"])
+        self.players_by_name = {key: ids[0] for key, ids in by_name.items() if len(ids) == 1}
+
+        # match_id -> match_id and (match_day, team_id) -> match_id
+        self.match_ids = {str(match["id"]): match["id"] for match in matches}
+        self.matches_by_day = {}
+        for match in matches:
+            day = normalize_name(match.get("match_day"))
+            for team_id in (match.get("home_team_id"), match.get("away_team_id")):
+                if team_id is not None:
+                    self.matches_by_day.setdefault((day, str(team_id)), match["id"])
+
+    @classmethod
+    def load(cls, client):
+        """Build the index from the database"""
+        return cls(
+            fetch_all(client, "teams", columns="id, name"),
+            fetch_all(client, "players", columns="id, name, team_id"),
+            fetch_all(client, "matches", columns="id, match_day, home_team_id, away_team_id")
+        )
+
+    def resolve_team(self, team):
+        return self.teams_by_key.get(normalize_name(team)) if team else None
+
+    def resolve_player(self, name, team_id):
+        key = normalize_name(name)
+        if team_id is not None:
+            player_id = self.players_by_team.get((str(team_id), key))
+            if player_id is not None:
+                return player_id
+        return self.players_by_name.get(key)
+
+    def resolve_match(self, match_ref, team_id):
+        match_ref = str(match_ref).strip() if match_ref is not None else ""
+        if match_ref in self.match_ids:
+            return self.match_ids[match_ref]
+        if team_id is not None:
+            return self.matches_by_day.get((normalize_name(match_ref), str(team_id)))
+        return None
+
+def iter_csv_rows(stream):
+    """
+    Stream appearance rows from a CSV file.
+
+    Expected columns: player, team (name or ID, optional when player names are
+    unique) and match_id or match_day.
+
+    Yields:
+        tuple: (row number, team, player name, match reference)
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row_number, row in enumerate(reader, start=2):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        player = row.get("player") or row.get("player_name") or row.get("name")
+        if not player:
+            continue
+        yield row_number, row.get("team"), player, row.get("match_id") or row.get("match_day")
+
+def iter_xlsx_rows(stream):
+    """
+    Stream appearance rows from a workbook shaped like the league export.
+
+    Every sheet other than Summary is one team: the team name in A1, a
+    "Player Name" header row followed by match day columns, and a 1 in each
+    match day the player appeared in. Reading stops at the unmatched names
+    section. The workbook is opened read-only so rows are never all in memory.
+
+    Yields:
+        tuple: (row number, team, player name, match day)
+    """
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if ws.title == "Summary":
+                continue
+
+            team = ws.title
+            match_days = None
+            for row_number, row in enumerate(ws.iter_rows(values_only=True), start=1):
+                first = row[0] if row else None
+
+                if row_number == 1 and first:
+                    team = str(first)
+                    continue
+
+                if match_days is None:
+                    if first == "Player Name":
+                        match_days = [(index, str(value)) for index, value in enumerate(row[2:], start=2) if value]
+                    continue
+
+                if not first or first == "Unmatched Player Names":
+                    break
+
+                for index, match_day in match_days:
+                    value = row[index] if index < len(row) else None
+                    if value in (1, "1", True, "x", "X", "✓"):
+                        yield f"{ws.title}!{row_number}", team, first, match_day
+    finally:
+        wb.close()
+
+def run_import(client, rows, roster, adjust_counts):
+    """
+    Resolve appearance rows and write them in chunked bulk upserts.
+
+    Appearances are deduplicated in memory and written with
+    appearance_writes.insert_new(), which skips existing rows, so
+    re-importing the same file adds nothing. Player counters are adjusted once
+    at the end from the rows actually inserted, including when a later chunk
+    fails.
+
+    Args:
+        client: Supabase client
+        rows: Iterable of (row number, team, player name, match reference)
+        roster: RosterIndex
+        adjust_counts: Callable (player_ids, delta) used to update total_appearances
+
+    Returns:
+        dict: Import report
+    """
+    started = time.perf_counter()
+    seen = set()
+    chunk = []
+    inserted_per_player = Counter()
+    changed_matches = set()
+    errors = []
+    report = {
+        "rows_read": 0,
+        "appearances_added": 0,
+        "already_present": 0,
+        "duplicates": 0,
+        "unresolved": 0
+    }
+
+    def flush():
+        if not chunk:
+            return
+        inserted = appearance_writes.insert_new(client, chunk)
+        for appearance in inserted:
+            inserted_per_player[appearance["player_id"]] += 1
+            changed_matches.add(appearance["match_id"])
+            appearance_index.add(appearance["match_id"], [appearance["player_id"]])
+        report["appearances_added"] += len(inserted)
+        report["already_present"] += len(chunk) - len(inserted)
+        chunk.clear()
+
+    try:
+        for row_number, team, player_name, match_ref in rows:
+            report["rows_read"] += 1
+            team_id = roster.resolve_team(team)
+            player_id = roster.resolve_player(player_name, team_id)
+            match_id = None
+            if player_id is not None:
+                # Fall back to the player's own team when the row has none
+                match_id = roster.resolve_match(match_ref, team_id if team_id is not None else roster.player_teams.get(player_id))
+
+            if player_id is None or match_id is None:
+                report["unresolved"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    reason = "Unknown player" if player_id is None else "Unknown match"
+                    errors.append({"row": row_number, "player": player_name, "match": match_ref, "error": reason})
+                continue
+
+            if (match_id, player_id) in seen:
+                report["duplicates"] += 1
+                continue
+            seen.add((match_id, player_id))
+
+            chunk.append({"match_id": match_id, "player_id": player_id})
+            if len(chunk) >= CHUNK_SIZE:
+                flush()
+
+        flush()
+    finally:
+        # Count whatever was written, even if a later chunk failed
+        players_by_delta = {}
+        for player_id, delta in inserted_per_player.items():
+            players_by_delta.setdefault(delta, []).append(player_id)
+        for delta, player_ids in players_by_delta.items():
+            adjust_counts(player_ids, delta)
+
+    elapsed = time.perf_counter() - started
+    report["errors"] = errors
+    report["changed_match_ids"] = sorted(changed_matches, key=str)
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows_read"] / elapsed) if elapsed > 0 else None
+    return report
@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+from array import array
+from bisect import bisect_left
+import export_cache
+from pagination import fetch_all
+
+# Full reload interval, to pick up appearances written outside this process (0 to disable)
+REFRESH_SECONDS = int(os.environ.get("APPEARANCE_INDEX_REFRESH_SECONDS", "900"))
+
+# Database ids are interned to dense ints so both directions can be stored as
+# sorted array('l') instead of sets of ids: ~8 bytes per appearance per side.
+# Ids are kept and returned as text, as in the replica, so they compare the same
+# whether they came from the database or from a URL or form.
+_lock = threading.Lock()
+_slots = {}         # str(id) -> slot
+_ids = []           # slot -> str(id)
+_by_match = {}      # match slot -> sorted array of player slots
+_by_player = {}     # player slot -> sorted array of match slots
+_loaded_at = None
+_data_version = None    # export_cache.current_version() read before the last load
+
+# Writes made while a reload is reading the table, replayed on top of it
+_loading = False
+_pending = []
+
+def _slot(slots, ids, item_id):
+    """Return the dense slot for an id in an interning table, allocating one if needed"""
+    key = str(item_id)
+    slot = slots.get(key)
+    if slot is None:
+        slot = len(ids)
+        slots[key] = slot
+        ids.append(key)
+    return slot
+
+def _insert(index, key, value):
+    values = index.get(key)
+    if values is None:
+        index[key] = array('l', [value])
+        return True
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        return False
+    values.insert(position, value)
+    return True
+
+def _delete(index, key, value):
+    values = index.get(key)
+    if not values:
+        return
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        del values[position]
+        if not values:
+            del index[key]
+
+def _apply(slots, ids, by_match, by_player, op, match_id, player_ids):
+    """Apply one add/remove to an interning table and pair of index dicts (caller holds the lock)"""
+    match_slot = _slot(slots, ids, match_id)
+    for player_id in player_ids:
+        player_slot = _slot(slots, ids, player_id)
+        if op == 'add':
+            _insert(by_match, match_slot, player_slot)
+            _insert(by_player, player_slot, match_slot)
+        else:
+            _delete(by_match, match_slot, player_slot)
+            _delete(by_player, player_slot, match_slot)
+
+def load(client):
+    """
+    Read every appearance and rebuild the index.
+
+    The interning table is rebuilt too, so slots of deleted rows are not
+    kept forever. Writes recorded while the table is being read are replayed
+    on the new index before it replaces the old one, so none are lost.
+
+    Args:
+        client: Supabase client
+    """
+    global _slots, _ids, _by_match, _by_player, _loaded_at, _loading, _data_version
+    with _lock:
+        _loading = True
+        _pending.clear()
+
+    try:
+        started = time.perf_counter()
+        # Read before the table, so the index holds every change up to this version
+        version = export_cache.current_version(client)
+        rows = fetch_all(client, "appearances", columns="id, match_id, player_id")
+
+        slots = {}
+        ids = []
+        pairs = {}
+        for row in rows:
+            pairs.setdefault(_slot(slots, ids, row["match_id"]), []).append(_slot(slots, ids, row["player_id"]))
+
+        by_match = {match_slot: array('l', sorted(set(players))) for match_slot, players in pairs.items()}
+        by_player = {}
+        for match_slot, players in by_match.items():
+            for player_slot in players:
+                by_player.setdefault(player_slot, []).append(match_slot)
+        by_player = {player_slot: array('l', sorted(matches)) for player_slot, matches in by_player.items()}
+
+        with _lock:
+            for op, match_id, player_ids in _pending:
+                _apply(slots, ids, by_match, by_player, op, match_id, player_ids)
+            _pending.clear()
+            _slots = slots
+            _ids = ids
+            _by_match = by_match
+            _by_player = by_player
+            _loaded_at = time.time()
+            _data_version = version
+
+        print(f"Appearance index loaded {len(rows)} appearances in {time.perf_counter() - started:.2f}s")
+    finally:
+        with _lock:
+            _loading = False
+
+def is_ready():
+    """Return True once the index has been loaded"""
+    return _loaded_at is not None
+
+def data_version():
+    """
+    Return the export_cache version the index is known to include.
+
+    Writes from this process are applied as they happen; writes from other
+    processes only arrive with the next load().
+    """
+    with _lock:
+        return _data_version
+
+def add(match_id, player_ids):
+    """Record appearances written to the database"""
+    _record('add', match_id, player_ids)
+
+def remove(match_id, player_ids):
+    """Record appearances deleted from the database"""
+    _record('remove', match_id, player_ids)
+
+def _record(op, match_id, player_ids):
+    player_ids = list(player_ids)
+    if not player_ids:
+        return
+    with _lock:
+        if _loading:
+            _pending.append((op, match_id, player_ids))
+        _apply(_slots, _ids, _by_match, _by_player, op, match_id, player_ids)
+
+def players_in_match(match_id):
+    """
+    Return the IDs of players who appeared in a match.
+
+    Returns:
+        set: Player IDs as text, or None if the index is not loaded yet
+    """
+    if not is_ready():
+        return None
+    with _lock:
+        slot = _slots.get(str(match_id))
+        values = _by_match.get(slot, ()) if slot is not None else ()
+        return {_ids[player_slot] for player_slot in values}
+
+def matches_for_player(player_id):
+    """
+    Return the IDs of matches a player appeared in.
+
+    Returns:
+        set: Match IDs as text, or None if the index is not loaded yet
+    """
+    if not is_ready():
+        return None
+    with _lock:
+        slot = _slots.get(str(player_id))
+        values = _by_player.get(slot, ()) if slot is not None else ()
+        return {_ids[match_slot] for match_slot in values}
+
+def appearance_rows(player_ids=None):
+    """
+    Return appearances as {"player_id", "match_id"} rows, like a select on the table but with text ids.
+
+    Args:
+        player_ids: Optional iterable of player IDs to restrict to
+
+    Returns:
+        list: Appearance rows, or None if the index is not loaded yet
+    """
+    if not is_ready():
+        return None
+    with _lock:
+        if player_ids is None:
+            player_slots = list(_by_player)
+        else:
+            player_slots = [_slots[str(player_id)] for player_id in player_ids if str(player_id) in _slots]
+        return [
+            {"player_id": _ids[player_slot], "match_id": _ids[match_slot]}
+            for player_slot in player_slots
+            for match_slot in _by_player.get(player_slot, ())
+        ]
+
+def status():
+    """Return index size and age for diagnostics"""
+    with _lock:
+        return {
+            'ready': _loaded_at is not None,
+            'loaded_at': _loaded_at,
+            'matches': len(_by_match),
+            'players': len(_by_player),
+            'appearances': sum(len(values) for values in _by_match.values())
+        }
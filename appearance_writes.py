@@ -0,0 +1,70 @@
+import schema_errors
+
+# Postgres error for an ON CONFLICT target with no matching unique index
+NO_UNIQUE_INDEX_CODE = "42P10"
+
+# Set to False once the unique index on appearances (migrations/003_appearance_patch.sql)
+# is found missing
+unique_index_available = True
+
+def is_missing_index(error):
+    """Return True if an upsert failed because the appearances unique index does not exist"""
+    return str(getattr(error, "code", None)) == NO_UNIQUE_INDEX_CODE or schema_errors.is_missing(error)
+
+def insert_new(client, rows):
+    """
+    Insert appearances, skipping any that already exist.
+
+    Uses one upsert with on-conflict-ignore on (match_id, player_id). Before
+    that unique index exists, falls back to reading the existing appearances
+    of each match and inserting the rest, as the app did before it; without
+    the index, concurrent writers can then still create duplicates.
+
+    Args:
+        client: Supabase client
+        rows: List of {"match_id", "player_id"} dicts
+
+    Returns:
+        list: The rows actually inserted
+    """
+    global unique_index_available
+
+    if not rows:
+        return []
+
+    if unique_index_available:
+        try:
+            result = client.table("appearances").upsert(
+                rows,
+                on_conflict="match_id,player_id",
+                ignore_duplicates=True
+            ).execute()
+            return result.data or []
+        except Exception as e:
+            if not is_missing_index(e):
+                raise
+            print(f"Unique index on appearances unavailable, checking for existing rows first: {str(e)}")
+            unique_index_available = False
+
+    player_ids_by_match = {}
+    for row in rows:
+        player_ids_by_match.setdefault(row["match_id"], set()).add(str(row["player_id"]))
+
+    existing = set()
+    for match_id, player_ids in player_ids_by_match.items():
+        result = client.table("appearances").select("player_id").eq("match_id", match_id).in_(
+            "player_id", list(player_ids)
+        ).execute()
+        existing.update((str(match_id), str(row["player_id"])) for row in result.data or [])
+
+    new_rows = []
+    for row in rows:
+        key = (str(row["match_id"]), str(row["player_id"]))
+        if key not in existing:
+            existing.add(key)
+            new_rows.append(row)
+    if not new_rows:
+        return []
+
+    result = client.table("appearances").insert(new_rows).execute()
+    return result.data or []
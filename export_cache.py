@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+
+# Pre-built league exports older than this are never served from the cache
+MAX_AGE_HOURS = float(os.environ.get("EXPORT_CACHE_MAX_AGE_HOURS", "24"))
+
+ARTIFACT_NAME = "league_export.xlsx"
+META_NAME = "league_export.json"
+
+# Fallback when the database has no data_version table: bumped on every write
+# this process makes, and tied to this process so files from before a restart
+# (or written by another process) are never served
+_lock = threading.Lock()
+_data_version = 0
+_process_id = uuid.uuid4().hex
+
+def current_version(client):
+    """
+    Return the data version an export should record before it starts reading.
+
+    This is the database-wide counter from migrations/008_data_version.sql,
+    bumped by triggers on every change from any source. Without it, a
+    version local to this process is used.
+
+    Args:
+        client: Supabase client
+
+    Returns:
+        str: Opaque version token
+    """
+    try:
+        result = client.table("data_version").select("version").eq("id", 1).limit(1).execute()
+        if result.data:
+            return f"db:{result.data[0]['version']}"
+    except Exception as e:
+        print(f"Error reading data version, using the process-local version: {str(e)}")
+    with _lock:
+        return f"local:{_process_id}:{_data_version}"
+
+def covers(source_version, version):
+    """
+    Return True if data read at `source_version` includes every change up to `version`.
+
+    Used to decide whether a per-process copy (the replica, the appearance
+    index) may stand in for the database in an export recorded at `version`.
+    Database versions are compared as counters. A process-local version only
+    follows this process's own writes, which those copies apply themselves.
+
+    Args:
+        source_version: current_version() taken before the copy was last read, or None
+        version: current_version() taken when the export started
+
+    Returns:
+        bool: True if the copy is at least as new as `version`
+    """
+    if not version.startswith("db:"):
+        return True
+    if not source_version or not source_version.startswith("db:"):
+        return False
+    return int(source_version[3:]) >= int(version[3:])
+
+def invalidate():
+    """Mark the cached league export as stale after a data change made by this process"""
+    global _data_version
+    with _lock:
+        _data_version += 1
+
+def store(cache_folder, file_path, version, client):
+    """
+    Copy a finished league export into the artifact cache.
+
+    Args:
+        cache_folder: Path to the export cache folder
+        file_path: Path of the generated workbook
+        version: Value of current_version() taken when the export started
+        client: Supabase client
+
+    Returns:
+        bool: True if the stored artifact is fresh (no writes happened while it was built)
+    """
+    artifact_path = os.path.join(cache_folder, ARTIFACT_NAME)
+    temp_path = artifact_path + ".tmp"
+
+    shutil.copyfile(file_path, temp_path)
+    os.replace(temp_path, artifact_path)
+
+    with open(os.path.join(cache_folder, META_NAME), "w") as meta_file:
+        json.dump({'built_at': time.time(), 'version': version}, meta_file)
+
+    return version == current_version(client)
+
+def get_fresh_artifact(cache_folder, client):
+    """
+    Return the cached league export if it can be served as-is.
+
+    Args:
+        cache_folder: Path to the export cache folder
+        client: Supabase client
+
+    Returns:
+        tuple: (file path, built_at timestamp), or None if missing or stale
+    """
+    artifact_path = os.path.join(cache_folder, ARTIFACT_NAME)
+    meta_path = os.path.join(cache_folder, META_NAME)
+
+    if not os.path.isfile(artifact_path) or not os.path.isfile(meta_path):
+        return None
+
+    try:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('version') != current_version(client):
+        return None
+
+    built_at = meta.get('built_at', 0)
+
+    if time.time() - built_at > MAX_AGE_HOURS * 3600:
+        return None
+
+    return os.path.abspath(artifact_path), built_at
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Rolling history of finished export jobs (newest last)
+EXPORT_HISTORY_SIZE = int(os.environ.get("EXPORT_HISTORY_SIZE", "50"))
+TRACE_MEMORY = os.environ.get("EXPORT_TRACE_MEMORY", "1") == "1"
+
+export_history = deque(maxlen=EXPORT_HISTORY_SIZE)
+history_lock = threading.Lock()
+
+# tracemalloc is process-wide, so concurrent exports share one tracing session
+_tracing_users = 0
+_tracing_lock = threading.Lock()
+
+def start_memory_tracing():
+    """Start tracemalloc for an export job (reference counted across jobs)"""
+    global _tracing_users
+    if not TRACE_MEMORY:
+        return
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+def stop_memory_tracing():
+    """Release tracemalloc once the last running export job has finished"""
+    global _tracing_users
+    if not TRACE_MEMORY:
+        return
+    with _tracing_lock:
+        _tracing_users = max(0, _tracing_users - 1)
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+@contextmanager
+def phase(phases, name, lock):
+    """
+    Time one phase of an export job and accumulate it into `phases`.
+
+    A phase may be entered many times (e.g. once per team); wall time, CPU time
+    and row counts are summed, peak memory keeps the largest value seen.
+    Peak memory is only meaningful while tracing is active and is shared with
+    any export running at the same time.
+
+    Args:
+        phases: Dict of phase name -> stats, usually task['phases']
+        name: Phase name
+        lock: Lock guarding `phases` (readers copy it under the same lock)
+
+    Yields:
+        dict: Set 'rows' on it to record how many rows the phase handled
+    """
+    with lock:
+        entry = phases.setdefault(name, {
+            'calls': 0,
+            'wall_time': 0.0,
+            'cpu_time': 0.0,
+            'rows': 0,
+            'peak_memory': 0
+        })
+
+    stats = {'rows': 0}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+
+    try:
+        yield stats
+    finally:
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.thread_time() - cpu_start
+        peak_memory = max(0, tracemalloc.get_traced_memory()[1] - start_memory) if tracing else 0
+
+        with lock:
+            entry['calls'] += 1
+            entry['wall_time'] += wall_time
+            entry['cpu_time'] += cpu_time
+            entry['rows'] += stats.get('rows', 0)
+            entry['peak_memory'] = max(entry['peak_memory'], peak_memory)
+
+def snapshot_phases(phases):
+    """Return a JSON-friendly copy of a phases dict (call while holding its lock)"""
+    return {
+        name: {
+            'calls': entry['calls'],
+            'wall_time': round(entry['wall_time'], 4),
+            'cpu_time': round(entry['cpu_time'], 4),
+            'rows': entry['rows'],
+            'peak_memory': entry['peak_memory']
+        }
+        for name, entry in phases.items()
+    }
+
+def record_history(export_id, task):
+    """
+    Append a finished export job to the rolling history.
+
+    Args:
+        export_id: ID of the export task
+        task: The task dict (caller must hold the task lock)
+    """
+    finished_at = time.time()
+    entry = {
+        'export_id': export_id,
+        'task_type': task.get('task_type'),
+        'status': task.get('status'),
+        'started_at': task.get('start_time'),
+        'finished_at': finished_at,
+        'total_wall_time': round(finished_at - task.get('start_time', finished_at), 4),
+        'phases': snapshot_phases(task.get('phases', {}))
+    }
+
+    with history_lock:
+        export_history.append(entry)
+
+def get_history():
+    """Return the export history, newest first"""
+    with history_lock:
+        return list(reversed(export_history))
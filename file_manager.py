@@ -60,6 +60,28 @@ def cleanup_old_files(uploads_folder, frames_folder, max_age_hours=24):
     
     return cleaned_uploads, cleaned_frames
 
+_scheduler = None
+
+def get_scheduler():
+    """
+    Return the shared background scheduler, starting it on first use
+    
+    Returns:
+        BackgroundScheduler: Running scheduler instance
+    """
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        
+        _scheduler = BackgroundScheduler()
+        _scheduler.start()
+        
+        # Shut down scheduler when app terminates
+        import atexit
+        atexit.register(lambda: _scheduler.shutdown())
+    
+    return _scheduler
+
 def schedule_cleanup(app):
     """
     Schedule regular cleanup of old files
@@ -67,19 +89,100 @@ def schedule_cleanup(app):
     Args:
         app: Flask application instance
     """
-    from apscheduler.schedulers.background import BackgroundScheduler
-    
     def cleanup_job():
         cleanup_old_files(
             app.config['UPLOAD_FOLDER'], 
             app.config['FRAMES_FOLDER']
         )
     
-    # Create scheduler and add job
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(cleanup_job, 'interval', hours=6)  # Run every 6 hours
-    scheduler.start()
+    # Add job to the shared scheduler
+    get_scheduler().add_job(cleanup_job, 'interval', hours=6)  # Run every 6 hours
+
+def schedule_cron_job(job_id, job, crontab):
+    """
+    Schedule a job on a cron expression
+    
+    Args:
+        job_id: ID of the scheduled job
+        job: Callable to run
+        crontab: Standard 5-field cron expression, e.g. "30 23 * * sat,sun"
+    """
+    from apscheduler.triggers.cron import CronTrigger
+    
+    get_scheduler().add_job(
+        job,
+        CronTrigger.from_crontab(crontab),
+        id=job_id,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+def schedule_export_prebuild(job, crontab):
+    """
+    Schedule off-peak pre-generation of the league export
+    
+    Args:
+        job: Callable that builds the export into the artifact cache
+        crontab: Standard 5-field cron expression, e.g. "30 23 * * sat,sun"
+    """
+    schedule_cron_job('export_prebuild', job, crontab)
+
+def schedule_replica_sync(job, seconds):
+    """
+    Schedule incremental syncs of the local read replica
+    
+    Args:
+        job: Callable that runs one sync
+        seconds: Interval between syncs
+    """
+    from datetime import datetime
+    
+    get_scheduler().add_job(
+        job,
+        'interval',
+        seconds=seconds,
+        id='replica_sync',
+        replace_existing=True,
+        next_run_time=datetime.now(),  # Initial sync straight away
+        max_instances=1,
+        coalesce=True
+    )
+
+def schedule_index_job(job_id, job, seconds):
+    """
+    Schedule the initial load and periodic reloads of an in-memory index
+    
+    Args:
+        job_id: ID of the scheduled job
+        job: Callable that reloads the index
+        seconds: Interval between reloads (0 loads once)
+    """
+    from datetime import datetime
+    
+    if seconds > 0:
+        get_scheduler().add_job(
+            job,
+            'interval',
+            seconds=seconds,
+            id=job_id,
+            replace_existing=True,
+            next_run_time=datetime.now(),  # Initial load straight away
+            max_instances=1,
+            coalesce=True
+        )
+    else:
+        get_scheduler().add_job(job, id=job_id, replace_existing=True, next_run_time=datetime.now())
+
+def run_job_soon(job_id):
+    """
+    Move a scheduled job's next run to now
+    
+    Args:
+        job_id: ID of the scheduled job
+    """
+    from datetime import datetime
     
-    # Shut down scheduler when app terminates
-    import atexit
-    atexit.register(lambda: scheduler.shutdown()) 
\ No newline at end of file
+    job = get_scheduler().get_job(job_id)
+    if job:
+        job.modify(next_run_time=datetime.now())
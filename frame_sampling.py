@@ -0,0 +1,166 @@
+import os
+import cv2
+import ocr_layouts
+
+# Frames are compared as small grayscale thumbnails of this size (width, height)
+THUMBNAIL_SIZE = (160, 90)
+
+# Mean absolute difference (0-255) from the previous frame below which a frame is a still screen
+STATIC_THRESHOLD = float(os.environ.get("FRAME_STATIC_THRESHOLD", "3"))
+# ...and from the last forwarded frame above which that screen is new, measured on the
+# block that changed most. The home and away ratings screens differ only in their text,
+# which barely moves a frame-wide mean but clearly moves the blocks it is in.
+CHANGE_THRESHOLD = float(os.environ.get("FRAME_CHANGE_THRESHOLD", "4"))
+# Blocks (columns, rows) the thumbnail is split into for the change measure
+CHANGE_GRID = (16, 9)
+
+# Side of the difference hash grid; hashes have HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 16
+# Ratings frames whose hashes differ in at most this many bits show the same screen
+DUPLICATE_DISTANCE = int(os.environ.get("FRAME_DUPLICATE_DISTANCE", "10"))
+
+def thumbnail(frame_path):
+    """
+    Decode a frame as a small grayscale thumbnail.
+
+    The JPEG is decoded at 1/8 scale directly, which is much cheaper than a
+    full decode followed by a resize.
+
+    Returns:
+        numpy.ndarray: THUMBNAIL_SIZE grayscale image, or None if unreadable
+    """
+    image = cv2.imread(frame_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    return cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+def difference(a, b):
+    """Mean absolute pixel difference of two thumbnails (0-255)"""
+    return float(cv2.absdiff(a, b).mean())
+
+def block_difference(a, b):
+    """Largest mean absolute pixel difference over the CHANGE_GRID blocks of two thumbnails (0-255)"""
+    return float(cv2.resize(cv2.absdiff(a, b), CHANGE_GRID, interpolation=cv2.INTER_AREA).max())
+
+def select_changed_frames(frame_paths, static_threshold=None, change_threshold=None):
+    """
+    Keep only the frames worth running OCR on.
+
+    Menu screens such as the player ratings are held still for a while,
+    gameplay never is. A frame is forwarded when it is still (barely differs
+    from the frame before it) and shows something new: it is the first still
+    frame after a moving one, or some block of it differs clearly from the
+    last forwarded frame. Each screen is then OCRed about once and gameplay
+    not at all. Unreadable frames are always forwarded.
+
+    If nothing qualifies, e.g. when frames are sampled too sparsely for any
+    screen to appear twice, every frame that differs from the last forwarded
+    one is forwarded instead.
+
+    Args:
+        frame_paths: Frame image paths in video order
+        static_threshold: Defaults to STATIC_THRESHOLD
+        change_threshold: Defaults to CHANGE_THRESHOLD
+
+    Returns:
+        list: The frame paths to OCR, in video order
+    """
+    static_threshold = STATIC_THRESHOLD if static_threshold is None else static_threshold
+    change_threshold = CHANGE_THRESHOLD if change_threshold is None else change_threshold
+
+    thumbnails = [thumbnail(path) for path in frame_paths]
+
+    selected = []
+    found_still = False
+    previous = None
+    previous_still = False
+    last_selected = None
+    for path, thumb in zip(frame_paths, thumbnails):
+        if thumb is None:
+            selected.append(path)
+            continue
+        is_still = previous is not None and difference(thumb, previous) <= static_threshold
+        is_new = (
+            last_selected is None
+            or not previous_still
+            or block_difference(thumb, last_selected) >= change_threshold
+        )
+        if is_still and is_new:
+            selected.append(path)
+            found_still = True
+            last_selected = thumb
+        previous = thumb
+        previous_still = is_still
+
+    if not found_still:
+        selected = []
+        last_selected = None
+        for path, thumb in zip(frame_paths, thumbnails):
+            if thumb is None or last_selected is None or block_difference(thumb, last_selected) >= change_threshold:
+                selected.append(path)
+                if thumb is not None:
+                    last_selected = thumb
+
+    print(f"Scene sampling kept {len(selected)} of {len(frame_paths)} frames for OCR")
+    return selected
+
+def difference_hash(image):
+    """
+    Return the dHash of a grayscale image as an int.
+
+    The image is shrunk to (HASH_SIZE + 1) x HASH_SIZE and each bit records
+    whether a pixel is brighter than its right neighbour, so compression noise
+    and small brightness shifts leave the hash (almost) unchanged.
+    """
+    small = cv2.resize(image, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+def drop_duplicate_frames(frames, max_distance=None):
+    """
+    Drop consecutive repeats of the same ratings screen, before they are OCRed.
+
+    Only the name column of the OCR layout is hashed, from the full-resolution
+    decode, since that is where two screens of the same side differ; with no
+    names region set (the "full" layout) a whole-frame hash cannot tell a
+    second page of names from the first, so every frame is kept. A frame is
+    dropped when its hash is within `max_distance` bits of the last frame kept
+    for the same side. Screens that come back later are left to
+    group_frames_by_players, which compares the names OCR read. Home and away
+    screens are never compared: their headers differ in a single word.
+
+    Args:
+        frames: (frame path, "home" or "away") of the ratings frames, in video order
+        max_distance: Defaults to DUPLICATE_DISTANCE
+
+    Returns:
+        list: (frame path, side) of the frames to OCR, in video order
+    """
+    max_distance = DUPLICATE_DISTANCE if max_distance is None else max_distance
+    names_roi = ocr_layouts.current()['names']
+    if names_roi is None:
+        return list(frames)
+
+    kept = []
+    last_kept = {}   # side -> hash of the last kept frame
+    for path, side in frames:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        names = ocr_layouts.crop(image, names_roi) if image is not None else None
+        if names is None or names.size == 0:
+            kept.append((path, side))
+            continue
+        frame_hash = difference_hash(names)
+        if side in last_kept and hamming(frame_hash, last_kept[side]) <= max_distance:
+            continue
+        last_kept[side] = frame_hash
+        kept.append((path, side))
+
+    print(f"Hash deduplication kept {len(kept)} of {len(frames)} ratings frames for OCR")
+    return kept
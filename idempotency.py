@@ -0,0 +1,115 @@
+import os
+import time
+import uuid
+import threading
+from functools import wraps
+from flask import g, request, make_response, jsonify
+
+# How long a recorded response is replayed for a repeated key
+TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "600"))
+MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000"))
+# How long a repeat waits for the first request with its key to finish
+WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "60"))
+
+HEADER = "Idempotency-Key"
+FORM_FIELD = "idempotency_key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# (endpoint, key) -> {'expires_at', 'done', 'response'}
+_entries = {}
+_lock = threading.Lock()
+
+def new_key():
+    """Return a fresh key for forms that cannot set the header themselves"""
+    return uuid.uuid4().hex
+
+def is_replay(response):
+    """Return True if the response was replayed from the store"""
+    return response.headers.get(REPLAY_HEADER) == "true"
+
+def _purge(now):
+    """Drop expired keys, and the oldest ones if the store is full (caller holds the lock)"""
+    for store_key in [k for k, entry in _entries.items() if entry['expires_at'] <= now]:
+        del _entries[store_key]
+
+    if len(_entries) >= MAX_KEYS:
+        oldest = sorted(_entries, key=lambda k: _entries[k]['expires_at'])
+        for store_key in oldest[:len(_entries) - MAX_KEYS + 1]:
+            del _entries[store_key]
+
+def succeeded():
+    """
+    Mark the current request as having done its work, so its response is recorded.
+
+    Views call this on their success paths only. Failures, including a flash
+    and redirect, are never marked and stay retryable with the same key.
+    """
+    g.idempotent_success = True
+
+def _should_record(response):
+    """Record only responses the view marked with succeeded()"""
+    return g.get('idempotent_success', False) and not response.is_streamed
+
+def idempotent(view):
+    """
+    Replay the recorded response when a request repeats an idempotency key.
+
+    The key is read from the Idempotency-Key header, or from an
+    `idempotency_key` form field for plain HTML forms. Requests without a key
+    run as before. A repeat of a key that is still running waits (up to
+    IDEMPOTENCY_WAIT_SECONDS) for the first request to finish, then gets its
+    response. Only responses the view marked with succeeded() are recorded,
+    so the client can retry anything else.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER) or request.form.get(FORM_FIELD)
+        if not key:
+            return view(*args, **kwargs)
+
+        store_key = (request.endpoint, request.path, key)
+        now = time.time()
+
+        with _lock:
+            _purge(now)
+            entry = _entries.get(store_key)
+            owner = entry is None
+            if owner:
+                entry = {'expires_at': now + TTL_SECONDS, 'done': threading.Event(), 'response': None}
+                _entries[store_key] = entry
+
+        if not owner:
+            if not entry['done'].wait(WAIT_SECONDS):
+                return jsonify({
+                    "success": False,
+                    "error": "A request with this idempotency key is still being processed"
+                }), 409
+            recorded = entry['response']
+            if recorded is not None:
+                body, status, headers = recorded
+                response = make_response(body, status)
+                response.headers.clear()
+                response.headers.extend(headers)
+                response.headers[REPLAY_HEADER] = "true"
+                return response
+            # The first attempt failed; run this one normally
+            return view(*args, **kwargs)
+
+        try:
+            g.idempotent_success = False
+            response = make_response(view(*args, **kwargs))
+            if _should_record(response):
+                entry['response'] = (
+                    response.get_data(),
+                    response.status_code,
+                    [(name, value) for name, value in response.headers if name.lower() != 'set-cookie']
+                )
+            return response
+        finally:
+            if entry['response'] is None:
+                with _lock:
+                    if _entries.get(store_key) is entry:
+                        del _entries[store_key]
+            entry['done'].set()
+
+    return wrapper
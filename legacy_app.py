@@ -13,6 +13,12 @@ from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import file_manager
+import player_aliases
+import unmatched_lookup
+import phonetic
+import frame_sampling
+import ocr_layouts
+import ocr_pool
 import traceback
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
@@ -20,18 +26,23 @@ from openpyxl.utils import get_column_letter
 from io import BytesIO
 
 # Import the necessary functions from your existing script
+# (OCR itself runs in the ocr_pool worker processes)
 from extract_and_update_player_data import (
-    initialize_ocr, extract_frames, identify_player_ratings_frames,
-    normalize_player_name, are_similar_names, extract_text_from_image
+    extract_frames, normalize_player_name, are_similar_names
 )
 
+# Spawned OCR pool workers re-import this module as __mp_main__ when it is run as a
+# script. They only need its functions, so the database client, session storage,
+# folders, thread pool and scheduled jobs below are skipped there.
+IS_OCR_WORKER = __name__ == '__mp_main__'
+
 # Load environment variables
 load_dotenv()
 
 # Initialize Supabase client
 supabase_url = os.environ.get("SUPABASE_URL")
 supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+supabase: Client = None if IS_OCR_WORKER else create_client(supabase_url, supabase_key)
 
 # Flask app configuration
 app = Flask(__name__)
@@ -42,7 +53,8 @@ app.config['SESSION_TYPE'] = 'filesystem'
 app.config['SESSION_FILE_DIR'] = os.path.join(os.getcwd(), 'flask_sessions')
 app.config['SESSION_PERMANENT'] = False
 app.config['SESSION_USE_SIGNER'] = True
-Session(app)
+if not IS_OCR_WORKER:
+    Session(app)
 
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['FRAMES_FOLDER'] = os.path.join('static', 'frames')
@@ -50,9 +62,10 @@ app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500 MB max upload size
 app.config['ALLOWED_EXTENSIONS'] = {'mp4', 'avi', 'mkv', 'mov'}
 
 # Make sure folders exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['FRAMES_FOLDER'], exist_ok=True)
-os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+if not IS_OCR_WORKER:
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['FRAMES_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
 
 # Global variable to track processing status
 processing_tasks = {}
@@ -64,7 +77,7 @@ cpu_count = multiprocessing.cpu_count()
 # Use at most CPU cores or 5 threads, whichever is smaller
 max_workers = min(cpu_count, 5)
 # Global thread pool executor for parallel processing
-thread_pool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+thread_pool_executor = None if IS_OCR_WORKER else concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
 
 # Global variable to track batch processing
 batch_processing_tasks = {}
@@ -350,9 +363,8 @@ def extract_frames_for_review(video_path, home_team_id, away_team_id, match_day,
             callback(f"Invalid away team ID: {away_team_id}", 2, "Error", "error")
         return None, "Invalid away team ID"
     
-    # Initialize OCR
-    reader = initialize_ocr()
-    print(f"OCR initialized")
+    # OCR workers load their models once and are shared by every video
+    ocr_pool.get_pool()
     if callback:
         callback("OCR engine initialized", 2, "OCR Ready")
     
@@ -381,6 +393,11 @@ def extract_frames_for_review(video_path, home_team_id, away_team_id, match_day,
                     task_data['frames_processed'] = len(frames)
                     break
     
+    # Only still, new screens can be ratings screens; skip OCR on the rest
+    scan_frames = frame_sampling.select_changed_frames(frames)
+    if callback:
+        callback(f"Scene sampling kept {len(scan_frames)} of {len(frames)} frames for OCR", 3, f"Sampled {len(scan_frames)} frames")
+    
     # Find frames with player ratings
     player_frames = []
     
@@ -391,14 +408,16 @@ def extract_frames_for_review(video_path, home_team_id, away_team_id, match_day,
     frame_count = 0
     home_frame_count = 0
     away_frame_count = 0
+    ratings_frames = []
     
-    for frame_path in frames:
+    # Frames are classified in parallel by the OCR workers, results arrive in order
+    for frame_path, side in zip(scan_frames, ocr_pool.classify_frames(scan_frames)):
         frame_count += 1
         if frame_count % 10 == 0:
-            print(f"Processed {frame_count}/{len(frames)} frames")
+            print(f"Processed {frame_count}/{len(scan_frames)} frames")
             if callback:
-                progress_percent = int((frame_count / len(frames)) * 100)
-                callback(f"Processed {frame_count}/{len(frames)} frames ({progress_percent}%)", 3, f"Scanned {frame_count} frames")
+                progress_percent = int((frame_count / len(scan_frames)) * 100)
+                callback(f"Processed {frame_count}/{len(scan_frames)} frames ({progress_percent}%)", 3, f"Scanned {frame_count} frames")
                 # Update the task with current progress
                 with task_lock:
                     for task_id, task_data in processing_tasks.items():
@@ -406,54 +425,60 @@ def extract_frames_for_review(video_path, home_team_id, away_team_id, match_day,
                             task_data['frames_processed'] = frame_count
                             break
         
-        # Get OCR results for the frame
-        ocr_results = extract_text_from_image(frame_path, reader)
+        # Check if this frame contains player ratings, from the header alone
+        is_home = side == "home"
+        is_away = side == "away"
+        if is_home:
+            home_frame_count += 1
+            print(f"Found home player ratings frame: {frame_path}")
+            if callback:
+                callback(f"Found home player ratings frame {home_frame_count}", 3, f"Found {home_frame_count} home frames", "success")
+        if is_away:
+            away_frame_count += 1
+            print(f"Found away player ratings frame: {frame_path}")
+            if callback:
+                callback(f"Found away player ratings frame {away_frame_count}", 3, f"Found {away_frame_count} away frames", "success")
         
-        # Check if this frame contains player ratings
-        is_home = False
-        is_away = False
-        for detection in ocr_results:
-            if "Player Ratings: Home" in detection[1]:
-                is_home = True
-                home_frame_count += 1
-                print(f"Found home player ratings frame: {frame_path}")
-                if callback:
-                    callback(f"Found home player ratings frame {home_frame_count}", 3, f"Found {home_frame_count} home frames", "success")
-            if "Player Ratings: Away" in detection[1]:
-                is_away = True
-                away_frame_count += 1
-                print(f"Found away player ratings frame: {frame_path}")
-                if callback:
-                    callback(f"Found away player ratings frame {away_frame_count}", 3, f"Found {away_frame_count} away frames", "success")
-        
-        # If it's a player ratings frame, save for review
         if is_home or is_away:
-            # Get relative path for template
-            rel_path = os.path.relpath(frame_path, app.config['FRAMES_FOLDER'])
-            
-            # Process text to extract player names
-            extracted_text = []
-            for detection in ocr_results:
-                text = detection[1]
-                confidence = detection[2]
-                if confidence > 0.2:
-                    # Skip known UI elements
-                    text_lower = text.lower()
-                    if text_lower == "player ratings" or text_lower == "home" or text_lower == "away" or text_lower == "back":
-                        continue
-                    
-                    extracted_text.append({
-                        "text": text,
-                        "confidence": float(confidence)
-                    })
-            
-            # Add to player frames list
-            player_frames.append({
-                "path": rel_path,
-                "is_home": is_home,
-                "is_away": is_away,
-                "ocr_results": extracted_text
-            })
+            ratings_frames.append((frame_path, side))
+    
+    # Repeats of the same screen are dropped before OCR
+    ratings_frames = frame_sampling.drop_duplicate_frames(ratings_frames)
+    if callback:
+        callback(f"Kept {len(ratings_frames)} distinct player ratings screens for OCR", 3, f"Kept {len(ratings_frames)} screens")
+    
+    # Run full OCR on the player ratings frames in parallel and save them for review
+    ratings_paths = [frame_path for frame_path, side in ratings_frames]
+    for (frame_path, side), ocr_results in zip(ratings_frames, ocr_pool.recognize_frames(ratings_paths)):
+        is_home = side == "home"
+        is_away = side == "away"
+        
+        # Get relative path for template
+        rel_path = os.path.relpath(frame_path, app.config['FRAMES_FOLDER'])
+        
+        # Process text to extract player names
+        extracted_text = []
+        for detection in ocr_results:
+            text = detection[1]
+            confidence = detection[2]
+            if confidence > 0.2:
+                # Skip known UI elements
+                text_lower = text.lower()
+                if text_lower == "player ratings" or text_lower == "home" or text_lower == "away" or text_lower == "back":
+                    continue
+                
+                extracted_text.append({
+                    "text": text,
+                    "confidence": float(confidence)
+                })
+        
+        # Add to player frames list
+        player_frames.append({
+            "path": rel_path,
+            "is_home": is_home,
+            "is_away": is_away,
+            "ocr_results": extracted_text
+        })
     
     total_player_frames = len(player_frames)
     print(f"Found {total_player_frames} player rating frames ({home_frame_count} home, {away_frame_count} away)")
@@ -519,13 +544,20 @@ def extract_frames_for_review(video_path, home_team_id, away_team_id, match_day,
 def store_unmatched_player(name, team_id, match_id):
     """Store unmatched player names in the database for future reference"""
     try:
+        # A name matched to a player before is recorded as that player's appearance
+        alias_player_id = player_aliases.lookup(name, team_id)
+        if alias_player_id is not None:
+            update_player_appearances(alias_player_id, match_id)
+            print(f"Resolved alias {name} for team {team_id} to player {alias_player_id}")
+            return None
+        
         # Check if this unmatched player + team combination already exists
-        result = supabase.table("unmatched_players").select("*").eq("name", name).eq("team_id", team_id).execute()
+        existing = unmatched_lookup.find(supabase, name, team_id)
         
-        if result.data and len(result.data) > 0:
+        if existing:
             # If it exists, update the last_seen field and increment occurrence count
-            player_id = result.data[0]["id"]
-            occurrence_count = result.data[0].get("occurrence_count", 1) + 1
+            player_id = existing["id"]
+            occurrence_count = (existing.get("occurrence_count") or 1) + 1
             
             supabase.table("unmatched_players").update({
                 "last_seen": time.strftime("%Y-%m-%d"),
@@ -587,9 +619,8 @@ def process_video(video_path, home_team_id, away_team_id, match_day, progress_ca
     if progress_callback:
         progress_callback(f"Created match record with ID: {match_id}", 2, "Match record created", "success")
     
-    # Initialize OCR
-    reader = initialize_ocr()
-    print(f"OCR initialized")
+    # OCR workers load their models once and are shared by every video
+    ocr_pool.get_pool()
     if progress_callback:
         progress_callback("OCR engine initialized", 2, "OCR Ready")
     
@@ -626,7 +657,18 @@ def process_video(video_path, home_team_id, away_team_id, match_day, progress_ca
         progress_callback("Identifying player ratings frames", 3, "Analyzing frames")
     
     start_time = time.time()
-    home_players, away_players = identify_player_ratings_frames(frames, reader)
+    # Only still, new screens can be ratings screens; skip OCR on the rest
+    scan_frames = frame_sampling.select_changed_frames(frames)
+    if progress_callback:
+        progress_callback(f"Scene sampling kept {len(scan_frames)} of {len(frames)} frames for OCR", 3, f"Sampled {len(scan_frames)} frames")
+    # Full recognition only runs on frames whose header marks them as ratings screens,
+    # once per distinct screen, and reads only the header and name column of each
+    ratings_frames = frame_sampling.drop_duplicate_frames([
+        (frame_path, side)
+        for frame_path, side in zip(scan_frames, ocr_pool.classify_frames(scan_frames)) if side
+    ])
+    scan_frames = [ocr_layouts.recognition_image(frame_path) for frame_path, side in ratings_frames]
+    home_players, away_players = ocr_pool.identify_players(scan_frames)
     identification_time = time.time() - start_time
     
     # Apply additional filtering to remove UI elements 
@@ -652,6 +694,10 @@ def process_video(video_path, home_team_id, away_team_id, match_day, progress_ca
     # Get players from database
     db_home_players = get_players_by_team_id(home_team_id)
     db_away_players = get_players_by_team_id(away_team_id)
+    db_home_players_by_id = {str(player["id"]): player for player in db_home_players}
+    db_away_players_by_id = {str(player["id"]): player for player in db_away_players}
+    home_phonetic = phonetic.PhoneticIndex(db_home_players)
+    away_phonetic = phonetic.PhoneticIndex(db_away_players)
     
     print(f"Found {len(db_home_players)} home players and {len(db_away_players)} away players in database")
     if progress_callback:
@@ -671,9 +717,19 @@ def process_video(video_path, home_team_id, away_team_id, match_day, progress_ca
     for extracted_name in home_players:
         print(f"  Trying to match home player: {extracted_name}")
         found_match = False
-        for db_player in db_home_players:
+        
+        # Names matched by hand before, or with one clear phonetic match, resolve directly;
+        # otherwise only the phonetic candidates are compared (the whole roster if there are none)
+        resolved_player = db_home_players_by_id.get(str(player_aliases.lookup(extracted_name, home_team_id)))
+        if resolved_player is None:
+            resolved_player = home_phonetic.best_match(extracted_name)
+        if resolved_player is not None:
+            candidates = [resolved_player]
+        else:
+            candidates = [player for player, covered, similarity in home_phonetic.candidates(extracted_name)] or db_home_players
+        for db_player in candidates:
             # Check if names match
-            if are_similar_names(extracted_name, db_player["name"]):
+            if resolved_player is not None or are_similar_names(extracted_name, db_player["name"]):
                 print(f"  Matched {extracted_name} with {db_player['name']}")
                 matched_home_player_names.add(extracted_name.lower())
                 if progress_callback:
@@ -704,9 +760,19 @@ def process_video(video_path, home_team_id, away_team_id, match_day, progress_ca
     for extracted_name in away_players:
         print(f"  Trying to match away player: {extracted_name}")
         found_match = False
-        for db_player in db_away_players:
+        
+        # Names matched by hand before, or with one clear phonetic match, resolve directly;
+        # otherwise only the phonetic candidates are compared (the whole roster if there are none)
+        resolved_player = db_away_players_by_id.get(str(player_aliases.lookup(extracted_name, away_team_id)))
+        if resolved_player is None:
+            resolved_player = away_phonetic.best_match(extracted_name)
+        if resolved_player is not None:
+            candidates = [resolved_player]
+        else:
+            candidates = [player for player, covered, similarity in away_phonetic.candidates(extracted_name)] or db_away_players
+        for db_player in candidates:
             # Check if names match
-            if are_similar_names(extracted_name, db_player["name"]):
+            if resolved_player is not None or are_similar_names(extracted_name, db_player["name"]):
                 print(f"  Matched {extracted_name} with {db_player['name']}")
                 matched_away_player_names.add(extracted_name.lower())
                 if progress_callback:
@@ -3290,6 +3356,9 @@ def match_player(match_day_id):
         if not status_result.data or len(status_result.data) == 0:
             return jsonify({"success": False, "error": "Failed to update unmatched player status"})
         
+        # Resolve this spelling straight to the player next time
+        player_aliases.learn(supabase, unmatched_player.get("name"), unmatched_player.get("team_id"), existing_player_id)
+        
         # Create an appearance for the existing player if not already present
         appearance_result = supabase.table("appearances").select("*").eq("player_id", existing_player_id).eq("match_id", match_day_id).execute()
         
@@ -3480,6 +3549,16 @@ def get_all_teams_api():
     result = supabase.table("teams").select("id, name").order("name").execute()
     return jsonify(result.data if result.data else [])
 
+def load_player_aliases():
+    """Scheduled job that (re)loads the learned player aliases"""
+    try:
+        player_aliases.load(supabase)
+    except Exception as e:
+        print(f"Error loading player aliases: {str(e)}")
+
+if not IS_OCR_WORKER:
+    file_manager.schedule_index_job('player_aliases', load_player_aliases, player_aliases.REFRESH_SECONDS)
+
 if __name__ == '__main__':
     # Schedule regular file cleanup
     file_manager.schedule_cleanup(app)
@@ -0,0 +1,47 @@
+-- Consistent snapshot for the league Excel export.
+--
+-- Every table is aggregated inside one SELECT, so PostgreSQL serves all of
+-- them from the same MVCC snapshot. Edits committed while the export is
+-- running cannot make the summary totals disagree with the team sheets.
+-- Returning a single json value also keeps the response clear of the
+-- PostgREST max-rows cap.
+--
+-- Call with: supabase.rpc("export_snapshot").execute()
+
+create or replace function export_snapshot()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'snapshot_at', now(),
+        'teams', coalesce(
+            (select json_agg(t order by t.name) from teams t),
+            '[]'::json
+        ),
+        'matches', coalesce(
+            (select json_agg(json_build_object(
+                'id', m.id,
+                'match_day', m.match_day,
+                'date', m.date
+            ) order by m.date) from matches m),
+            '[]'::json
+        ),
+        'players', coalesce(
+            (select json_agg(p order by p.name) from players p),
+            '[]'::json
+        ),
+        'appearances', coalesce(
+            (select json_agg(json_build_object(
+                'id', a.id,
+                'player_id', a.player_id,
+                'match_id', a.match_id
+            )) from appearances a),
+            '[]'::json
+        ),
+        'unmatched_players', coalesce(
+            (select json_agg(u order by u.occurrence_count desc) from unmatched_players u),
+            '[]'::json
+        )
+    );
+$$;
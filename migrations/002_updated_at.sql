@@ -0,0 +1,32 @@
+-- updated_at watermarks for the local SQLite read replica (replica.py).
+--
+-- The sync worker pulls rows with updated_at >= its last watermark, so every
+-- replicated table needs the column kept current on insert and update.
+-- Deletes are picked up separately by the replica's periodic id reconcile.
+
+create or replace function set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['teams', 'players', 'matches', 'appearances', 'unmatched_players']
+    loop
+        execute format('alter table %I add column if not exists updated_at timestamptz not null default now()', t);
+        execute format('create index if not exists %I on %I (updated_at)', t || '_updated_at_idx', t);
+        execute format('drop trigger if exists set_updated_at on %I', t);
+        execute format(
+            'create trigger set_updated_at before update on %I for each row execute function set_updated_at()',
+            t
+        );
+    end loop;
+end;
+$$;
@@ -0,0 +1,40 @@
+-- Support for POST /match/<id>/appearances/patch.
+--
+-- matches.version is bumped on every change to a match's appearances so a
+-- client patching from an older version is rejected with one conditional
+-- update. The unique index lets added appearances be inserted with
+-- on conflict do nothing, and adjust_total_appearances() updates the
+-- counters of every affected player in a single call.
+
+alter table matches add column if not exists version integer not null default 0;
+
+-- Remove duplicate appearances before adding the unique index
+delete from appearances a
+using appearances b
+where a.match_id = b.match_id
+  and a.player_id = b.player_id
+  and a.ctid > b.ctid;
+
+create unique index if not exists appearances_match_player_key
+    on appearances (match_id, player_id);
+
+-- Recount after removing duplicates
+update players p
+set total_appearances = coalesce(c.total, 0)
+from (
+    select pl.id, count(a.player_id) as total
+    from players pl
+    left join appearances a on a.player_id = pl.id
+    group by pl.id
+) c
+where c.id = p.id
+  and p.total_appearances is distinct from coalesce(c.total, 0);
+
+create or replace function adjust_total_appearances(p_player_ids text[], p_delta integer)
+returns void
+language sql
+as $$
+    update players
+    set total_appearances = greatest(coalesce(total_appearances, 0) + p_delta, 0)
+    where id::text = any(p_player_ids);
+$$;
@@ -0,0 +1,155 @@
+-- Per-match appearance and unmatched counters for the matches listing.
+--
+-- match_summary holds the four numbers the /matches page shows for each
+-- match. Triggers on appearances, unmatched_players, matches and players
+-- refresh the row of every match a write touches, so the listing becomes a
+-- single select with match_summary embedded instead of two queries per
+-- match. Refreshing recounts one match through indexed lookups, which keeps
+-- the counters exact even when a player changes team or a match changes
+-- teams. Requires 003_appearance_patch.sql for the appearances index.
+
+do $$
+declare
+    id_type text;
+begin
+    -- Use the same type as matches.id, whatever it is in this project
+    select format_type(atttypid, atttypmod) into id_type
+    from pg_attribute
+    where attrelid = 'matches'::regclass and attname = 'id';
+
+    execute format(
+        'create table if not exists match_summary (
+            match_id %s primary key references matches(id) on delete cascade,
+            home_appearances integer not null default 0,
+            away_appearances integer not null default 0,
+            home_unmatched integer not null default 0,
+            away_unmatched integer not null default 0,
+            updated_at timestamptz not null default now()
+        )',
+        id_type
+    );
+end;
+$$;
+
+create index if not exists unmatched_players_last_match_team_idx
+    on unmatched_players (last_match_id, team_id);
+
+create or replace function refresh_match_summary(p_match_ids anyarray)
+returns void
+language sql
+as $$
+    insert into match_summary (match_id, home_appearances, away_appearances, home_unmatched, away_unmatched, updated_at)
+    select
+        m.id,
+        (select count(*) from appearances a join players p on p.id = a.player_id
+         where a.match_id = m.id and p.team_id = m.home_team_id),
+        (select count(*) from appearances a join players p on p.id = a.player_id
+         where a.match_id = m.id and p.team_id = m.away_team_id),
+        (select count(*) from unmatched_players u
+         where u.last_match_id = m.id and u.team_id = m.home_team_id),
+        (select count(*) from unmatched_players u
+         where u.last_match_id = m.id and u.team_id = m.away_team_id),
+        now()
+    from matches m
+    where m.id = any(p_match_ids)
+    on conflict (match_id) do update set
+        home_appearances = excluded.home_appearances,
+        away_appearances = excluded.away_appearances,
+        home_unmatched = excluded.home_unmatched,
+        away_unmatched = excluded.away_unmatched,
+        updated_at = excluded.updated_at;
+$$;
+
+-- Statement-level triggers so a bulk import refreshes each match once.
+-- Transition tables allow only one event per trigger, hence one per event.
+
+create or replace function match_summary_from_appearances()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform refresh_match_summary(array(select distinct match_id from new_rows where match_id is not null));
+    end if;
+    if tg_op in ('DELETE', 'UPDATE') then
+        perform refresh_match_summary(array(select distinct match_id from old_rows where match_id is not null));
+    end if;
+    return null;
+end;
+$$;
+
+create or replace function match_summary_from_unmatched()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform refresh_match_summary(array(select distinct last_match_id from new_rows where last_match_id is not null));
+    end if;
+    if tg_op in ('DELETE', 'UPDATE') then
+        perform refresh_match_summary(array(select distinct last_match_id from old_rows where last_match_id is not null));
+    end if;
+    return null;
+end;
+$$;
+
+create or replace function match_summary_from_matches()
+returns trigger
+language plpgsql
+as $$
+begin
+    perform refresh_match_summary(array(select id from new_rows));
+    return null;
+end;
+$$;
+
+create or replace function match_summary_from_players()
+returns trigger
+language plpgsql
+as $$
+begin
+    -- Only team changes move a player's appearances between home and away
+    perform refresh_match_summary(array(
+        select distinct a.match_id
+        from new_rows n
+        join old_rows o on o.id = n.id
+        join appearances a on a.player_id = n.id
+        where n.team_id is distinct from o.team_id
+    ));
+    return null;
+end;
+$$;
+
+drop trigger if exists match_summary_insert on appearances;
+drop trigger if exists match_summary_update on appearances;
+drop trigger if exists match_summary_delete on appearances;
+create trigger match_summary_insert after insert on appearances
+    referencing new table as new_rows for each statement execute function match_summary_from_appearances();
+create trigger match_summary_update after update on appearances
+    referencing new table as new_rows old table as old_rows for each statement execute function match_summary_from_appearances();
+create trigger match_summary_delete after delete on appearances
+    referencing old table as old_rows for each statement execute function match_summary_from_appearances();
+
+drop trigger if exists match_summary_insert on unmatched_players;
+drop trigger if exists match_summary_update on unmatched_players;
+drop trigger if exists match_summary_delete on unmatched_players;
+create trigger match_summary_insert after insert on unmatched_players
+    referencing new table as new_rows for each statement execute function match_summary_from_unmatched();
+create trigger match_summary_update after update on unmatched_players
+    referencing new table as new_rows old table as old_rows for each statement execute function match_summary_from_unmatched();
+create trigger match_summary_delete after delete on unmatched_players
+    referencing old table as old_rows for each statement execute function match_summary_from_unmatched();
+
+drop trigger if exists match_summary_insert on matches;
+drop trigger if exists match_summary_update on matches;
+create trigger match_summary_insert after insert on matches
+    referencing new table as new_rows for each statement execute function match_summary_from_matches();
+create trigger match_summary_update after update on matches
+    referencing new table as new_rows for each statement execute function match_summary_from_matches();
+
+drop trigger if exists match_summary_update on players;
+create trigger match_summary_update after update on players
+    referencing new table as new_rows old table as old_rows for each statement execute function match_summary_from_players();
+
+-- Backfill every existing match
+select refresh_match_summary(array(select id from matches));
@@ -0,0 +1,128 @@
+-- Normalized name key for unmatched player lookups.
+--
+-- Unmatched names were looked up by exact name, so "J. Smith", "j smith" and
+-- "J Smith " each got their own row. name_key holds the name lower-cased,
+-- with accents stripped, punctuation turned into spaces and whitespace
+-- collapsed; the app looks rows up by (team_id, name_key). A trigger keeps
+-- the key current on every insert and rename. Existing duplicates are merged
+-- into one row per team and key before the unique index is added.
+--
+-- unmatched_name_key() must stay in step with player_search.normalize().
+-- Requires PostgreSQL 13+ for normalize().
+
+create or replace function unmatched_name_key(p_name text)
+returns text
+language sql
+immutable
+as $$
+    select btrim(regexp_replace(
+        regexp_replace(
+            lower(regexp_replace(normalize(coalesce(p_name, ''), NFKD), E'[\u0300-\u036f]', '', 'g')),
+            '[^[:alnum:][:space:]]', ' ', 'g'
+        ),
+        '[[:space:]]+', ' ', 'g'
+    ));
+$$;
+
+alter table unmatched_players add column if not exists name_key text;
+
+create or replace function unmatched_players_set_name_key()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.name_key := unmatched_name_key(new.name);
+    return new;
+end;
+$$;
+
+drop trigger if exists unmatched_players_name_key on unmatched_players;
+create trigger unmatched_players_name_key before insert or update of name, name_key on unmatched_players
+    for each row execute function unmatched_players_set_name_key();
+
+update unmatched_players
+set name_key = unmatched_name_key(name)
+where name_key is distinct from unmatched_name_key(name);
+
+-- Merge duplicates: the surviving row is a matched one if any, otherwise the
+-- oldest. It takes the summed count, the earliest first_seen and the
+-- last_seen and last_match_id of the most recent sighting.
+create temporary table unmatched_name_key_merge as
+with ranked as (
+    select
+        u.*,
+        first_value(u.id) over (
+            partition by u.team_id, u.name_key
+            order by (u.status = 'matched') desc nulls last, (u.status = 'merged') asc nulls first,
+                     u.first_seen asc nulls last, u.id asc
+        ) as survivor_id,
+        first_value(u.last_match_id) over (
+            partition by u.team_id, u.name_key
+            order by u.last_seen desc nulls last, u.id desc
+        ) as latest_match_id,
+        count(*) over (partition by u.team_id, u.name_key) as copies
+    from unmatched_players u
+)
+select * from ranked where copies > 1;
+
+update unmatched_players u
+set occurrence_count = m.total,
+    first_seen = m.first_seen,
+    last_seen = m.last_seen,
+    last_match_id = m.latest_match_id
+from (
+    select
+        survivor_id,
+        sum(coalesce(occurrence_count, 1)) as total,
+        min(first_seen) as first_seen,
+        max(last_seen) as last_seen,
+        (array_agg(latest_match_id))[1] as latest_match_id
+    from unmatched_name_key_merge
+    group by survivor_id
+) m
+where u.id = m.survivor_id;
+
+-- A survivor that was merged into one of its duplicates follows that
+-- duplicate's own merge when it leads outside the group...
+update unmatched_players u
+set matched_player_id = d.matched_player_id
+from unmatched_name_key_merge d
+where u.id = d.survivor_id
+  and u.status = 'merged'
+  and u.matched_player_id::text = d.id::text
+  and d.id <> d.survivor_id
+  and d.status = 'merged'
+  and not exists (
+      select 1 from unmatched_name_key_merge g
+      where g.survivor_id = d.survivor_id
+        and g.id::text = d.matched_player_id::text
+  );
+
+-- Rows merged into a duplicate by hand now point at the survivor (never the
+-- survivor itself, which would then point at itself)
+update unmatched_players u
+set matched_player_id = m.survivor_id
+from unmatched_name_key_merge m
+where u.status = 'merged'
+  and u.matched_player_id::text = m.id::text
+  and m.id <> m.survivor_id
+  and u.id <> m.survivor_id;
+
+-- ...otherwise, still pointing into its own group, it becomes the unmatched row for the name
+update unmatched_players u
+set status = 'unmatched',
+    matched_player_id = null
+from unmatched_name_key_merge g
+where u.id = g.survivor_id
+  and u.status = 'merged'
+  and u.matched_player_id::text = g.id::text;
+
+delete from unmatched_players u
+using unmatched_name_key_merge m
+where u.id = m.id
+  and m.id <> m.survivor_id;
+
+drop table unmatched_name_key_merge;
+
+create unique index if not exists unmatched_players_team_name_key
+    on unmatched_players (team_id, name_key);
@@ -0,0 +1,51 @@
+-- Names that were matched to a registered player by hand.
+--
+-- Every time match_player resolves an unmatched name to a player, the name's
+-- key (unmatched_name_key() from 005) is recorded here for the name's team.
+-- The app loads the table into memory and resolves the same spelling
+-- straight to the player next time, without fuzzy scoring or a manual
+-- match. Requires 005_unmatched_name_key.sql.
+
+do $$
+declare
+    team_id_type text;
+    player_id_type text;
+begin
+    -- Use the same types as teams.id and players.id, whatever they are in this project
+    select format_type(atttypid, atttypmod) into team_id_type
+    from pg_attribute
+    where attrelid = 'teams'::regclass and attname = 'id';
+
+    select format_type(atttypid, atttypmod) into player_id_type
+    from pg_attribute
+    where attrelid = 'players'::regclass and attname = 'id';
+
+    execute format(
+        'create table if not exists player_aliases (
+            id bigint generated by default as identity primary key,
+            team_id %s not null references teams(id) on delete cascade,
+            alias_key text not null,
+            name text not null,
+            player_id %s not null references players(id) on delete cascade,
+            created_at timestamptz not null default now(),
+            updated_at timestamptz not null default now()
+        )',
+        team_id_type, player_id_type
+    );
+end;
+$$;
+
+create unique index if not exists player_aliases_team_alias_key
+    on player_aliases (team_id, alias_key);
+
+-- Seed from the names already matched by hand
+insert into player_aliases (team_id, alias_key, name, player_id)
+select distinct on (u.team_id, u.name_key)
+    u.team_id, u.name_key, u.name, p.id
+from unmatched_players u
+join players p on p.id::text = u.matched_player_id::text
+where u.status = 'matched'
+  and u.team_id is not null
+  and u.name_key <> ''
+order by u.team_id, u.name_key, u.last_seen desc nulls last
+on conflict (team_id, alias_key) do nothing;
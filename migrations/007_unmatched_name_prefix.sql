@@ -0,0 +1,15 @@
+-- Word-prefix search over unmatched names for GET /api/players/search.
+--
+-- The autocomplete asks for unmatched names with a word starting with the
+-- typed text (name_key like 'sal%' or name_key like '% sal%'), as the
+-- player search does. A pg_trgm index serves both patterns, including the
+-- one with a leading wildcard. Requires 005_unmatched_name_key.sql.
+
+create extension if not exists pg_trgm;
+
+-- Replaced by the trigram index below, which also serves plain prefixes
+drop index if exists unmatched_players_name_key_prefix;
+
+create index if not exists unmatched_players_name_key_trgm
+    on unmatched_players using gin (name_key gin_trgm_ops)
+    where status = 'unmatched';
@@ -0,0 +1,40 @@
+-- Database-wide data version for the league export cache (export_cache.py).
+--
+-- Every statement that changes a table the export reads bumps one counter,
+-- whichever process or tool made the change. A cached export records the
+-- version it was built at and is only served while the counter still holds
+-- that value, including across app restarts.
+
+create table if not exists data_version (
+    id integer primary key default 1 check (id = 1),
+    version bigint not null default 0
+);
+
+insert into data_version (id, version) values (1, 0)
+on conflict (id) do nothing;
+
+create or replace function bump_data_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    update data_version set version = version + 1 where id = 1;
+    return null;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['teams', 'players', 'matches', 'appearances', 'unmatched_players']
+    loop
+        execute format('drop trigger if exists bump_data_version on %I', t);
+        execute format(
+            'create trigger bump_data_version after insert or update or delete or truncate on %I '
+            'for each statement execute function bump_data_version()',
+            t
+        );
+    end loop;
+end;
+$$;
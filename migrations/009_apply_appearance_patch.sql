@@ -0,0 +1,60 @@
+-- Atomic appearance patches for POST /match/<id>/appearances/patch.
+--
+-- Claiming the next match version and writing the delta happen in one
+-- transaction, so a write that fails leaves the version where it was and the
+-- client's retry is not rejected as stale. Returns null when the match is
+-- not at p_version (or does not exist). Requires 003_appearance_patch.sql.
+
+create or replace function apply_appearance_patch(
+    p_match_id text,
+    p_version integer,
+    p_add text[],
+    p_remove text[]
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_match_id matches.id%type;
+    v_added text[];
+    v_removed text[];
+begin
+    update matches
+    set version = version + 1
+    where id::text = p_match_id
+      and version = p_version
+    returning id into v_match_id;
+
+    if not found then
+        return null;
+    end if;
+
+    -- Ids come in as text; taking them from players keeps their real type
+    with inserted as (
+        insert into appearances (match_id, player_id)
+        select v_match_id, p.id
+        from players p
+        where p.id::text = any(coalesce(p_add, '{}'))
+        on conflict (match_id, player_id) do nothing
+        returning player_id
+    )
+    select coalesce(array_agg(player_id::text), '{}') into v_added from inserted;
+
+    with deleted as (
+        delete from appearances
+        where match_id = v_match_id
+          and player_id::text = any(coalesce(p_remove, '{}'))
+        returning player_id
+    )
+    select coalesce(array_agg(player_id::text), '{}') into v_removed from deleted;
+
+    perform adjust_total_appearances(v_added, 1);
+    perform adjust_total_appearances(v_removed, -1);
+
+    return jsonb_build_object(
+        'version', p_version + 1,
+        'added', to_jsonb(v_added),
+        'removed', to_jsonb(v_removed)
+    );
+end;
+$$;
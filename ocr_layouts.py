@@ -0,0 +1,80 @@
+import os
+import cv2
+
+# Regions of a player ratings screen, as fractions of the frame (left, top, right, bottom).
+# "header" holds the "Player Ratings: Home/Away" title, "names" the player name
+# column; None means the whole frame. Pick one with OCR_LAYOUT, or override a
+# region with OCR_HEADER_ROI / OCR_NAMES_ROI (e.g. "0,0.15,0.45,0.95").
+LAYOUTS = {
+    # No cropping: recognise the whole frame
+    'full': {
+        'header': (0.0, 0.0, 1.0, 0.2),
+        'names': None
+    },
+    # Ratings table with the name column on the left and ratings to its right
+    'ratings_table_left': {
+        'header': (0.0, 0.0, 1.0, 0.15),
+        'names': (0.0, 0.15, 0.45, 0.95)
+    }
+}
+
+LAYOUT_NAME = os.environ.get("OCR_LAYOUT", "full")
+
+def _parse_roi(value):
+    left, top, right, bottom = (float(part) for part in value.split(","))
+    return (left, top, right, bottom)
+
+def current():
+    """Return the active layout, with any per-region overrides from the environment applied"""
+    if LAYOUT_NAME not in LAYOUTS:
+        raise ValueError(f"Unknown OCR_LAYOUT {LAYOUT_NAME!r}, expected one of {', '.join(LAYOUTS)}")
+    layout = dict(LAYOUTS[LAYOUT_NAME])
+    if os.environ.get("OCR_HEADER_ROI"):
+        layout['header'] = _parse_roi(os.environ["OCR_HEADER_ROI"])
+    if os.environ.get("OCR_NAMES_ROI"):
+        layout['names'] = _parse_roi(os.environ["OCR_NAMES_ROI"])
+    return layout
+
+def crop(image, roi):
+    """Return the region of an image given as fractions (left, top, right, bottom)"""
+    height, width = image.shape[:2]
+    left, top, right, bottom = roi
+    return image[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+
+def recognition_image(frame_path):
+    """
+    Return the path of the image OCR should read for a ratings frame.
+
+    With a names region configured, the header and the name column are cut
+    out, stacked and saved next to the frame, so recognition skips ratings,
+    positions and menus while still seeing the header that tells home from
+    away. Without one, the frame itself is returned.
+
+    Args:
+        frame_path: Path of the full frame
+
+    Returns:
+        str: Path of the cropped image, or frame_path
+    """
+    layout = current()
+    if layout['names'] is None:
+        return frame_path
+
+    image = cv2.imread(frame_path)
+    if image is None:
+        return frame_path
+
+    parts = [crop(image, layout['header']), crop(image, layout['names'])]
+    parts = [part for part in parts if part.size]
+    if not parts:
+        return frame_path
+    width = max(part.shape[1] for part in parts)
+    parts = [
+        cv2.copyMakeBorder(part, 0, 0, 0, width - part.shape[1], cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        for part in parts
+    ]
+
+    root, ext = os.path.splitext(frame_path)
+    cropped_path = f"{root}_roi{ext or '.jpg'}"
+    cv2.imwrite(cropped_path, cv2.vconcat(parts))
+    return cropped_path
@@ -0,0 +1,117 @@
+import os
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import ratings_detector
+import ocr_layouts
+
+# Intra-op threads each worker's PyTorch may use; workers x threads should not exceed the cores
+THREADS_PER_WORKER = int(os.environ.get("OCR_THREADS_PER_WORKER", "2"))
+# Worker processes, each holding its own EasyOCR reader
+WORKERS = int(os.environ.get("OCR_WORKERS", str(max(1, multiprocessing.cpu_count() // THREADS_PER_WORKER))))
+
+_lock = threading.Lock()
+_pool = None
+
+# Set in each worker process by _init_worker
+_reader = None
+
+# Thread pool sizes read by OpenMP/MKL when torch is first imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+def _init_worker(threads):
+    """Load the OCR models once per worker, with PyTorch pinned to `threads` threads"""
+    global _reader
+    import torch
+    from extract_and_update_player_data import initialize_ocr
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _reader = initialize_ocr()
+    print(f"OCR worker {os.getpid()} ready ({threads} threads)")
+
+def _classify(frame_path):
+    return ratings_detector.classify(frame_path, _reader)
+
+def _recognize(frame_path):
+    from extract_and_update_player_data import extract_text_from_image
+
+    return extract_text_from_image(ocr_layouts.recognition_image(frame_path), _reader)
+
+def _identify(frame_paths):
+    from extract_and_update_player_data import identify_player_ratings_frames
+
+    return identify_player_ratings_frames(frame_paths, _reader)
+
+def get_pool():
+    """Return the shared OCR process pool, starting it on first use"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Spawned workers inherit the environment. It has to be set here: a worker
+            # may import torch (e.g. by re-importing the main module) before its
+            # initializer runs. The server process itself runs no torch work.
+            for name in THREAD_ENV_VARS:
+                os.environ[name] = str(THREADS_PER_WORKER)
+            # Spawned rather than forked: forking a process that has loaded torch can deadlock
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(THREADS_PER_WORKER,)
+            )
+            print(f"Started OCR pool with {WORKERS} workers x {THREADS_PER_WORKER} threads")
+        return _pool
+
+def _map(function, frame_paths):
+    """Run `function` over frames in the pool, yielding results in frame order"""
+    frame_paths = list(frame_paths)
+    if not frame_paths:
+        return
+    pool = get_pool()
+    try:
+        yield from pool.map(function, frame_paths, chunksize=max(1, len(frame_paths) // (WORKERS * 4)))
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool for the next caller
+        _discard(pool)
+        raise
+
+def _discard(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def classify_frames(frame_paths):
+    """
+    Classify frames as home/away ratings screens across the OCR workers.
+
+    Returns:
+        iterator: "home", "away" or None per frame, in order
+    """
+    return _map(_classify, frame_paths)
+
+def recognize_frames(frame_paths):
+    """
+    Run OCR on the layout's recognition region of each frame across the OCR workers.
+
+    Returns:
+        iterator: EasyOCR detections (bbox, text, confidence) per frame, in order
+    """
+    return _map(_recognize, frame_paths)
+
+def identify_players(frame_paths):
+    """
+    Run identify_player_ratings_frames in an OCR worker.
+
+    Returns:
+        tuple: (home player names, away player names)
+    """
+    pool = get_pool()
+    try:
+        return pool.submit(_identify, list(frame_paths)).result()
+    except BrokenProcessPool:
+        _discard(pool)
+        raise
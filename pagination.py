@@ -0,0 +1,121 @@
+import os
+import concurrent.futures
+
+# Rows per request; keep this at or below the PostgREST max-rows setting
+DEFAULT_PAGE_SIZE = int(os.environ.get("SUPABASE_PAGE_SIZE", "1000"))
+
+# Shared pool used to fetch the next page while the caller consumes the current one
+prefetch_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SUPABASE_PREFETCH_WORKERS", "4")),
+    thread_name_prefix="iter_table"
+)
+
+def iter_table(client, table, columns="*", filters=None, key="id", order_by=None,
+               desc=False, page_size=None, prefetch=True):
+    """
+    Stream every row of a query, one page at a time.
+
+    PostgREST silently caps a single response at its max-rows limit, so any
+    unpaged select() over a large table is truncated. With the default
+    ordering the query is walked by keyset (`key > last_key`), which stays
+    cheap on deep pages. When `order_by` names another column the query is
+    walked with range() offsets instead, ordered by `key` within equal
+    `order_by` values so the page boundaries are stable. Either way the next page is advanced
+    by the number of rows actually returned and iteration stops on an empty
+    page, so a server cap below `page_size` cannot drop rows.
+
+    Args:
+        client: Supabase client
+        table: Table name
+        columns: Columns for select(), must include `key` in keyset mode
+        filters: Optional callable taking and returning the query builder,
+            e.g. lambda q: q.eq("team_id", team_id)
+        key: Unique, sortable column used for keyset paging and as the tiebreaker
+        order_by: Column to order by; switches to range() paging if not `key`
+        desc: Sort descending
+        page_size: Rows per request (defaults to SUPABASE_PAGE_SIZE)
+        prefetch: Fetch the next page on a background thread while the
+            current page is being consumed
+
+    Yields:
+        dict: One row per iteration
+    """
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    keyset = order_by is None or order_by == key
+
+    def fetch_page(cursor):
+        query = client.table(table).select(columns)
+        if filters:
+            query = filters(query)
+
+        if keyset:
+            if cursor is not None:
+                query = query.lt(key, cursor) if desc else query.gt(key, cursor)
+            query = query.order(key, desc=desc).limit(page_size)
+        else:
+            # `key` breaks ties, otherwise rows sharing an order_by value can move between pages.
+            # Both columns go in one order param: PostgREST does not combine repeated ones.
+            query = query.order(f"{order_by}{'.desc' if desc else ''},{key}")
+            # The pinned postgrest-py sends range(start, end) as "Range: start-(end-1)"
+            query = query.range(cursor, cursor + page_size)
+
+        result = query.execute()
+        return result.data if result.data else []
+
+    def next_cursor(cursor, rows):
+        if keyset:
+            return rows[-1][key]
+        return cursor + len(rows)
+
+    cursor = None if keyset else 0
+    rows = fetch_page(cursor)
+
+    while rows:
+        cursor = next_cursor(cursor, rows)
+
+        if prefetch:
+            # Start the next request before handing this page to the caller
+            pending = prefetch_executor.submit(fetch_page, cursor)
+            yield from rows
+            rows = pending.result()
+        else:
+            yield from rows
+            rows = fetch_page(cursor)
+
+def fetch_all(client, table, **kwargs):
+    """
+    Return every row of a query as a list.
+
+    Args:
+        client: Supabase client
+        table: Table name
+        **kwargs: Passed through to iter_table()
+
+    Returns:
+        list: All rows
+    """
+    return list(iter_table(client, table, **kwargs))
+
+def count_rows(client, table, filters=None, column="id"):
+    """
+    Count rows with an exact server-side count instead of fetching them.
+
+    Args:
+        client: Supabase client
+        table: Table name
+        filters: Optional callable taking and returning the query builder
+        column: Column to select (only one row of it is transferred)
+
+    Returns:
+        int: Number of matching rows
+    """
+    query = client.table(table).select(column, count="exact")
+    if filters:
+        query = filters(query)
+
+    result = query.limit(1).execute()
+    if result.count is not None:
+        return result.count
+
+    # Older servers may not return a count header; fall back to paging
+    return sum(1 for _ in iter_table(client, table, columns=column, filters=filters, key=column))
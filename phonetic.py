@@ -0,0 +1,123 @@
+import os
+import player_search
+
+# A phonetic candidate is accepted only if its spelling is at least this similar too
+MIN_SIMILARITY = float(os.environ.get("PHONETIC_MIN_SIMILARITY", "0.25"))
+# ...and beats the next phonetic candidate by this much
+MARGIN = float(os.environ.get("PHONETIC_MARGIN", "0.1"))
+
+# Longest phonetic key kept per word
+KEY_LENGTH = 4
+
+# Letter groups rewritten before vowels are dropped, in order
+_GROUPS = (
+    ("sch", "sk"), ("tch", "x"), ("ch", "x"), ("sh", "x"), ("ph", "f"), ("th", "t"),
+    ("dg", "j"), ("ck", "k"), ("gh", "g"),
+    ("ce", "se"), ("ci", "si"), ("cy", "sy"),
+    ("c", "k"), ("q", "k"), ("x", "ks"), ("z", "s"), ("v", "f"), ("d", "t")
+)
+_SILENT_STARTS = (("kn", "n"), ("gn", "n"), ("pn", "n"), ("wr", "r"), ("ps", "s"))
+_VOWELS = set("aeiouy")
+
+def word_key(word):
+    """
+    Return a Metaphone-style key for one normalized word.
+
+    Similar-sounding spellings share a key: "mohamad", "mohamed" and
+    "muhammad" all give "mt", "salha" and "salah" both give "sl". Keys are
+    cut to KEY_LENGTH so a misread ending still matches. Words in other
+    scripts are returned unchanged.
+    """
+    if not word.isascii():
+        return word
+
+    for prefix, replacement in _SILENT_STARTS:
+        if word.startswith(prefix):
+            word = replacement + word[len(prefix):]
+            break
+    for group, replacement in _GROUPS:
+        word = word.replace(group, replacement)
+
+    # Keep the first letter (any vowel as "a"), then consonants only
+    key = "a" if word[0] in _VOWELS else word[0]
+    for ch in word[1:]:
+        if ch in _VOWELS or ch in "wh" or not ch.isalpha():
+            continue
+        if ch != key[-1]:
+            key += ch
+    return key[:KEY_LENGTH]
+
+def name_keys(name):
+    """Return the phonetic key of each word of a name"""
+    return [word_key(word) for word in player_search.normalize(name).split()]
+
+def _similarity(a, b):
+    """Trigram similarity (shared / union) of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+class PhoneticIndex:
+    """
+    Phonetic lookup of one roster, for names read by OCR.
+
+    Built once per roster: each player is filed under the phonetic key of
+    every word of their name, so finding candidates for a name is one hash
+    probe per word. Candidates are then re-ranked by spelling similarity.
+    """
+
+    def __init__(self, players):
+        self.by_key = {}
+        self.entries = {}
+        for player in players:
+            keys = set(name_keys(player.get("name")))
+            self.entries[str(player["id"])] = (player, keys, player_search.trigrams(player.get("name")))
+            for key in keys:
+                self.by_key.setdefault(key, []).append(str(player["id"]))
+
+    def candidates(self, name):
+        """
+        Return the players whose names sound like `name`, best first.
+
+        Returns:
+            list: (player, covered, similarity) tuples; covered is True when
+            every word of the shorter name has a phonetic match in the other
+        """
+        keys = set(name_keys(name))
+        grams = player_search.trigrams(name)
+        seen = set()
+        ranked = []
+        for key in keys:
+            for player_id in self.by_key.get(key, ()):
+                if player_id in seen:
+                    continue
+                seen.add(player_id)
+                player, player_keys, player_grams = self.entries[player_id]
+                shared = len(keys & player_keys)
+                covered = shared == min(len(keys), len(player_keys))
+                ranked.append((player, covered, _similarity(grams, player_grams)))
+        ranked.sort(key=lambda item: (item[1], item[2]), reverse=True)
+        return ranked
+
+    def best_match(self, name, min_similarity=None, margin=None):
+        """
+        Return the one player `name` most likely refers to, or None.
+
+        The best candidate must match phonetically on every word of the
+        shorter name, reach `min_similarity` in spelling, and beat the next
+        such candidate by `margin`, so "Mohamed" alone matches nobody on a
+        team with two Mohameds.
+        """
+        min_similarity = MIN_SIMILARITY if min_similarity is None else min_similarity
+        margin = MARGIN if margin is None else margin
+        ranked = self.candidates(name)
+        if not ranked:
+            return None
+
+        player, covered, similarity = ranked[0]
+        if not covered or similarity < min_similarity:
+            return None
+        if len(ranked) > 1 and ranked[1][1] and similarity - ranked[1][2] < margin:
+            return None
+        return player
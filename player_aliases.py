@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+import player_search
+from pagination import fetch_all
+
+# Full reload interval, to pick up aliases learned by other processes (0 to disable)
+REFRESH_SECONDS = int(os.environ.get("PLAYER_ALIASES_REFRESH_SECONDS", "900"))
+
+_lock = threading.Lock()
+_aliases = {}       # (str(team_id), name key) -> player_id
+_loaded_at = None
+
+def _key(name, team_id):
+    return (str(team_id), player_search.normalize(name))
+
+def load(client):
+    """
+    Read every alias and rebuild the lookup.
+
+    Args:
+        client: Supabase client
+    """
+    global _aliases, _loaded_at
+    started = time.perf_counter()
+    rows = fetch_all(client, "player_aliases", columns="id, team_id, alias_key, player_id")
+    aliases = {(str(row["team_id"]), row["alias_key"]): row["player_id"] for row in rows}
+
+    with _lock:
+        _aliases = aliases
+        _loaded_at = time.time()
+
+    print(f"Player aliases loaded {len(aliases)} aliases in {time.perf_counter() - started:.2f}s")
+
+def is_ready():
+    """Return True once the aliases have been loaded"""
+    return _loaded_at is not None
+
+def lookup(name, team_id):
+    """
+    Return the player a name on a team was matched to before.
+
+    Args:
+        name: Name as read or entered
+        team_id: ID of the team the name was recorded for
+
+    Returns:
+        Player ID, or None if the name is not a known alias
+    """
+    key = _key(name, team_id)
+    if not key[1]:
+        return None
+    return _aliases.get(key)
+
+def learn(client, name, team_id, player_id):
+    """
+    Remember that a name on a team is this player, after a manual match.
+
+    A failure to save is logged and otherwise ignored; the match itself has
+    already been written.
+
+    Args:
+        client: Supabase client
+        name: Name that was matched
+        team_id: ID of the team the name was recorded for
+        player_id: ID of the registered player it was matched to
+    """
+    key = _key(name, team_id)
+    if not key[1] or team_id is None:
+        return
+    if str(_aliases.get(key)) == str(player_id):
+        return
+
+    try:
+        client.table("player_aliases").upsert({
+            "team_id": team_id,
+            "alias_key": key[1],
+            "name": name,
+            "player_id": player_id,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        }, on_conflict="team_id,alias_key").execute()
+    except Exception as e:
+        print(f"Error saving alias {name} for player {player_id}: {str(e)}")
+        return
+
+    with _lock:
+        _aliases[key] = player_id
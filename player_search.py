@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import heapq
+import bisect
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from pagination import fetch_all
+
+# Full reload interval, to pick up players added or renamed outside the app (0 to disable)
+REFRESH_SECONDS = int(os.environ.get("PLAYER_SEARCH_REFRESH_SECONDS", "900"))
+
+# Candidates scoring below this are not suggested
+MIN_SIMILARITY = float(os.environ.get("SUGGEST_MIN_SIMILARITY", "0.2"))
+
+# Score added for a candidate on the unmatched name's own team, and on the other team in the match
+SAME_TEAM_BONUS = 0.25
+MATCH_TEAM_BONUS = 0.1
+
+_lock = threading.Lock()
+_players = {}                   # player_id -> {'id', 'name', 'team_id', 'team_key', 'trigrams', 'size'}
+_trigrams = defaultdict(set)    # trigram -> player ids
+_name_prefixes = []             # sorted (normalized name, player_id) for prefix search
+_word_prefixes = []             # sorted (name from the second word on, player_id), and so on per word
+_loaded_at = None
+
+def normalize(name):
+    """
+    Lower-case, strip accents and punctuation, collapse whitespace.
+
+    Also used as unmatched_players.name_key, so it must give the same result
+    as unmatched_name_key() in migrations/005_unmatched_name_key.sql.
+    """
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(ch for ch in name if not "\u0300" <= ch <= "\u036f")
+    name = re.sub(r"[^\w\s]|_", " ", name.lower())
+    return " ".join(name.split())
+
+def trigrams(name):
+    """
+    Return the set of trigrams of a name, padded per word like pg_trgm.
+
+    Args:
+        name: Raw or normalized name
+
+    Returns:
+        set: Trigrams, e.g. "ali" -> {"  a", " al", "ali", "li "}
+    """
+    grams = set()
+    for word in normalize(name).split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+def _tails(name):
+    """Return the normalized name from each word on: "a b c" -> ["a b c", "b c", "c"]"""
+    words = normalize(name).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+def _index(player):
+    """Add a player to the index (caller holds the lock; load() sorts the prefix lists afterwards)"""
+    grams = trigrams(player.get("name"))
+    tails = _tails(player.get("name"))
+    _players[player["id"]] = {
+        'id': player["id"],
+        'name': player.get("name"),
+        'team_id': player.get("team_id"),
+        'team_key': str(player.get("team_id")),
+        'trigrams': grams,
+        'size': len(grams)
+    }
+    for gram in grams:
+        _trigrams[gram].add(player["id"])
+    if tails:
+        _name_prefixes.append((tails[0], player["id"]))
+    for tail in tails[1:]:
+        _word_prefixes.append((tail, player["id"]))
+
+def load(client):
+    """
+    Read every player and rebuild the index.
+
+    Args:
+        client: Supabase client
+    """
+    global _loaded_at
+    started = time.perf_counter()
+    players = fetch_all(client, "players", columns="id, name, team_id")
+
+    with _lock:
+        _players.clear()
+        _trigrams.clear()
+        _name_prefixes.clear()
+        _word_prefixes.clear()
+        for player in players:
+            _index(player)
+        _name_prefixes.sort()
+        _word_prefixes.sort()
+        _loaded_at = time.time()
+
+    print(f"Player search index loaded {len(players)} players in {time.perf_counter() - started:.2f}s")
+
+def is_ready():
+    """Return True once the index has been loaded"""
+    return _loaded_at is not None
+
+def suggest(name, team_id=None, match_team_ids=None, limit=5):
+    """
+    Return the players whose names best match `name`.
+
+    Candidates are the players sharing at least one trigram with the name,
+    scored by trigram similarity (shared / union, as pg_trgm does) plus a
+    bonus for being on the name's own team or in the same match.
+
+    Args:
+        name: Name to look up, usually an unmatched player name
+        team_id: Team the name was recorded for
+        match_team_ids: Teams playing in the match the name came from
+        limit: Maximum number of suggestions
+
+    Returns:
+        list: Dicts with id, name, team_id, similarity and score, best first
+    """
+    query = trigrams(name)
+    if not query:
+        return []
+
+    match_team_keys = {str(t) for t in (match_team_ids or []) if t is not None}
+    team_key = str(team_id) if team_id is not None else None
+
+    with _lock:
+        # Counter.update counts the posting lists in C
+        shared = Counter()
+        for gram in query:
+            postings = _trigrams.get(gram)
+            if postings:
+                shared.update(postings)
+
+        # similarity <= shared / len(query), so skip candidates that cannot reach the minimum
+        min_shared = MIN_SIMILARITY * len(query)
+        scored = []
+        for player_id, count in shared.items():
+            if count < min_shared:
+                continue
+            entry = _players[player_id]
+            similarity = count / (len(query) + entry['size'] - count)
+            if similarity < MIN_SIMILARITY:
+                continue
+            player_team = entry['team_key']
+            score = similarity
+            if team_key is not None and player_team == team_key:
+                score += SAME_TEAM_BONUS
+            elif player_team in match_team_keys:
+                score += MATCH_TEAM_BONUS
+            scored.append((score, similarity, entry))
+
+    best = heapq.nlargest(limit, scored, key=lambda item: (item[0], item[1]))
+    return [
+        {
+            'id': entry['id'],
+            'name': entry['name'],
+            'team_id': entry['team_id'],
+            'similarity': round(similarity, 3),
+            'score': round(score, 3)
+        }
+        for score, similarity, entry in best
+    ]
+
+def search(query, team_ids=None, limit=20):
+    """
+    Return players whose name, or any word of it onwards, starts with `query`.
+
+    Names starting with the query come first, in name order, then names
+    with a later word starting with it, in order of that word. Each group is
+    a binary search into a sorted list followed by a scan that stops after
+    `limit` players, so the cost does not depend on the size of the league
+    and no better match is left out.
+
+    Args:
+        query: Text typed so far
+        team_ids: Optional team IDs to restrict to
+        limit: Maximum number of players
+
+    Returns:
+        list: Dicts with id, name and team_id, best first
+    """
+    key = normalize(query)
+    if not key:
+        return []
+
+    team_keys = {str(t) for t in team_ids} if team_ids else None
+    found = {}
+    with _lock:
+        for prefixes in (_name_prefixes, _word_prefixes):
+            position = bisect.bisect_left(prefixes, (key,))
+            while position < len(prefixes) and len(found) < limit:
+                tail, player_id = prefixes[position]
+                position += 1
+                if not tail.startswith(key):
+                    break
+                entry = _players[player_id]
+                if player_id in found or (team_keys is not None and entry['team_key'] not in team_keys):
+                    continue
+                found[player_id] = entry
+
+    return [{'id': entry['id'], 'name': entry['name'], 'team_id': entry['team_id']} for entry in found.values()]
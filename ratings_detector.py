@@ -0,0 +1,147 @@
+import os
+import threading
+import cv2
+import ocr_layouts
+
+# Header crops are compared at this size (width, height)
+HEADER_SIZE = (320, 48)
+
+# Correlation with a learned header above which a frame is that side without any OCR...
+MATCH_THRESHOLD = float(os.environ.get("RATINGS_MATCH_THRESHOLD", "0.85"))
+# ...and below which (for both sides) it is not a ratings screen at all
+REJECT_THRESHOLD = float(os.environ.get("RATINGS_REJECT_THRESHOLD", "0.5"))
+# Home and away headers differ in one word, so the winning side must lead by this much
+SIDE_MARGIN = 0.02
+# OCR-confirmed frames that must agree with a template before a low score rejects frames
+CONFIRMATIONS = int(os.environ.get("RATINGS_TEMPLATE_CONFIRMATIONS", "3"))
+
+# Header crops of confirmed ratings frames, saved so later videos start with them
+TEMPLATE_DIR = os.environ.get("RATINGS_TEMPLATE_DIR", "ratings_templates")
+
+_lock = threading.Lock()
+_templates = None   # side -> HEADER_SIZE grayscale crop
+_confirmed = {}     # side -> OCR-confirmed frames in this process that matched the template
+
+def header_crop(image):
+    """Return the header region of a frame, as set by the OCR layout"""
+    return ocr_layouts.crop(image, ocr_layouts.current()['header'])
+
+def _load_templates(reload=False):
+    """Read the saved header templates, once unless `reload` (caller holds the lock)"""
+    global _templates
+    if _templates is None or reload:
+        templates = {}
+        for side in ("home", "away"):
+            template = cv2.imread(os.path.join(TEMPLATE_DIR, f"{side}.png"), cv2.IMREAD_GRAYSCALE)
+            if template is not None and template.shape[1::-1] == HEADER_SIZE:
+                templates[side] = template
+        if _templates is not None:
+            for side, template in templates.items():
+                if _templates.get(side) is None or not (_templates[side] == template).all():
+                    _confirmed.pop(side, None)
+        _templates = templates
+    return _templates
+
+def _save(side, small):
+    """Write a template, atomically so other OCR workers never read half a file"""
+    try:
+        os.makedirs(TEMPLATE_DIR, exist_ok=True)
+        path = os.path.join(TEMPLATE_DIR, f"{side}.png")
+        temp_path = os.path.join(TEMPLATE_DIR, f"{side}.{os.getpid()}.tmp.png")
+        cv2.imwrite(temp_path, small)
+        os.replace(temp_path, path)
+        print(f"Learned {side} ratings header template")
+    except Exception as e:
+        print(f"Error saving {side} ratings header template: {str(e)}")
+
+def _remember(side, small, score):
+    """
+    Learn from a frame OCR confirmed as a ratings screen for `side`.
+
+    A frame that matches the side's template counts towards confirming it.
+    One that does not (e.g. the template was taken from a fade-in frame)
+    first re-reads the templates, in case another worker has saved a better
+    one, and then replaces a template that is not confirmed yet.
+    """
+    with _lock:
+        templates = _load_templates()
+        if side in templates and score is not None and score >= MATCH_THRESHOLD:
+            _confirmed[side] = _confirmed.get(side, 0) + 1
+            return
+        if side in templates:
+            templates = _load_templates(reload=True)
+            if side in templates and _score(small, templates[side]) >= MATCH_THRESHOLD:
+                _confirmed[side] = _confirmed.get(side, 0) + 1
+                return
+            if _confirmed.get(side, 0) >= CONFIRMATIONS:
+                return
+        templates[side] = small
+        _confirmed[side] = 1
+    _save(side, small)
+
+def _trusted_sides(templates):
+    """Return the sides whose template enough OCR-checked frames have confirmed (caller holds the lock)"""
+    return {side for side in templates if _confirmed.get(side, 0) >= CONFIRMATIONS}
+
+def _score(small, template):
+    score = float(cv2.matchTemplate(small, template, cv2.TM_CCOEFF_NORMED)[0][0])
+    return score if score == score else 0.0   # a flat image gives NaN
+
+def side_from_text(texts):
+    """Return "home" or "away" if OCR text contains a player ratings header, else None"""
+    for text in texts:
+        text = text.lower()
+        if "player ratings" in text or "player rating" in text:
+            if "home" in text:
+                return "home"
+            if "away" in text:
+                return "away"
+    return None
+
+def classify(frame_path, reader):
+    """
+    Decide whether a frame is a player ratings screen, and for which side, before full OCR.
+
+    The header region is compared with the headers learned from earlier
+    ratings frames: a close match decides the side with no OCR at all, and a
+    frame unlike both is rejected. A template is only used that way once
+    RATINGS_TEMPLATE_CONFIRMATIONS frames checked with OCR in this process
+    have agreed with it, so one bad template (say from a fade-in frame) cannot
+    drop ratings frames. Anything else gets OCR on the header region only,
+    which is a fraction of the cost of the whole frame; headers confirmed
+    that way become, or confirm, the templates.
+
+    Args:
+        frame_path: Path of the frame image
+        reader: EasyOCR reader for the header fallback
+
+    Returns:
+        str: "home", "away", or None if the frame is not a ratings screen
+    """
+    image = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    crop = header_crop(image)
+    if crop.size == 0:
+        return None
+    small = cv2.resize(crop, HEADER_SIZE, interpolation=cv2.INTER_AREA)
+
+    with _lock:
+        templates = dict(_load_templates())
+        trusted = _trusted_sides(templates)
+
+    scores = {side: _score(small, template) for side, template in templates.items()}
+    if scores:
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_side, best = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else None
+        if (best_side in trusted and best >= MATCH_THRESHOLD
+                and (runner_up is None or best - runner_up >= SIDE_MARGIN)):
+            return best_side
+        if len(trusted) == 2 and best < REJECT_THRESHOLD:
+            return None
+
+    side = side_from_text(detection[1] for detection in reader.readtext(crop))
+    if side:
+        _remember(side, small, scores.get(side))
+    return side
@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+
+import export_cache
+from pagination import iter_table
+
+# Path of the local SQLite replica; leave unset to read everything from Supabase
+REPLICA_PATH = os.environ.get("SQLITE_REPLICA_PATH", "")
+SYNC_INTERVAL_SECONDS = int(os.environ.get("REPLICA_SYNC_SECONDS", "60"))
+# Every Nth sync also removes rows that were deleted upstream (syncs after a write always do)
+RECONCILE_EVERY = int(os.environ.get("REPLICA_RECONCILE_EVERY", "5"))
+# Extra passes a sync makes for writes that arrived while it was running
+MAX_FOLLOW_UP_SYNCS = 3
+# Overlap between syncs so rows committed late or by a skewed clock are not missed
+CLOCK_SKEW_SECONDS = int(os.environ.get("REPLICA_CLOCK_SKEW_SECONDS", "120"))
+
+# Indexed columns kept next to the full row (stored as JSON in `data`)
+TABLES = {
+    'teams': ['name'],
+    'players': ['name', 'team_id'],
+    'matches': ['match_day', 'date', 'home_team_id', 'away_team_id'],
+    'appearances': ['player_id', 'match_id'],
+    'unmatched_players': ['name', 'team_id', 'last_match_id', 'status', 'occurrence_count']
+}
+
+INTEGER_COLUMNS = {'occurrence_count'}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_teams_name ON teams(name)",
+    "CREATE INDEX IF NOT EXISTS idx_players_team ON players(team_id, name)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_date ON matches(date)",
+    "CREATE INDEX IF NOT EXISTS idx_appearances_match ON appearances(match_id)",
+    "CREATE INDEX IF NOT EXISTS idx_appearances_player ON appearances(player_id)",
+    "CREATE INDEX IF NOT EXISTS idx_unmatched_match ON unmatched_players(last_match_id)",
+    "CREATE INDEX IF NOT EXISTS idx_unmatched_team ON unmatched_players(team_id, occurrence_count)"
+]
+
+_local = threading.local()
+_state_lock = threading.Lock()
+_sync_lock = threading.Lock()
+
+# A write bumps _write_generation; the replica is only served once a sync that
+# started after the latest write has finished, so users always read their own edits
+_write_generation = 0
+_synced_generation = -1
+_sync_count = 0
+_last_sync = {}
+# export_cache.current_version() read before the last reconciling sync, so the
+# replica holds every change (deletes included) up to it
+_synced_version = None
+
+def enabled():
+    """Return True if a replica path is configured"""
+    return bool(REPLICA_PATH)
+
+def _connect():
+    """Return this thread's connection to the replica, creating the schema if needed"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(REPLICA_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for table, columns in TABLES.items():
+            column_defs = ", ".join(
+                f"{column} {'INTEGER' if column in INTEGER_COLUMNS else 'TEXT'}" for column in columns
+            )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"(id TEXT PRIMARY KEY, {column_defs}, updated_at TEXT, data TEXT NOT NULL)"
+            )
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_state (table_name TEXT PRIMARY KEY, watermark TEXT)")
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+def _key(value):
+    """Store ids as text so URL parameters compare equal to integer or uuid ids"""
+    return None if value is None else str(value)
+
+def _row_values(table, row):
+    values = [_key(row.get('id'))]
+    for column in TABLES[table]:
+        value = row.get(column)
+        if column in INTEGER_COLUMNS:
+            values.append(value)
+        else:
+            values.append(_key(value))
+    values.append(row.get('updated_at'))
+    values.append(json.dumps(row, default=str))
+    return values
+
+def _upsert(conn, table, rows):
+    columns = ['id'] + TABLES[table] + ['updated_at', 'data']
+    placeholders = ", ".join("?" for _ in columns)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+        [_row_values(table, row) for row in rows]
+    )
+
+def _iso(moment):
+    return moment.astimezone(timezone.utc).isoformat()
+
+def sync(client, batch_size=1000):
+    """
+    Pull rows changed since the last sync from Supabase into the replica.
+
+    Each table is read with `updated_at >= watermark` (see
+    migrations/002_updated_at.sql). The next watermark is capped at the sync
+    start time minus REPLICA_CLOCK_SKEW_SECONDS, so rows committed while a
+    sync is running are fetched again next time instead of being skipped.
+    Deletes are not visible through updated_at; every REPLICA_RECONCILE_EVERY
+    syncs, and on every sync following a write, the ids of each table are
+    compared and missing rows are removed.
+
+    A write made while a sync runs is not covered by it, and the run_job_soon
+    request for it is dropped because the sync job is still running, so
+    another pass is made straight away (up to MAX_FOLLOW_UP_SYNCS).
+
+    Args:
+        client: Supabase client
+        batch_size: Rows per executemany() call
+
+    Returns:
+        dict: table -> number of rows upserted (and 'deleted' counts when reconciling)
+    """
+    if not enabled():
+        return {}
+
+    with _sync_lock:
+        stats = _sync_once(client, batch_size)
+        for _ in range(MAX_FOLLOW_UP_SYNCS):
+            if is_ready():
+                break
+            stats = _sync_once(client, batch_size)
+        return stats
+
+def _sync_once(client, batch_size):
+    """Run one sync pass (caller holds _sync_lock)"""
+    global _synced_generation, _sync_count, _synced_version
+
+    with _state_lock:
+        generation = _write_generation
+        # A write may have deleted rows, which only a reconcile removes
+        dirty = generation != _synced_generation
+    started = datetime.now(timezone.utc)
+    safe_watermark = _iso(started - timedelta(seconds=CLOCK_SKEW_SECONDS))
+    reconcile = dirty or _sync_count % RECONCILE_EVERY == 0
+    # Read before any table, so everything up to this version is in what follows
+    version = export_cache.current_version(client) if reconcile else None
+
+    conn = _connect()
+    stats = {}
+
+    # One transaction per sync, so readers never see a half-applied sync
+    with conn:
+        for table in TABLES:
+            state = conn.execute("SELECT watermark FROM sync_state WHERE table_name = ?", (table,)).fetchone()
+            watermark = state[0] if state else None
+            filters = (lambda q, w=watermark: q.gte("updated_at", w)) if watermark else None
+
+            newest = watermark
+            batch = []
+            count = 0
+            for row in iter_table(client, table, filters=filters):
+                batch.append(row)
+                updated_at = row.get('updated_at')
+                if updated_at and (newest is None or updated_at > newest):
+                    newest = updated_at
+                if len(batch) >= batch_size:
+                    _upsert(conn, table, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                _upsert(conn, table, batch)
+                count += len(batch)
+
+            if reconcile:
+                upstream_ids = {_key(row['id']) for row in iter_table(client, table, columns="id")}
+                local_ids = {row[0] for row in conn.execute(f"SELECT id FROM {table}")}
+                stale_ids = local_ids - upstream_ids
+                if stale_ids:
+                    conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in stale_ids])
+                stats[f'{table}_deleted'] = len(stale_ids)
+
+            if newest is not None:
+                next_watermark = min(newest, safe_watermark)
+                if watermark is None or next_watermark > watermark:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sync_state (table_name, watermark) VALUES (?, ?)",
+                        (table, next_watermark)
+                    )
+            stats[table] = count
+
+    with _state_lock:
+        _synced_generation = generation
+        if reconcile:
+            _synced_version = version
+        _sync_count += 1
+        _last_sync.update({'finished_at': time.time(), 'stats': stats})
+
+    return stats
+
+def mark_dirty():
+    """Record a write so reads fall back to Supabase until the next sync finishes"""
+    global _write_generation
+    with _state_lock:
+        _write_generation += 1
+
+def is_ready():
+    """Return True if the replica has synced since the latest write and can serve reads"""
+    if not enabled():
+        return False
+    with _state_lock:
+        return _synced_generation == _write_generation
+
+def data_version():
+    """Return the export_cache version the replica is known to include, or None"""
+    with _state_lock:
+        return _synced_version
+
+def status():
+    """Return replica sync status for diagnostics"""
+    with _state_lock:
+        return {
+            'enabled': enabled(),
+            'ready': enabled() and _synced_generation == _write_generation,
+            'sync_count': _sync_count,
+            'data_version': _synced_version,
+            'last_sync': dict(_last_sync)
+        }
+
+def _load(data):
+    return json.loads(data) if data else None
+
+# Read helpers, returning rows shaped like the equivalent Supabase selects
+
+def count(table):
+    """Count rows in a replicated table"""
+    return _connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def get_teams():
+    """All teams ordered by name"""
+    return [_load(row[0]) for row in _connect().execute("SELECT data FROM teams ORDER BY name")]
+
+def get_team(team_id):
+    """A single team, or None"""
+    row = _connect().execute("SELECT data FROM teams WHERE id = ?", (_key(team_id),)).fetchone()
+    return _load(row[0]) if row else None
+
+def get_players(team_id=None):
+    """Players ordered by name with the team name embedded, like select("*, team:team_id(name)")"""
+    sql = "SELECT p.data, t.name FROM players p LEFT JOIN teams t ON t.id = p.team_id"
+    params = ()
+    if team_id:
+        sql += " WHERE p.team_id = ?"
+        params = (_key(team_id),)
+    sql += " ORDER BY p.name"
+
+    players = []
+    for data, team_name in _connect().execute(sql, params):
+        player = _load(data)
+        player['team'] = {'name': team_name} if team_name is not None else None
+        players.append(player)
+    return players
+
+def _match_rows(where="", params=()):
+    sql = (
+        "SELECT m.data, ht.name, at.name FROM matches m "
+        "LEFT JOIN teams ht ON ht.id = m.home_team_id "
+        "LEFT JOIN teams at ON at.id = m.away_team_id "
+        f"{where} ORDER BY m.date DESC"
+    )
+    matches = []
+    for data, home_name, away_name in _connect().execute(sql, params):
+        match = _load(data)
+        match['home_team'] = {'name': home_name} if home_name is not None else None
+        match['away_team'] = {'name': away_name} if away_name is not None else None
+        matches.append(match)
+    return matches
+
+def get_matches():
+    """All matches, newest first, with home_team/away_team names embedded"""
+    return _match_rows()
+
+def get_match(match_id):
+    """A single match with team names embedded, or None"""
+    matches = _match_rows("WHERE m.id = ?", (_key(match_id),))
+    return matches[0] if matches else None
+
+def get_match_stats():
+    """
+    Appearance and unmatched counts per match and team.
+
+    Returns:
+        dict: match_id (str) -> {'appearances': {team_id: n}, 'unmatched': {team_id: n}}
+    """
+    conn = _connect()
+    stats = {}
+    for match_id, team_id, total in conn.execute(
+        "SELECT a.match_id, p.team_id, COUNT(*) FROM appearances a "
+        "JOIN players p ON p.id = a.player_id GROUP BY a.match_id, p.team_id"
+    ):
+        stats.setdefault(match_id, {'appearances': {}, 'unmatched': {}})['appearances'][team_id] = total
+    for match_id, team_id, total in conn.execute(
+        "SELECT last_match_id, team_id, COUNT(*) FROM unmatched_players "
+        "WHERE last_match_id IS NOT NULL GROUP BY last_match_id, team_id"
+    ):
+        stats.setdefault(match_id, {'appearances': {}, 'unmatched': {}})['unmatched'][team_id] = total
+    return stats
+
+def get_match_appearances(match_id):
+    """Appearances for a match with player name and team embedded"""
+    appearances = []
+    for data, player_data in _connect().execute(
+        "SELECT a.data, p.data FROM appearances a LEFT JOIN players p ON p.id = a.player_id "
+        "WHERE a.match_id = ?", (_key(match_id),)
+    ):
+        appearance = _load(data)
+        player = _load(player_data)
+        appearance['player'] = {'name': player.get('name'), 'team_id': player.get('team_id')} if player else None
+        appearances.append(appearance)
+    return appearances
+
+def get_team_appearances(team_id):
+    """Appearances (id, player_id, match_id) for every player in a team"""
+    return [
+        {'id': a['id'], 'player_id': a['player_id'], 'match_id': a['match_id']}
+        for a in (_load(row[0]) for row in _connect().execute(
+            "SELECT a.data FROM appearances a JOIN players p ON p.id = a.player_id "
+            "WHERE p.team_id = ?", (_key(team_id),)
+        ))
+    ]
+
+def get_team_unmatched(team_id):
+    """Unmatched players for a team, most frequent first"""
+    return [
+        _load(row[0]) for row in _connect().execute(
+            "SELECT data FROM unmatched_players WHERE team_id = ? ORDER BY occurrence_count DESC",
+            (_key(team_id),)
+        )
+    ]
+
+def get_matches_by_date():
+    """Match id, match_day and date for every match, oldest first"""
+    return [
+        {'id': m['id'], 'match_day': m.get('match_day'), 'date': m.get('date')}
+        for m in (_load(row[0]) for row in _connect().execute("SELECT data FROM matches ORDER BY date"))
+    ]
+
+def get_unmatched_for_match(match_id):
+    """Unmatched players last seen in a match"""
+    return [
+        _load(row[0]) for row in _connect().execute(
+            "SELECT data FROM unmatched_players WHERE last_match_id = ?", (_key(match_id),)
+        )
+    ]
+
+def load_snapshot():
+    """
+    Read everything the league export needs inside one SQLite read transaction.
+
+    Returns:
+        dict: Same shape as app.load_export_snapshot()
+    """
+    conn = _connect()
+    # WAL readers keep seeing the last committed sync for the whole transaction
+    conn.execute("BEGIN")
+    try:
+        snapshot = {
+            'snapshot_at': _last_sync.get('finished_at'),
+            'teams': [_load(r[0]) for r in conn.execute("SELECT data FROM teams ORDER BY name")],
+            'matches': get_matches_by_date(),
+            'players': [_load(r[0]) for r in conn.execute("SELECT data FROM players ORDER BY name")],
+            'appearances': [
+                {'id': a['id'], 'player_id': a['player_id'], 'match_id': a['match_id']}
+                for a in (_load(r[0]) for r in conn.execute("SELECT data FROM appearances"))
+            ],
+            'unmatched_players': [
+                _load(r[0]) for r in conn.execute(
+                    "SELECT data FROM unmatched_players ORDER BY occurrence_count DESC"
+                )
+            ]
+        }
+    finally:
+        conn.execute("COMMIT")
+    return snapshot
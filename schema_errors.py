@@ -0,0 +1,19 @@
+# PostgREST and Postgres error codes meaning a migration has not been run: no such
+# function (PGRST202, 42883), table (PGRST205, 42P01), column (PGRST204, 42703)
+# or embedded relationship (PGRST200)
+MISSING_CODES = {"PGRST200", "PGRST202", "PGRST204", "PGRST205", "42883", "42P01", "42703"}
+
+def is_missing(error):
+    """
+    Return True if a Supabase error says a database object does not exist.
+
+    Optional features fall back for good only on these errors; anything else
+    (a timeout, a dropped connection) falls back for the failing call only.
+
+    Args:
+        error: Exception raised by a Supabase query or RPC
+
+    Returns:
+        bool: True if the function, table, column or relationship is missing
+    """
+    return str(getattr(error, "code", None)) in MISSING_CODES
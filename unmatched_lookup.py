@@ -0,0 +1,82 @@
+import re
+import player_search
+import schema_errors
+
+# Set to False once unmatched_players.name_key (migrations/005_unmatched_name_key.sql) is found missing
+name_key_available = True
+
+def find(client, name, team_id):
+    """
+    Look up the unmatched player row for a name on a team.
+
+    Matches on name_key so spelling variants like "J. Smith" and "j smith"
+    share one row, falling back to the exact name when the column does not
+    exist yet.
+
+    Args:
+        client: Supabase client
+        name: Name as read or entered
+        team_id: ID of the team the name was recorded for
+
+    Returns:
+        dict: The unmatched_players row, or None
+    """
+    global name_key_available
+
+    if name_key_available:
+        try:
+            result = client.table("unmatched_players").select("*").eq(
+                "name_key", player_search.normalize(name)
+            ).eq("team_id", team_id).limit(1).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            if schema_errors.is_missing(e):
+                print(f"unmatched_players.name_key unavailable, looking up by exact name: {str(e)}")
+                name_key_available = False
+            else:
+                print(f"Error looking up unmatched player by name_key, trying the exact name: {str(e)}")
+
+    result = client.table("unmatched_players").select("*").eq("name", name).eq("team_id", team_id).limit(1).execute()
+    return result.data[0] if result.data else None
+
+def search(client, query, limit):
+    """
+    Return unmatched names with a word starting with `query`, like player_search.search.
+
+    Matches the start of name_key or of any word in it, so "sal" finds
+    "Mohamed Salah". Before the name_key column exists, the raw name is
+    matched instead, with punctuation in the query (LIKE wildcards included)
+    standing for any single character.
+
+    Args:
+        client: Supabase client
+        query: Text typed so far
+        limit: Maximum number of rows
+
+    Returns:
+        list: unmatched_players rows with an embedded team name, most frequent first
+    """
+    global name_key_available
+
+    key = player_search.normalize(query)
+    if not key:
+        return []
+
+    def run(column, operator, pattern):
+        # normalize() and the substitution below leave no %, _, commas or parentheses in pattern
+        return client.table("unmatched_players").select(
+            "id, name, team_id, occurrence_count, team:team_id(name)"
+        ).eq("status", "unmatched").or_(
+            f"{column}.{operator}.{pattern}%,{column}.{operator}.% {pattern}%"
+        ).order("occurrence_count", desc=True).limit(limit).execute().data or []
+
+    if name_key_available:
+        try:
+            return run("name_key", "like", key)
+        except Exception as e:
+            if not schema_errors.is_missing(e):
+                raise
+            print(f"unmatched_players.name_key unavailable, searching by name: {str(e)}")
+            name_key_available = False
+
+    return run("name", "ilike", " ".join(re.sub(r"[^\w\s]|_", "_", query).split()))
@@ -0,0 +1,231 @@
+import os
+import time
+import threading
+from pagination import fetch_all
+
+# How often merged chains are compacted and the resolver reloaded (0 to run once at startup)
+COMPACT_SECONDS = int(os.environ.get("UNMATCHED_COMPACT_SECONDS", "3600"))
+
+# Rows written per bulk call
+CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+# Attempts at adding a moved count onto a root whose count keeps changing
+MOVE_ATTEMPTS = 5
+
+# Merged unmatched rows point (matched_player_id) at the row they were merged
+# into, which may itself be merged later. Every merged row is kept pointing
+# straight at the root of its chain, here and in the database.
+_lock = threading.Lock()
+_root = {}          # str(merged row id) -> root row id
+_members = {}       # str(root row id) -> set of str(merged row ids)
+_compacted_at = None
+_last_report = None
+
+def _chunks(rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        yield rows[start:start + CHUNK_SIZE]
+
+def _find(parent, key):
+    """
+    Return the root of key in a parent map, compressing the path walked.
+
+    A cycle of merged rows has no root; the row where the walk comes back on
+    itself is cut loose and becomes the root.
+
+    Returns:
+        tuple: (root key, True if a cycle was broken)
+    """
+    path = []
+    seen = set()
+    node = key
+    while node in parent:
+        if node in seen:
+            del parent[node]
+            break
+        seen.add(node)
+        path.append(node)
+        node = parent[node]
+    for member in path:
+        if member != node:
+            parent[member] = node
+    return node, node in seen
+
+def compact(client, dry_run=False):
+    """
+    Collapse every chain of merged unmatched players onto its root.
+
+    Reads unmatched_players once and resolves each merged row's root with
+    union-find. Writes are targeted updates guarded by the values that were
+    read, so a count bumped by the OCR pipeline or a status changed by a user
+    meanwhile is never overwritten and deleted rows are not recreated: merged
+    rows are repointed at their root in one update per root, and any
+    occurrence_count a merged row still holds is moved into the root with
+    compare-and-set updates (running again changes nothing). match_player
+    moves the count when it merges, so only occurrences recorded against a
+    row after its merge are left to move here. Finally the in-memory resolver is rebuilt
+    from the result.
+
+    Args:
+        client: Supabase client
+        dry_run: Report what would change without writing anything
+
+    Returns:
+        dict: Compaction report
+    """
+    global _root, _members, _compacted_at, _last_report
+    started = time.perf_counter()
+    rows = fetch_all(client, "unmatched_players")
+    by_id = {str(row["id"]): row for row in rows}
+
+    # Only merges into a row that still exists form part of a chain
+    parent = {}
+    dangling = 0
+    for key, row in by_id.items():
+        if row.get("status") == "merged":
+            target = str(row.get("matched_player_id"))
+            if target in by_id and target != key:
+                parent[key] = target
+            else:
+                dangling += 1
+
+    merged_keys = list(parent)
+    roots = {}
+    cycles_broken = []
+    for key in merged_keys:
+        root, broken = _find(parent, key)
+        roots[key] = root
+        if broken:
+            cycles_broken.append(root)
+
+    repoint = {}        # root -> ids of merged rows not yet pointing at it
+    moves = []          # (merged row, root) with an occurrence_count to move
+    changed = set()
+    for key, root in roots.items():
+        if key == root:
+            continue
+        row = by_id[key]
+        if str(row.get("matched_player_id")) != root:
+            repoint.setdefault(root, []).append(row["id"])
+            changed.add(key)
+        if row.get("occurrence_count"):
+            moves.append((row, root))
+            changed.update((key, root))
+    changed.update(cycles_broken)
+
+    moved = 0
+    if not dry_run:
+        for root in cycles_broken:
+            client.table("unmatched_players").update({
+                "status": "unmatched",
+                "matched_player_id": None
+            }).eq("id", by_id[root]["id"]).eq("status", "merged").execute()
+
+        for root, ids in repoint.items():
+            for chunk in _chunks(ids):
+                client.table("unmatched_players").update({
+                    "matched_player_id": by_id[root]["id"]
+                }).in_("id", chunk).eq("status", "merged").execute()
+
+        for row, root in moves:
+            moved += _move_count(client, row, by_id[root]["id"])
+
+        root_map = {}
+        members = {}
+        for key, root in roots.items():
+            if key != root:
+                root_map[key] = by_id[root]["id"]
+                members.setdefault(root, set()).add(key)
+        with _lock:
+            _root = root_map
+            _members = members
+            _compacted_at = time.time()
+
+    _last_report = {
+        'finished_at': time.time(),
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'dry_run': dry_run,
+        'rows': len(rows),
+        'merged': len(merged_keys),
+        'roots': len({root for key, root in roots.items() if key != root}),
+        'rows_updated': len(changed),
+        'occurrences_moved': moved if not dry_run else sum(row["occurrence_count"] for row, root in moves),
+        'cycles_broken': len(cycles_broken),
+        'dangling': dangling
+    }
+    return _last_report
+
+def _move_count(client, row, root_id):
+    """
+    Move a merged row's occurrence_count onto its root.
+
+    The count is taken off the merged row only if it still holds the value
+    read, then added to the root with a compare-and-set on the root's
+    current count. If the root cannot be updated (deleted, or changing on
+    every attempt) the count is put back for the next compaction.
+
+    Returns:
+        int: Occurrences moved
+    """
+    count = row["occurrence_count"]
+    result = client.table("unmatched_players").update({"occurrence_count": 0}).eq(
+        "id", row["id"]
+    ).eq("status", "merged").eq("occurrence_count", count).execute()
+    if not result.data:
+        return 0
+
+    for _ in range(MOVE_ATTEMPTS):
+        current = client.table("unmatched_players").select("occurrence_count").eq("id", root_id).execute()
+        if not current.data:
+            break
+        root_count = current.data[0].get("occurrence_count")
+        query = client.table("unmatched_players").update({"occurrence_count": (root_count or 0) + count}).eq("id", root_id)
+        if root_count is None:
+            query = query.is_("occurrence_count", "null")
+        else:
+            query = query.eq("occurrence_count", root_count)
+        result = query.execute()
+        if result.data:
+            return count
+
+    print(f"Could not move {count} occurrences of unmatched player {row['id']} onto {root_id}; retrying next compaction")
+    client.table("unmatched_players").update({"occurrence_count": count}).eq(
+        "id", row["id"]
+    ).eq("occurrence_count", 0).execute()
+    return 0
+
+def is_ready():
+    """Return True once the resolver has been built"""
+    return _compacted_at is not None
+
+def resolve(unmatched_id):
+    """
+    Return the ID of the row an unmatched player was (transitively) merged into.
+
+    A single dict lookup; rows that were never merged resolve to themselves.
+    """
+    return _root.get(str(unmatched_id), unmatched_id)
+
+def merge(unmatched_id, target_id):
+    """
+    Record that a row was merged into another after a write.
+
+    The row and everything already merged into it now resolve to the root of
+    the target.
+
+    Returns:
+        The root row ID the merged rows now resolve to
+    """
+    with _lock:
+        root = _root.get(str(target_id), target_id)
+        key = str(unmatched_id)
+        if str(root) == key:
+            return root
+        moved = _members.pop(key, set())
+        moved.add(key)
+        for member in moved:
+            _root[member] = root
+        _members.setdefault(str(root), set()).update(moved)
+        return root
+
+def get_last_report():
+    """Return the report of the most recent compaction, or None"""
+    return _last_report
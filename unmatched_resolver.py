@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+import player_search
+import appearance_index
+import appearance_writes
+from pagination import fetch_all
+
+# A suggestion is applied automatically only if it is this similar...
+AUTO_MATCH_THRESHOLD = float(os.environ.get("AUTO_MATCH_THRESHOLD", "0.6"))
+# ...and scores at least this much better than the runner-up
+AUTO_MATCH_MARGIN = float(os.environ.get("AUTO_MATCH_MARGIN", "0.1"))
+
+# Rows written per bulk call
+CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+
+# Report of the most recent run, including the names queued for review
+_last_run = None
+_run_lock = threading.Lock()
+
+def _chunks(rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        yield rows[start:start + CHUNK_SIZE]
+
+def pick_candidate(unmatched, match, threshold, margin):
+    """
+    Score one unmatched name and decide whether it can be resolved unattended.
+
+    The best suggestion must be on the team the name was recorded for, reach
+    `threshold` similarity and beat the next suggestion by `margin`.
+
+    Returns:
+        tuple: (chosen suggestion or None, list of top suggestions)
+    """
+    match_team_ids = [match.get("home_team_id"), match.get("away_team_id")] if match else []
+    suggestions = player_search.suggest(unmatched.get("name"), unmatched.get("team_id"), match_team_ids, limit=3)
+    if not suggestions:
+        return None, suggestions
+
+    best = suggestions[0]
+    runner_up = suggestions[1]['score'] if len(suggestions) > 1 else 0
+    if (str(best['team_id']) == str(unmatched.get("team_id"))
+            and best['similarity'] >= threshold
+            and best['score'] - runner_up >= margin):
+        return best, suggestions
+    return None, suggestions
+
+def resolve_backlog(client, adjust_counts, bump_version, threshold=None, margin=None, dry_run=False):
+    """
+    Resolve the whole unmatched_players backlog in one pass.
+
+    Loads every unmatched row, the matches and (if needed) the player search
+    index once, scores each name, and applies the confident matches in bulk:
+    one update per matched player (and chunk) for the status changes, one
+    upsert per chunk for the appearances, and one counter adjustment per
+    distinct delta. Status updates only apply to rows that are still
+    unmatched, so a name resolved or deleted meanwhile is left alone and gets
+    no appearance. If writing the appearances fails, the names whose
+    appearance was not written are put back to unmatched. Everything else is queued for review with its top
+    suggestions.
+
+    Args:
+        client: Supabase client
+        adjust_counts: Callable (player_ids, delta) used to update total_appearances
+        bump_version: Callable (match_id) used to invalidate clients of a changed match
+        threshold: Minimum similarity to auto-apply (defaults to AUTO_MATCH_THRESHOLD)
+        margin: Minimum score lead over the runner-up (defaults to AUTO_MATCH_MARGIN)
+        dry_run: Score and report without writing anything
+
+    Returns:
+        dict: Run report with auto_matched and review lists
+    """
+    global _last_run
+    threshold = AUTO_MATCH_THRESHOLD if threshold is None else threshold
+    margin = AUTO_MATCH_MARGIN if margin is None else margin
+
+    with _run_lock:
+        started = time.perf_counter()
+        if not player_search.is_ready():
+            player_search.load(client)
+
+        backlog = fetch_all(client, "unmatched_players", filters=lambda q: q.eq("status", "unmatched"))
+        matches = {str(m["id"]): m for m in fetch_all(client, "matches", columns="id, home_team_id, away_team_id")}
+
+        resolved_ids = {}       # chosen player id -> unmatched row ids
+        pending_appearances = {}   # unmatched row id -> appearance row
+        auto_matched = []
+        review = []
+
+        for unmatched in backlog:
+            match = matches.get(str(unmatched.get("last_match_id")))
+            chosen, suggestions = pick_candidate(unmatched, match, threshold, margin)
+
+            if chosen is None:
+                review.append({
+                    'unmatched_player_id': unmatched["id"],
+                    'name': unmatched.get("name"),
+                    'team_id': unmatched.get("team_id"),
+                    'last_match_id': unmatched.get("last_match_id"),
+                    'suggestions': suggestions
+                })
+                continue
+
+            auto_matched.append({
+                'unmatched_player_id': unmatched["id"],
+                'name': unmatched.get("name"),
+                'player_id': chosen['id'],
+                'player_name': chosen['name'],
+                'similarity': chosen['similarity']
+            })
+            resolved_ids.setdefault(chosen['id'], []).append(unmatched["id"])
+            if match:
+                pending_appearances[str(unmatched["id"])] = {"match_id": match["id"], "player_id": chosen['id']}
+
+        appearances_added = 0
+        changed_meanwhile = 0
+        if not dry_run and resolved_ids:
+            applied = set()
+            for player_id, unmatched_ids in resolved_ids.items():
+                for chunk in _chunks(unmatched_ids):
+                    result = client.table("unmatched_players").update({
+                        "status": "matched",
+                        "matched_player_id": player_id
+                    }).in_("id", chunk).eq("status", "unmatched").execute()
+                    applied.update(str(row["id"]) for row in result.data or [])
+            changed_meanwhile = sum(len(ids) for ids in resolved_ids.values()) - len(applied)
+
+            appearance_rows = {}
+            owners = {}     # appearance key -> unmatched ids it resolves
+            for unmatched_id, appearance in pending_appearances.items():
+                if unmatched_id in applied:
+                    key = (str(appearance["match_id"]), str(appearance["player_id"]))
+                    appearance_rows[key] = appearance
+                    owners.setdefault(key, []).append(unmatched_id)
+
+            inserted_per_player = {}
+            changed_matches = set()
+            written = set()
+            try:
+                for chunk in _chunks(list(appearance_rows.items())):
+                    inserted = appearance_writes.insert_new(client, [appearance for _, appearance in chunk])
+                    written.update(key for key, _ in chunk)
+                    for appearance in inserted:
+                        inserted_per_player[appearance["player_id"]] = inserted_per_player.get(appearance["player_id"], 0) + 1
+                        changed_matches.add(appearance["match_id"])
+                        appearance_index.add(appearance["match_id"], [appearance["player_id"]])
+                    appearances_added += len(inserted)
+            except Exception:
+                # Put names whose appearance was not written back in the queue
+                unwritten = [unmatched_id for key, ids in owners.items() if key not in written for unmatched_id in ids]
+                for chunk in _chunks(unwritten):
+                    client.table("unmatched_players").update({
+                        "status": "unmatched",
+                        "matched_player_id": None
+                    }).in_("id", chunk).eq("status", "matched").execute()
+                raise
+            finally:
+                players_by_delta = {}
+                for player_id, delta in inserted_per_player.items():
+                    players_by_delta.setdefault(delta, []).append(player_id)
+                for delta, player_ids in players_by_delta.items():
+                    adjust_counts(player_ids, delta)
+
+                for match_id in changed_matches:
+                    bump_version(match_id)
+
+        _last_run = {
+            'finished_at': time.time(),
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+            'dry_run': dry_run,
+            'threshold': threshold,
+            'margin': margin,
+            'backlog': len(backlog),
+            'appearances_added': appearances_added,
+            'changed_meanwhile': changed_meanwhile,
+            'auto_matched': auto_matched,
+            'review': review
+        }
+        return _last_run
+
+def get_last_run():
+    """Return the report of the most recent run, or None"""
+    return _last_run